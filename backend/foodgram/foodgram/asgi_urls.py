@@ -0,0 +1,10 @@
+"""URLs served by ``foodgram.asgi``: the async endpoints take precedence
+over the matching DRF routes, everything else is the same as over WSGI."""
+from django.urls import include, path
+
+from .urls import urlpatterns as wsgi_urlpatterns
+
+urlpatterns = [
+    path('api/', include('foodgram_api.async_urls')),
+    *wsgi_urlpatterns,
+]
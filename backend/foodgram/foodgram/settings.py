@@ -23,11 +23,12 @@ INSTALLED_APPS = [
     'rest_framework.authtoken',
     'djoser',
     'users',
-    'foodgram_api',
+    'foodgram_api.apps.FoodgramApiConfig',
     'django_filters',
 ]
 
 MIDDLEWARE = [
+    'foodgram_api.metrics.metrics_middleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -37,7 +38,8 @@ MIDDLEWARE = [
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
-ROOT_URLCONF = 'foodgram.urls'
+# foodgram.asgi switches to foodgram.asgi_urls, which adds async views.
+ROOT_URLCONF = os.getenv('ROOT_URLCONF', 'foodgram.urls')
 
 TEMPLATES = [
     {
@@ -57,14 +59,30 @@ TEMPLATES = [
 
 WSGI_APPLICATION = 'foodgram.wsgi.application'
 
+# Backends that keep up to DB_POOL_SIZE connections open per process, see
+# foodgram_api.db.pool. DB_POOL_SIZE=0 uses the Django backend directly.
+POOLED_DB_ENGINES = {
+    'django.db.backends.postgresql': 'foodgram_api.db.postgresql',
+    'django.db.backends.sqlite3': 'foodgram_api.db.sqlite3',
+}
+DB_ENGINE = os.getenv('DB_ENGINE')
+DB_POOL_SIZE = int(os.getenv('DB_POOL_SIZE', 10))
+
 DATABASES = {
     'default': {
-        'ENGINE': os.getenv('DB_ENGINE'),
+        'ENGINE': (POOLED_DB_ENGINES.get(DB_ENGINE, DB_ENGINE)
+                   if DB_POOL_SIZE else DB_ENGINE),
         'NAME': os.getenv('DB_NAME'),
         'USER': os.getenv('POSTGRES_USER'),
         'PASSWORD': os.getenv('POSTGRES_PASSWORD'),
         'HOST': os.getenv('DB_HOST'),
         'PORT': os.getenv('DB_PORT'),
+        'POOL': {
+            'MAX_SIZE': DB_POOL_SIZE,
+            'TIMEOUT': float(os.getenv('DB_POOL_TIMEOUT', 10)),
+            'MAX_LIFETIME': float(os.getenv('DB_POOL_MAX_LIFETIME', 3600)),
+            'CHECK_AFTER': float(os.getenv('DB_POOL_CHECK_AFTER', 5)),
+        },
     }
 }
 
@@ -99,11 +117,60 @@ STATIC_ROOT = os.path.join(BASE_DIR, 'static')
 MEDIA_URL = "/media/"
 MEDIA_ROOT = os.path.join(BASE_DIR, "media")
 
+SHOPPING_CART_PDF_FONT = os.getenv(
+    'SHOPPING_CART_PDF_FONT',
+    '/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf'
+)
+
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv(
+            'CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'
+        ),
+        'LOCATION': os.getenv('CACHE_LOCATION', ''),
+    }
+}
+
+# Largest request body Django accepts, in bytes: recipes carry base64
+# images. Keep client_max_body_size in infra/nginx.conf in step.
+DATA_UPLOAD_MAX_MEMORY_SIZE = int(
+    os.getenv('DATA_UPLOAD_MAX_MEMORY_SIZE', 20 * 1024 * 1024)
+)
+
+API_CACHE_TIMEOUT = int(os.getenv('API_CACHE_TIMEOUT', 300))
+
+IMAGE_PROCESSING_ENABLED = os.getenv(
+    'IMAGE_PROCESSING_ENABLED', 'true'
+).lower() in ('1', 'true', 'yes')
+IMAGE_PROCESSING_WORKERS = int(os.getenv('IMAGE_PROCESSING_WORKERS', 2))
+
+REFERENCE_CACHE_CHECK_INTERVAL = float(
+    os.getenv('REFERENCE_CACHE_CHECK_INTERVAL', 1)
+)
+
+# PostgreSQL text search configuration of the recipe search index; run
+# rebuild_search_index after changing it.
+SEARCH_CONFIG = os.getenv('SEARCH_CONFIG', 'russian')
+
+METRICS_ENABLED = os.getenv(
+    'METRICS_ENABLED', 'true'
+).lower() in ('1', 'true', 'yes')
+# /api/_metrics requires "Authorization: Bearer <METRICS_TOKEN>". Without a
+# token it is closed unless METRICS_PUBLIC opens it to everyone, e.g. when
+# only a private network reaches the app.
+METRICS_TOKEN = os.getenv('METRICS_TOKEN', '')
+METRICS_PUBLIC = os.getenv(
+    'METRICS_PUBLIC', 'false'
+).lower() in ('1', 'true', 'yes')
+SERVER_TIMING_ENABLED = os.getenv(
+    'SERVER_TIMING_ENABLED', 'false'
+).lower() in ('1', 'true', 'yes')
+
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework.authentication.TokenAuthentication',
+        'foodgram_api.authentication.ProfileTokenAuthentication',
     ),
     'DEFAULT_PERMISSION_CLASSES': (
         'rest_framework.permissions.IsAuthenticatedOrReadOnly',
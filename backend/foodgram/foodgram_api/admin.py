@@ -1,14 +1,18 @@
 from django.contrib import admin
 
+from .fulltext import search_recipes
 from .models import (Cart, Favorite, Ingredient, IngredientsOfRecipe, Recipe,
-                     Tag, TagsOfRecipe)
+                     ShoppingListItem, Tag, TagsOfRecipe)
 
 
 class RecipeAdmin(admin.ModelAdmin):
-    list_display = ('id', 'name', 'slug')
-    search_fields = ('name', 'text', 'slug')
+    list_display = ('id', 'name', 'slug', 'favorites_count', 'carts_count')
+    search_fields = ('name', 'text')
     list_filter = ('pub_date',)
 
+    def get_search_results(self, request, queryset, search_term):
+        return search_recipes(queryset, search_term), False
+
 
 class IngredientAdmin(admin.ModelAdmin):
     list_display = ('id', 'name')
@@ -30,6 +34,11 @@ class CartAdmin(FavoriteAdmin):
     pass
 
 
+class ShoppingListItemAdmin(admin.ModelAdmin):
+    list_display = ('id', 'user', 'ingredient', 'amount')
+    list_filter = ('user',)
+
+
 admin.site.register(Recipe, RecipeAdmin)
 admin.site.register(Ingredient, IngredientAdmin)
 admin.site.register(IngredientsOfRecipe)
@@ -37,3 +46,4 @@ admin.site.register(Tag, TagAdmin)
 admin.site.register(Favorite, FavoriteAdmin)
 admin.site.register(Cart, CartAdmin)
 admin.site.register(TagsOfRecipe)
+admin.site.register(ShoppingListItem, ShoppingListItemAdmin)
@@ -0,0 +1,190 @@
+"""Async versions of the lightest hot endpoints, routed in front of the DRF
+viewsets by ``foodgram.asgi_urls`` when the project runs under ASGI.
+
+They answer with the same bodies, status codes and validators as the
+viewsets. Django 3.1 has no async ORM, so database work runs on the thread
+pool through ``database_sync_to_async``; tags and ingredients are read from
+the reference registry and mostly stay on the event loop.
+"""
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth.models import AnonymousUser
+from django.db import close_old_connections
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from rest_framework import status
+from rest_framework.exceptions import APIException, NotFound
+from rest_framework.pagination import PageNumberPagination
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+
+from users.serializers import UserSerializer
+
+from .authentication import ProfileTokenAuthentication
+from .conditional import make_etag
+from .reference import reference_registry
+from .search import ingredient_index
+from .serializers import IngredientSerializer, TagSerializer
+from .toggles import toggle_recipe
+from .views import IngredientViewSet, TagViewSet, UserViewSet
+
+
+def database_sync_to_async(func):
+    """``sync_to_async`` on the shared thread pool that treats connections
+    the way a sync request does: stale and expired ones are closed before
+    and after the call."""
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        close_old_connections()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            close_old_connections()
+    return sync_to_async(wrapper, thread_sensitive=False)
+
+
+def render(data, code=status.HTTP_200_OK):
+    if data is None:
+        return HttpResponse(status=code)
+    return HttpResponse(JSONRenderer().render(data), status=code,
+                        content_type='application/json')
+
+
+def error(detail, code):
+    response = render({'detail': detail}, code)
+    if code == status.HTTP_401_UNAUTHORIZED:
+        response['WWW-Authenticate'] = ProfileTokenAuthentication.keyword
+    return response
+
+
+def authenticate(request):
+    result = ProfileTokenAuthentication().authenticate(request)
+    return result[0] if result is not None else AnonymousUser()
+
+
+def endpoint(methods, authenticated=False):
+    """Method check, token authentication and DRF error bodies for an
+    async view."""
+    def decorator(view):
+        @wraps(view)
+        async def wrapper(request, *args, **kwargs):
+            if request.method not in methods:
+                response = error(
+                    f'Method "{request.method}" not allowed.',
+                    status.HTTP_405_METHOD_NOT_ALLOWED
+                )
+                response['Allow'] = ', '.join(methods)
+                return response
+            try:
+                request.user = AnonymousUser()
+                if 'HTTP_AUTHORIZATION' in request.META:
+                    request.user = await database_sync_to_async(
+                        authenticate
+                    )(request)
+                if authenticated and request.user.is_anonymous:
+                    return error(
+                        'Authentication credentials were not provided.',
+                        status.HTTP_401_UNAUTHORIZED
+                    )
+                return await view(request, *args, **kwargs)
+            except APIException as exc:
+                return error(exc.detail, exc.status_code)
+        # The csrf_exempt decorator would hide the coroutine from Django.
+        wrapper.csrf_exempt = True
+        return wrapper
+    return decorator
+
+
+async def conditional(request, etag, build):
+    """Answer 304 when ``request`` already has ``etag``, otherwise render
+    what ``build`` returns; it runs on the thread pool."""
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        response = render(await database_sync_to_async(build)())
+    response['ETag'] = etag
+    patch_vary_headers(response, ('Authorization',))
+    return response
+
+
+async def toggle(request, name, pk):
+    data, code = await database_sync_to_async(toggle_recipe)(
+        name, request.method, request.user, pk, {'request': request}
+    )
+    return render(data, code)
+
+
+@endpoint(('GET', 'DELETE'), authenticated=True)
+async def favorite(request, pk):
+    return await toggle(request, 'favorite', pk)
+
+
+@endpoint(('GET', 'DELETE'), authenticated=True)
+async def shopping_cart(request, pk):
+    return await toggle(request, 'shopping_cart', pk)
+
+
+@endpoint(('GET',), authenticated=True)
+async def me(request):
+    user = request.user
+    etag = make_etag(request, None, [UserViewSet().object_version(user)])
+    return await conditional(
+        request, etag,
+        lambda: UserSerializer(user, context={'request': request}).data
+    )
+
+
+@endpoint(('GET',))
+async def tag_list(request):
+    reference = await database_sync_to_async(reference_registry.get)()
+    paginator = PageNumberPagination()
+    page = paginator.paginate_queryset(list(reference.tags.values()),
+                                       Request(request))
+    view = TagViewSet()
+    etag = make_etag(request, paginator.page.paginator.count,
+                     (view.object_version(tag) for tag in page))
+    return await conditional(
+        request, etag,
+        lambda: paginator.get_paginated_response(
+            TagSerializer(page, many=True).data
+        ).data
+    )
+
+
+@endpoint(('GET',))
+async def tag_detail(request, pk):
+    reference = await database_sync_to_async(reference_registry.get)()
+    tag = reference.tags.get(pk)
+    if tag is None:
+        raise NotFound()
+    etag = make_etag(request, None, [TagViewSet().object_version(tag)])
+    return await conditional(request, etag,
+                             lambda: TagSerializer(tag).data)
+
+
+def search_ingredients(request):
+    rows = ingredient_index.search(request.GET.get('name', ''))
+    view = IngredientViewSet()
+    return rows, make_etag(request, None,
+                           (view.object_version(row) for row in rows))
+
+
+@endpoint(('GET',))
+async def ingredient_list(request):
+    rows, etag = await database_sync_to_async(search_ingredients)(request)
+    return await conditional(
+        request, etag,
+        lambda: IngredientSerializer(rows, many=True).data
+    )
+
+
+@endpoint(('GET',))
+async def ingredient_detail(request, pk):
+    reference = await database_sync_to_async(reference_registry.get)()
+    ingredient = reference.ingredients.get(pk)
+    if ingredient is None:
+        raise NotFound()
+    etag = make_etag(request, None,
+                     [IngredientViewSet().object_version(ingredient)])
+    return await conditional(request, etag,
+                             lambda: IngredientSerializer(ingredient).data)
@@ -0,0 +1,479 @@
+"""Seeded data and request scenarios measured by ``benchmark_api`` and
+checked against their query budgets by ``tests.test_query_budgets``."""
+import base64
+import io
+import random
+import time
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.management import call_command
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from PIL import Image
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from users.models import Follow
+
+from . import response_cache
+from .models import (Cart, Favorite, Ingredient, IngredientsOfRecipe, Recipe,
+                     ShoppingListItem, Tag, TagsOfRecipe, recipe_amounts)
+from .reference import reference_registry
+from .toggles import toggle_recipes
+
+User = get_user_model()
+
+PASSWORD = 'benchmark-password'
+PAGE_SIZES = (6, 30)
+# Recipes of each of the six authors followed by the prolific-subscriptions
+# user.
+PROLIFIC_RECIPES = 1000
+# Shopping carts holding the recipe deleted by the recipes-delete scenario.
+CARTING_USERS = 60
+
+# Maximum number of SQL queries per request, token lookup included.
+# Paginated endpoints are measured at two page sizes and must cost the
+# same at both.
+QUERY_BUDGETS = {
+    'recipes-list': 6,
+    'recipes-list-cursor': 5,
+    'recipes-list-anonymous': 5,
+    'recipes-list-anonymous-cached': 0,
+    'recipes-list-tags': 6,
+    'recipes-list-author': 6,
+    'recipes-list-favorited': 6,
+    'recipes-list-search': 6,
+    'recipes-list-in-cart': 6,
+    'recipes-list-popular': 6,
+    'recipes-detail': 5,
+    'recipes-detail-anonymous-cached': 0,
+    'recipes-list-not-modified': 3,
+    'recipes-detail-not-modified': 2,
+    'recipes-create': 9,
+    'recipes-update': 16,
+    'recipes-import': 11,
+    'recipes-delete': 17,
+    'recipes-favorite-add': 4,
+    'recipes-favorite-remove': 4,
+    'recipes-shopping-cart-add': 7,
+    'recipes-shopping-cart-remove': 7,
+    'recipes-batch': 15,
+    'recipes-download-shopping-cart': 2,
+    'recipes-download-shopping-cart-csv': 2,
+    'recipes-download-shopping-cart-pdf': 2,
+    'ingredients-list': 1,
+    'ingredients-detail': 2,
+    'tags-list': 3,
+    'tags-detail': 2,
+    'tags-list-not-modified': 3,
+    'users-list': 3,
+    'users-list-popular': 3,
+    'users-list-create': 4,
+    'users-detail': 2,
+    'users-me': 1,
+    'users-me-not-modified': 1,
+    'users-set-password': 3,
+    'users-subscriptions': 4,
+    'users-subscriptions-cursor': 3,
+    'users-subscriptions-prolific': 4,
+    'users-subscribe-add': 7,
+    'users-subscribe-remove': 6,
+    'metrics': 0,
+}
+
+
+def png_image():
+    buffer = io.BytesIO()
+    Image.new('RGB', (64, 64), (200, 120, 40)).save(buffer, 'PNG')
+    return ('data:image/png;base64,'
+            + base64.b64encode(buffer.getvalue()).decode())
+
+
+def response_id(response):
+    return getattr(response, 'data', None) and response.data.get('id')
+
+
+def batch_changes(add, remove):
+    return {name: {'add': add, 'remove': remove}
+            for name in ('favorite', 'shopping_cart')}
+
+
+class Scenario:
+    def __init__(self, label, route, method='get', kwargs=None, params=None,
+                 data=None, paginated=False, anonymous=False, setup=None,
+                 cleanup=None, status=200, warm=False, conditional=False,
+                 user=None):
+        self.label = label
+        self.route = route
+        self.method = method
+        self.kwargs = kwargs
+        self.params = params or {}
+        self.data = data
+        self.paginated = paginated
+        self.anonymous = anonymous
+        self.setup = setup
+        self.cleanup = cleanup
+        self.status = status
+        self.warm = warm
+        self.conditional = conditional
+        # Who the request is made as, the benchmarked user by default.
+        self.user = user
+
+
+# Settings both run under: no background image rendering, fast hashing
+# and an open metrics endpoint.
+BENCHMARK_SETTINGS = {
+    'IMAGE_PROCESSING_ENABLED': False,
+    'PASSWORD_HASHERS': ['django.contrib.auth.hashers.MD5PasswordHasher'],
+    'METRICS_PUBLIC': True,
+}
+
+
+class ApiBenchmark:
+    """Seeds a dataset and describes one request ``Scenario`` per
+    endpoint variant. Expects an empty test database."""
+
+    def seed(self, options):
+        self.image = png_image()
+        self.page_sizes = tuple(options['page_sizes'])
+        rnd = random.Random(options['seed'])
+        password = make_password(PASSWORD)
+        User.objects.bulk_create(
+            User(username=f'bench{i}', email=f'bench{i}@example.com',
+                 first_name='Bench', last_name=f'User {i}',
+                 password=password)
+            for i in range(options['users'])
+        )
+        users = list(User.objects.order_by('id'))
+        Tag.objects.bulk_create(
+            Tag(name=f'Tag {i}', color=f'#{i:06x}', slug=f'tag-{i}')
+            for i in range(8)
+        )
+        tags = list(Tag.objects.all())
+        Ingredient.objects.bulk_create(
+            Ingredient(name=f'ingredient {i}',
+                       measurement_unit=rnd.choice(['g', 'ml', 'pcs']))
+            for i in range(2000)
+        )
+        ingredients = list(Ingredient.objects.all())
+        Recipe.objects.bulk_create(
+            Recipe(author=rnd.choice(users), name=f'Recipe {i}',
+                   image='foodgram/benchmark.png', text='Benchmark recipe',
+                   cooking_time=rnd.randint(1, 120))
+            for i in range(options['recipes'])
+        )
+        recipes = list(Recipe.objects.all())
+        TagsOfRecipe.objects.bulk_create(
+            TagsOfRecipe(recipe=recipe, tag=tag)
+            for recipe in recipes for tag in rnd.sample(tags, 2)
+        )
+        IngredientsOfRecipe.objects.bulk_create(
+            IngredientsOfRecipe(recipe=recipe, ingredient=ingredient,
+                                amount=rnd.randint(1, 500))
+            for recipe in recipes
+            for ingredient in rnd.sample(ingredients, 8)
+        )
+        favorites, carts, follows = [], [], []
+        for user in users:
+            for recipe in rnd.sample(recipes, 20):
+                favorites.append(Favorite(user=user, recipe=recipe))
+            for recipe in rnd.sample(recipes, 5):
+                carts.append(Cart(user=user, recipe=recipe))
+            for author in rnd.sample(users, 10):
+                if author != user:
+                    follows.append(Follow(user=user, author=author))
+        Favorite.objects.bulk_create(favorites)
+        Cart.objects.bulk_create(carts)
+        Follow.objects.bulk_create(follows)
+
+        # The benchmarked user has enough of everything to fill the
+        # largest page size on every list endpoint.
+        self.user = users[0]
+        self.author = users[1]
+        depth = max(options['page_sizes']) * 2
+        heavy = recipes[:depth]
+        Favorite.objects.bulk_create(
+            [Favorite(user=self.user, recipe=r) for r in heavy],
+            ignore_conflicts=True
+        )
+        Cart.objects.bulk_create(
+            [Cart(user=self.user, recipe=r) for r in heavy],
+            ignore_conflicts=True
+        )
+        Follow.objects.filter(user=self.user).delete()
+        Follow.objects.bulk_create(
+            Follow(user=self.user, author=author)
+            for author in users[2:depth + 2]
+        )
+        self.fan = users[-1]
+        prolific = users[-7:-1]
+        Recipe.objects.bulk_create(
+            Recipe(author=author, name=f'Prolific recipe {i}',
+                   image='foodgram/benchmark.png', text='Benchmark recipe',
+                   cooking_time=rnd.randint(1, 120))
+            for author in prolific
+            for i in range(options.get('prolific_recipes',
+                                       PROLIFIC_RECIPES))
+        )
+        Follow.objects.filter(user=self.fan).delete()
+        Follow.objects.bulk_create(
+            Follow(user=self.fan, author=author) for author in prolific
+        )
+        self.users = users
+        self.tags = tags
+        self.ingredients = ingredients
+        reference_registry.invalidate()
+        reference_registry.get()
+        call_command('rebuild_shopping_lists', stdout=io.StringIO())
+        call_command('reconcile_counters', stdout=io.StringIO())
+        call_command('rebuild_search_index', stdout=io.StringIO())
+        self.recipe = Recipe.objects.exclude(
+            favorites__user=self.user
+        ).exclude(carted__user=self.user).first()
+        self.batch_recipes = list(Recipe.objects.exclude(
+            favorites__user=self.user
+        ).exclude(carted__user=self.user).exclude(
+            id=self.recipe.id
+        ).values_list('id', flat=True)[:10])
+        self.own_recipe = Recipe.objects.create(
+            author=self.user, name='Benchmark own recipe',
+            image='foodgram/benchmark.png', text='Benchmark recipe',
+            cooking_time=10
+        )
+        self.counter = 0
+        self.clients = {}
+
+    def carted_recipe(self):
+        """A recipe of the benchmarked user in many shopping carts."""
+        recipe = Recipe.objects.create(
+            author=self.user, name='Benchmark deleted recipe',
+            image='foodgram/benchmark.png', text='Deleted', cooking_time=1
+        )
+        IngredientsOfRecipe.objects.bulk_create(
+            IngredientsOfRecipe(recipe=recipe, ingredient=ingredient,
+                                amount=10)
+            for ingredient in self.ingredients[:8]
+        )
+        carting = [user.id for user in self.users[:CARTING_USERS]]
+        Cart.objects.bulk_create(
+            Cart(user_id=user_id, recipe=recipe) for user_id in carting
+        )
+        ShoppingListItem.objects.add_amounts(carting,
+                                             recipe_amounts(recipe.id))
+        return recipe
+
+    def recipe_payload(self):
+        self.counter += 1
+        return {
+            'name': f'Benchmark recipe {self.counter}',
+            'text': 'Benchmark recipe',
+            'cooking_time': 30,
+            'image': self.image,
+            'tags': [tag.id for tag in self.tags[:2]],
+            'ingredients': [
+                {'id': ingredient.id, 'amount': 10}
+                for ingredient in self.ingredients[:30]
+            ],
+        }
+
+    def scenarios(self):
+        user, recipe, author = self.user, self.recipe, self.author
+        created = {}
+
+        def drop_created(response):
+            User.objects.filter(id=response_id(response)).delete()
+
+        return [
+            Scenario('recipes-list', 'recipes-list', paginated=True),
+            Scenario('recipes-list-cursor', 'recipes-list', paginated=True,
+                     params={'cursor': ''}),
+            Scenario('recipes-list-anonymous', 'recipes-list',
+                     paginated=True, anonymous=True,
+                     setup=response_cache.bump_version),
+            Scenario('recipes-list-anonymous-cached', 'recipes-list',
+                     paginated=True, anonymous=True, warm=True),
+            Scenario('recipes-list-tags', 'recipes-list', paginated=True,
+                     params={'tags': [self.tags[0].slug, self.tags[1].slug]}),
+            Scenario('recipes-list-author', 'recipes-list', paginated=True,
+                     params={'author': author.id}),
+            Scenario('recipes-list-favorited', 'recipes-list',
+                     paginated=True, params={'is_favorited': 1}),
+            Scenario('recipes-list-in-cart', 'recipes-list', paginated=True,
+                     params={'is_in_shopping_cart': 1}),
+            Scenario('recipes-list-popular', 'recipes-list', paginated=True,
+                     params={'ordering': '-favorites_count'}),
+            Scenario('recipes-list-search', 'recipes-list', paginated=True,
+                     params={'search': 'recipe 12'}),
+            Scenario('recipes-detail', 'recipes-detail',
+                     kwargs={'pk': recipe.id}),
+            Scenario('recipes-detail-anonymous-cached', 'recipes-detail',
+                     kwargs={'pk': recipe.id}, anonymous=True, warm=True),
+            Scenario('recipes-list-not-modified', 'recipes-list',
+                     paginated=True, conditional=True, status=304),
+            Scenario('recipes-detail-not-modified', 'recipes-detail',
+                     kwargs={'pk': recipe.id}, conditional=True,
+                     status=304),
+            Scenario('recipes-create', 'recipes-list', method='post',
+                     data=self.recipe_payload, status=201,
+                     cleanup=lambda response: Recipe.objects.filter(
+                         id=response_id(response)).delete()),
+            Scenario('recipes-import', 'recipes-import-recipes',
+                     method='post', data=lambda: [
+                         self.recipe_payload() for _ in range(20)
+                     ],
+                     cleanup=lambda response: Recipe.objects.filter(
+                         id__in=[row['id'] for row in
+                                 response.data['created']]
+                     ).delete() if response.status_code == 200 else None),
+            Scenario('recipes-update', 'recipes-detail', method='patch',
+                     kwargs={'pk': self.own_recipe.id},
+                     data=self.recipe_payload),
+            Scenario('recipes-delete', 'recipes-detail', method='delete',
+                     kwargs=lambda: {'pk': created['id']}, status=204,
+                     setup=lambda: created.update(
+                         id=self.carted_recipe().id
+                     )),
+            Scenario('recipes-favorite-add', 'recipes-favorite',
+                     kwargs={'pk': recipe.id}, status=201,
+                     cleanup=lambda response: Favorite.objects.filter(
+                         user=user, recipe=recipe).delete()),
+            Scenario('recipes-favorite-remove', 'recipes-favorite',
+                     method='delete', kwargs={'pk': recipe.id}, status=204,
+                     setup=lambda: Favorite.objects.create(
+                         user=user, recipe=recipe)),
+            Scenario('recipes-shopping-cart-add', 'recipes-shopping-cart',
+                     kwargs={'pk': recipe.id}, status=201,
+                     cleanup=lambda response: Cart.objects.filter(
+                         user=user, recipe=recipe).delete()),
+            Scenario('recipes-shopping-cart-remove', 'recipes-shopping-cart',
+                     method='delete', kwargs={'pk': recipe.id}, status=204,
+                     setup=lambda: Cart.objects.create(
+                         user=user, recipe=recipe)),
+            Scenario('recipes-batch', 'recipes-batch', method='post',
+                     data=batch_changes(self.batch_recipes[:5],
+                                        self.batch_recipes[5:]),
+                     setup=lambda: toggle_recipes(user, batch_changes(
+                         self.batch_recipes[5:], [])),
+                     cleanup=lambda response: toggle_recipes(
+                         user, batch_changes([], self.batch_recipes[:5]))),
+            Scenario('recipes-download-shopping-cart',
+                     'recipes-download-shopping-cart'),
+            Scenario('recipes-download-shopping-cart-csv',
+                     'recipes-download-shopping-cart',
+                     params={'format': 'csv'}),
+            Scenario('recipes-download-shopping-cart-pdf',
+                     'recipes-download-shopping-cart',
+                     params={'format': 'pdf'}),
+            Scenario('ingredients-list', 'ingredients-list',
+                     params={'name': 'ingredient 1'}),
+            Scenario('ingredients-detail', 'ingredients-detail',
+                     kwargs={'pk': self.ingredients[0].id}),
+            Scenario('tags-list', 'tags-list'),
+            Scenario('tags-detail', 'tags-detail',
+                     kwargs={'pk': self.tags[0].id}),
+            Scenario('tags-list-not-modified', 'tags-list', conditional=True,
+                     status=304),
+            Scenario('users-list', 'users-list', paginated=True),
+            Scenario('users-list-popular', 'users-list', paginated=True,
+                     params={'ordering': '-followers_count'}),
+            Scenario('users-list-create', 'users-list', method='post',
+                     anonymous=True, status=201, cleanup=drop_created,
+                     data=lambda: {
+                         'email': f'new{self.counter}@example.com',
+                         'username': f'new{self.counter}',
+                         'first_name': 'New', 'last_name': 'User',
+                         'password': PASSWORD,
+                     }, setup=lambda: setattr(
+                         self, 'counter', self.counter + 1)),
+            Scenario('users-detail', 'users-detail',
+                     kwargs={'pk': author.id}),
+            Scenario('users-me', 'users-me'),
+            Scenario('users-me-not-modified', 'users-me', conditional=True,
+                     status=304),
+            Scenario('users-set-password', 'users-set-password',
+                     method='post', status=204,
+                     data={'current_password': PASSWORD,
+                           'new_password': PASSWORD}),
+            Scenario('users-subscriptions', 'users-subscriptions',
+                     paginated=True, params={'recipes_limit': 3}),
+            Scenario('users-subscriptions-cursor', 'users-subscriptions',
+                     paginated=True,
+                     params={'cursor': '', 'recipes_limit': 3}),
+            Scenario('users-subscriptions-prolific', 'users-subscriptions',
+                     params={'recipes_limit': 3}, user=self.fan),
+            Scenario('users-subscribe-add', 'users-subscribe',
+                     kwargs={'pk': author.id}, status=201,
+                     params={'recipes_limit': 3},
+                     cleanup=lambda response: Follow.objects.filter(
+                         user=user, author=author).delete()),
+            Scenario('users-subscribe-remove', 'users-subscribe',
+                     method='delete', kwargs={'pk': author.id}, status=204,
+                     setup=lambda: Follow.objects.create(
+                         user=user, author=author)),
+            Scenario('metrics', 'metrics'),
+        ]
+
+    def call(self, client, scenario, page_size=None, headers=None):
+        kwargs = scenario.kwargs
+        if callable(kwargs):
+            kwargs = kwargs()
+        url = reverse(scenario.route, kwargs=kwargs)
+        params = dict(scenario.params)
+        if page_size is not None:
+            params['limit'] = page_size
+        data = scenario.data() if callable(scenario.data) else scenario.data
+        if scenario.method == 'get':
+            return client.get(url, params, **(headers or {}))
+        if params:
+            url = f'{url}?' + '&'.join(f'{k}={v}' for k, v in params.items())
+        return getattr(client, scenario.method)(url, data, format='json')
+
+    def measure(self, client, scenario, page_size=None):
+        if scenario.setup:
+            scenario.setup()
+        headers = {}
+        if scenario.warm or scenario.conditional:
+            response = self.call(client, scenario, page_size)
+            if scenario.conditional:
+                headers['HTTP_IF_NONE_MATCH'] = response['ETag']
+        with CaptureQueriesContext(connection) as queries:
+            start = time.perf_counter()
+            response = self.call(client, scenario, page_size, headers)
+            if response.streaming:
+                b''.join(response.streaming_content)
+            elapsed = (time.perf_counter() - start) * 1000
+        if scenario.cleanup:
+            scenario.cleanup(response)
+        return response, len(queries.captured_queries), elapsed
+
+    def count_queries(self, client, scenario):
+        """Call ``scenario`` once per page size, or once if it is not
+        paginated. Return the query counts by page size, the statuses
+        seen and the last response."""
+        sizes = self.page_sizes if scenario.paginated else (None,)
+        queries, statuses = {}, set()
+        for size in sizes:
+            response, count, _ = self.measure(client, scenario, size)
+            queries[str(size or 'default')] = count
+            statuses.add(response.status_code)
+        return queries, statuses, response
+
+    def within_budget(self, scenario, queries, statuses):
+        counts = list(queries.values())
+        return (statuses == {scenario.status}
+                and max(counts) <= QUERY_BUDGETS[scenario.label]
+                and len(set(counts)) == 1)
+
+    def client(self, scenario):
+        """The ``APIClient`` that makes the requests of ``scenario``."""
+        user = None if scenario.anonymous else scenario.user or self.user
+        if user not in self.clients:
+            client = self.clients[user] = APIClient(
+                raise_request_exception=False
+            )
+            if user is not None:
+                token = Token.objects.create(user=user)
+                client.credentials(HTTP_AUTHORIZATION=f'Token {token.key}')
+        return self.clients[user]
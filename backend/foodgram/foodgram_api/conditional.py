@@ -0,0 +1,103 @@
+import hashlib
+
+from django.shortcuts import get_object_or_404
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import http_date
+from rest_framework import status
+from rest_framework.response import Response
+
+
+def make_etag(request, count, versions):
+    """Strong ETag of a response to ``request`` built from ``versions``,
+    one per object, and the total ``count`` of a paginated list."""
+    state = (
+        request.get_full_path(),
+        request.META.get('HTTP_ACCEPT', ''),
+        count,
+        list(versions),
+    )
+    return f'"{hashlib.md5(repr(state).encode()).hexdigest()}"'
+
+
+class ConditionalGetMixin:
+    """Strong ETags and ``Last-Modified`` for ``list`` and ``retrieve``.
+
+    A request carrying ``If-None-Match`` or ``If-Modified-Since`` is first
+    checked against ``get_validator_objects()``, a cheap version of the
+    page or object, and answered with 304 before the serializer runs. Full
+    responses take their ETag from the objects that were serialized, so
+    they cost no extra queries.
+    """
+    conditional_actions = ('list', 'retrieve')
+    serialized_objects = None
+
+    def get_validator_queryset(self):
+        return self.get_queryset()
+
+    def get_validator_objects(self):
+        queryset = self.filter_queryset(self.get_validator_queryset())
+        if self.action == 'retrieve':
+            lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+            return [get_object_or_404(queryset, **{
+                self.lookup_field: self.kwargs[lookup_url_kwarg]
+            })]
+        page = self.paginate_queryset(queryset)
+        return list(queryset) if page is None else page
+
+    def object_version(self, obj):
+        return tuple(getattr(obj, field.attname)
+                     for field in obj._meta.concrete_fields)
+
+    def get_last_modified(self, objects):
+        return None
+
+    def get_etag(self, objects):
+        page = getattr(self.paginator, 'page', None)
+        return make_etag(
+            self.request,
+            page.paginator.count if page is not None else None,
+            (self.object_version(obj) for obj in objects)
+        )
+
+    def set_validators(self, response, objects):
+        response['ETag'] = self.get_etag(objects)
+        last_modified = self.get_last_modified(objects)
+        if last_modified is not None:
+            response['Last-Modified'] = http_date(last_modified.timestamp())
+        patch_vary_headers(response, ('Authorization',))
+        return response
+
+    def get_serializer(self, *args, **kwargs):
+        if args:
+            self.serialized_objects = (
+                args[0] if kwargs.get('many') else [args[0]]
+            )
+        return super().get_serializer(*args, **kwargs)
+
+    def conditional(self, handler, request, *args, **kwargs):
+        if self.action not in self.conditional_actions:
+            return handler(request, *args, **kwargs)
+        if ('HTTP_IF_NONE_MATCH' in request.META
+                or 'HTTP_IF_MODIFIED_SINCE' in request.META):
+            objects = self.get_validator_objects()
+            last_modified = self.get_last_modified(objects)
+            not_modified = get_conditional_response(
+                request, etag=self.get_etag(objects),
+                last_modified=(int(last_modified.timestamp())
+                               if last_modified is not None else None)
+            )
+            if not_modified is not None:
+                return self.set_validators(
+                    Response(status=status.HTTP_304_NOT_MODIFIED), objects
+                )
+        response = handler(request, *args, **kwargs)
+        if (response.status_code == status.HTTP_200_OK
+                and self.serialized_objects is not None):
+            self.set_validators(response, self.serialized_objects)
+        return response
+
+    def list(self, request, *args, **kwargs):
+        return self.conditional(super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.conditional(super().retrieve, request, *args, **kwargs)
@@ -0,0 +1,70 @@
+from django.contrib.auth import get_user_model
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from users.models import Follow, Profile
+
+from .models import Cart, Favorite, Recipe
+
+User = get_user_model()
+
+BATCH_SIZE = 500
+
+# counter: (model whose rows are counted, its foreign key to the owner)
+RECIPE_COUNTERS = {
+    'favorites_count': (Favorite, 'recipe'),
+    'carts_count': (Cart, 'recipe'),
+}
+PROFILE_COUNTERS = {
+    'recipes_count': (Recipe, 'author'),
+    'followers_count': (Follow, 'author'),
+    'following_count': (Follow, 'user'),
+}
+
+
+def counted(model, field):
+    return Coalesce(Subquery(
+        model.objects.filter(
+            **{field: OuterRef('pk')}
+        ).order_by().values(field).annotate(total=Count('*')).values('total')
+    ), 0)
+
+
+def drifted(queryset, counters):
+    """Primary keys of the rows whose counters differ from a fresh
+    count."""
+    return list(queryset.annotate(**{
+        f'actual_{name}': counted(*source)
+        for name, source in counters.items()
+    }).exclude(**{
+        name: F(f'actual_{name}') for name in counters
+    }).order_by('pk').values_list('pk', flat=True))
+
+
+def repair(model, pks, counters):
+    for start in range(0, len(pks), BATCH_SIZE):
+        model.objects.filter(pk__in=pks[start:start + BATCH_SIZE]).update(**{
+            name: counted(*source) for name, source in counters.items()
+        })
+
+
+def create_missing_profiles():
+    missing = User.objects.filter(
+        profile__isnull=True
+    ).values_list('pk', flat=True)
+    return len(Profile.objects.bulk_create(
+        [Profile(user_id=pk) for pk in missing], ignore_conflicts=True
+    ))
+
+
+def reconcile_counters(dry_run=False):
+    """Recount every denormalized counter, fix the rows that drifted and
+    return how many there were per model."""
+    report = {'profiles_created': 0 if dry_run else create_missing_profiles()}
+    for model, counters in ((Recipe, RECIPE_COUNTERS),
+                            (Profile, PROFILE_COUNTERS)):
+        pks = drifted(model.objects.all(), counters)
+        if not dry_run:
+            repair(model, pks, counters)
+        report[model._meta.model_name] = len(pks)
+    return report
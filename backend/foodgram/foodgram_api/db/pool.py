@@ -0,0 +1,252 @@
+"""A bounded pool of open database connections per process.
+
+The backends in ``foodgram_api.db.postgresql`` and ``foodgram_api.db.sqlite3``
+check connections out of the pool instead of opening them and return them
+instead of closing, so with the default ``CONN_MAX_AGE = 0`` a request
+hands its connection back when it finishes and the next one, on any
+thread, reuses it. The pool is configured by the ``POOL`` dictionary of
+the database settings:
+
+``MAX_SIZE``
+    connections open at once, checked out or idle; a thread that needs
+    one more waits for a connection to come back;
+``TIMEOUT``
+    seconds to wait before the checkout fails with ``OperationalError``;
+``MAX_LIFETIME``
+    seconds after which a connection is closed instead of reused;
+``CHECK_AFTER``
+    seconds a connection may stay idle before checkout runs ``SELECT 1``
+    on it, replacing it with a new one if the check fails.
+"""
+import os
+import threading
+import time
+from collections import Counter, deque
+from functools import partial
+
+DEFAULTS = {
+    'MAX_SIZE': 10,
+    'TIMEOUT': 10,
+    'MAX_LIFETIME': 3600,
+    'CHECK_AFTER': 5,
+}
+COUNTERS = ('checkouts', 'connects', 'waits', 'wait_seconds', 'timeouts',
+            'recycled', 'failed_checks')
+
+
+class PoolTimeout(Exception):
+    pass
+
+
+def close_quietly(connection):
+    try:
+        connection.close()
+    except Exception:
+        pass
+
+
+def ping(connection):
+    try:
+        cursor = connection.cursor()
+        try:
+            cursor.execute('SELECT 1')
+            cursor.fetchone()
+        finally:
+            cursor.close()
+    except Exception:
+        return False
+    return True
+
+
+class ConnectionPool:
+
+    def __init__(self, max_size, timeout, max_lifetime, check_after):
+        self.max_size = max_size
+        self.timeout = timeout
+        self.max_lifetime = max_lifetime
+        self.check_after = check_after
+        self.generation = 0
+        self.reset()
+
+    def reset(self):
+        self.stats = Counter()
+        self.lock = threading.Lock()
+        self.returned = threading.Condition(self.lock)
+        # (connection, created, returned at), the last returned on the right.
+        self.idle = deque()
+        self.open = 0
+
+    def forget(self):
+        """Drop every connection without closing it. Used in a forked
+        child, whose copies of the parent's connections share their
+        sockets with the parent."""
+        self.reset()
+        self.generation += 1
+
+    def checkout(self, connect):
+        """Return ``(connection, lease)``, reusing an idle connection or
+        opening one with ``connect()``. The lease goes back to
+        ``checkin`` or ``discard`` with the connection."""
+        with self.lock:
+            self.stats['checkouts'] += 1
+            waited_since = None
+            while not self.idle and self.open >= self.max_size:
+                now = time.monotonic()
+                if waited_since is None:
+                    waited_since = now
+                    self.stats['waits'] += 1
+                remaining = waited_since + self.timeout - now
+                if remaining <= 0:
+                    self.stats['timeouts'] += 1
+                    self.stats['wait_seconds'] += now - waited_since
+                    raise PoolTimeout(
+                        f'No database connection was returned to the pool '
+                        f'of {self.max_size} in {self.timeout} s.'
+                    )
+                self.returned.wait(remaining)
+            if waited_since is not None:
+                self.stats['wait_seconds'] += time.monotonic() - waited_since
+            if self.idle:
+                entry = self.idle.pop()
+            else:
+                entry = None
+                self.open += 1
+            generation = self.generation
+        try:
+            if entry is not None:
+                connection, created, returned = entry
+                now = time.monotonic()
+                if now - created >= self.max_lifetime:
+                    self.count('recycled')
+                elif (now - returned >= self.check_after
+                        and not ping(connection)):
+                    self.count('failed_checks')
+                else:
+                    return connection, (created, generation)
+                close_quietly(connection)
+            created = time.monotonic()
+            connection = connect()
+        except BaseException:
+            self.release(generation)
+            raise
+        self.count('connects')
+        return connection, (created, generation)
+
+    def checkin(self, connection, lease):
+        created, generation = lease
+        if time.monotonic() - created >= self.max_lifetime:
+            self.count('recycled')
+            self.discard(connection, lease)
+            return
+        with self.lock:
+            if generation != self.generation:
+                return
+            self.idle.append((connection, created, time.monotonic()))
+            self.returned.notify()
+
+    def discard(self, connection, lease):
+        """Close a checked out connection and free its place."""
+        if lease[1] != self.generation:
+            return
+        close_quietly(connection)
+        self.release(lease[1])
+
+    def release(self, generation):
+        with self.lock:
+            if generation == self.generation:
+                self.open -= 1
+                self.returned.notify()
+
+    def close_idle(self):
+        with self.lock:
+            idle, self.idle = self.idle, deque()
+            self.open -= len(idle)
+            self.returned.notify_all()
+        for connection, _, _ in idle:
+            close_quietly(connection)
+
+    def count(self, name):
+        with self.lock:
+            self.stats[name] += 1
+
+    def snapshot(self):
+        with self.lock:
+            return {**{name: self.stats[name] for name in COUNTERS},
+                    'open': self.open, 'idle': len(self.idle),
+                    'max_size': self.max_size}
+
+
+pools = {}
+pools_lock = threading.Lock()
+
+
+def get_pool(alias, settings_dict):
+    with pools_lock:
+        pool = pools.get(alias)
+        if pool is None:
+            options = {**DEFAULTS, **settings_dict.get('POOL', {})}
+            pool = pools[alias] = ConnectionPool(
+                max_size=int(options['MAX_SIZE']),
+                timeout=float(options['TIMEOUT']),
+                max_lifetime=float(options['MAX_LIFETIME']),
+                check_after=float(options['CHECK_AFTER']),
+            )
+        return pool
+
+
+def pool_stats():
+    """Counters and sizes of every pool of this process, by alias."""
+    with pools_lock:
+        return {alias: pool.snapshot() for alias, pool in pools.items()}
+
+
+def close_pools():
+    """Close the idle connections of every pool, e.g. before forking."""
+    with pools_lock:
+        for pool in pools.values():
+            pool.close_idle()
+
+
+def forget_pools():
+    global pools_lock
+    # Another thread of the parent may have held the lock when it forked.
+    pools_lock = threading.Lock()
+    for pool in pools.values():
+        pool.forget()
+
+
+os.register_at_fork(after_in_child=forget_pools)
+
+
+class PooledDatabaseWrapperMixin:
+    """Take connections of a ``DatabaseWrapper`` from the alias' pool and
+    give them back on close. A connection closed inside a transaction,
+    with an autocommit mode other than the configured one, or broken by an
+    error is closed for real."""
+
+    pool_lease = None
+
+    @property
+    def pool(self):
+        return get_pool(self.alias, self.settings_dict)
+
+    def get_new_connection(self, conn_params):
+        try:
+            connection, self.pool_lease = self.pool.checkout(
+                partial(super().get_new_connection, conn_params)
+            )
+        except PoolTimeout as error:
+            raise self.Database.OperationalError(str(error)) from error
+        return connection
+
+    def _close(self):
+        if self.connection is None or self.pool_lease is None:
+            return super()._close()
+        connection, lease = self.connection, self.pool_lease
+        self.pool_lease = None
+        if (self.in_atomic_block
+                or self.get_autocommit() != self.settings_dict['AUTOCOMMIT']
+                or (self.errors_occurred and not self.is_usable())):
+            self.pool.discard(connection, lease)
+        else:
+            self.pool.checkin(connection, lease)
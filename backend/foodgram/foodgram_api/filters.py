@@ -1,12 +1,14 @@
+from django.db.models import Exists, OuterRef
 from django_filters import rest_framework as filters
+from rest_framework.filters import OrderingFilter
 
-from .models import Recipe
+from .fulltext import search_recipes
+from .models import Cart, Favorite, Recipe, TagsOfRecipe
 
 
 class RecipeFilter(filters.FilterSet):
-    author = filters.CharFilter(
-        field_name='author__id',
-        lookup_expr='icontains'
+    author = filters.NumberFilter(
+        field_name='author'
     )
     is_favorited = filters.CharFilter(
         method='filter_favorited'
@@ -14,31 +16,63 @@ class RecipeFilter(filters.FilterSet):
     is_in_shopping_cart = filters.CharFilter(
         method='filter_in_shopping_cart'
     )
+    search = filters.CharFilter(
+        method='filter_search'
+    )
 
     class Meta:
         model = Recipe
-        fields = ('author', 'is_favorited', 'is_in_shopping_cart')
+        fields = ('author', 'is_favorited', 'is_in_shopping_cart', 'search')
 
     @property
     def qs(self):
         queryset = super().qs
-        tags = dict(self.request.query_params).get('tags')
+        tags = self.request.query_params.getlist('tags')
         if tags:
-            return queryset.filter(tags__slug__in=tags).distinct()
+            return queryset.filter(Exists(TagsOfRecipe.objects.filter(
+                recipe=OuterRef('pk'), tag__slug__in=tags
+            )))
         return queryset
 
     def filter_favorited(self, queryset, name, value):
         if (value != 'false' and value != '0'
                 and not self.request.user.is_anonymous):
-            favorites = self.request.user.favorites.all()
-            ids = favorites.values_list('recipe__id')
-            return queryset.filter(id__in=ids)
+            return queryset.filter(Exists(Favorite.objects.filter(
+                user=self.request.user, recipe=OuterRef('pk')
+            )))
         return queryset
 
     def filter_in_shopping_cart(self, queryset, name, value):
         if (value != 'false' and value != '0'
                 and not self.request.user.is_anonymous):
-            in_shopping_cart = self.request.user.carted.all()
-            ids = in_shopping_cart.values_list('recipe__id')
-            return queryset.filter(id__in=ids)
+            return queryset.filter(Exists(Cart.objects.filter(
+                user=self.request.user, recipe=OuterRef('pk')
+            )))
         return queryset
+
+    def filter_search(self, queryset, name, value):
+        return search_recipes(queryset, value)
+
+
+class StableOrderingFilter(OrderingFilter):
+    """``?ordering=`` over the view's ``ordering_fields``, translated to
+    lookups through its ``ordering_lookups`` and always ending on the
+    primary key, so pages and cursors stay stable on counters. A view can
+    pick its default per request with ``get_default_ordering()``."""
+
+    def get_default_ordering(self, view):
+        if hasattr(view, 'get_default_ordering'):
+            return view.get_default_ordering()
+        return super().get_default_ordering(view)
+
+    def get_ordering(self, request, queryset, view):
+        ordering = list(super().get_ordering(request, queryset, view) or ())
+        if not any(term.lstrip('-') in ('id', 'pk') for term in ordering):
+            descending = bool(ordering) and ordering[0].startswith('-')
+            ordering.append('-id' if descending else 'id')
+        lookups = getattr(view, 'ordering_lookups', {})
+        return [
+            ('-' if term.startswith('-') else '')
+            + lookups.get(term.lstrip('-'), term.lstrip('-'))
+            for term in ordering
+        ]
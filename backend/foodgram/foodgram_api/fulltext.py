@@ -0,0 +1,167 @@
+"""Ranked full-text search over recipe names, descriptions and ingredient
+names.
+
+The documents live outside the ORM, so recipe queries never load them:
+PostgreSQL keeps a weighted ``tsvector`` column on the recipe table behind
+a GIN index, SQLite an FTS5 table keyed by recipe id. Both are created by
+migration ``0008_recipe_search`` and rebuilt for a recipe after every
+committed change to it or its ingredients.
+"""
+import re
+import threading
+
+from django.conf import settings
+from django.db import connections, transaction
+from django.db.models import (BooleanField, Exists, FloatField, OuterRef, Q,
+                              Value)
+from django.db.models.expressions import RawSQL
+
+from .models import (Ingredient, IngredientsOfRecipe, Recipe,
+                     RecipeSearchDocument)
+
+MAX_TERMS = 8
+BATCH_SIZE = 500
+RECIPE_TABLE = Recipe._meta.db_table
+FTS_TABLE = RecipeSearchDocument._meta.db_table
+# SQL returning the space separated ingredient names of ``recipe``.
+INGREDIENT_NAMES = (
+    f'SELECT {{aggregate}} FROM {IngredientsOfRecipe._meta.db_table} item '
+    f'JOIN {Ingredient._meta.db_table} ingredient '
+    f'ON ingredient.id = item.ingredient_id '
+    f'WHERE item.recipe_id = recipe.id'
+)
+
+
+def search_terms(text):
+    """Words of ``text``, matched as prefixes and all required."""
+    return re.findall(r'[^\W_]+', text.casefold())[:MAX_TERMS]
+
+
+class PostgresSearch:
+
+    def refresh(self, cursor, recipe_ids):
+        config = settings.SEARCH_CONFIG
+        names = INGREDIENT_NAMES.format(
+            aggregate="string_agg(ingredient.name, ' ')"
+        )
+        cursor.execute(
+            f"UPDATE {RECIPE_TABLE} recipe SET search_vector = "
+            f"setweight(to_tsvector(%s::regconfig, recipe.name), 'A') || "
+            f"setweight(to_tsvector(%s::regconfig, recipe.text), 'B') || "
+            f"setweight(to_tsvector(%s::regconfig, "
+            f"coalesce(({names}), '')), 'C') "
+            f"WHERE recipe.id = ANY(%s)",
+            [config, config, config, recipe_ids]
+        )
+
+    def search(self, queryset, terms):
+        query = 'to_tsquery(%s::regconfig, %s)'
+        params = [settings.SEARCH_CONFIG,
+                  ' & '.join(f'{term}:*' for term in terms)]
+        vector = f'"{RECIPE_TABLE}"."search_vector"'
+        return queryset.annotate(search_rank=RawSQL(
+            f'ts_rank({vector}, {query})', params, output_field=FloatField()
+        )).filter(RawSQL(
+            f'{vector} @@ {query}', params, output_field=BooleanField()
+        ))
+
+
+class SQLiteSearch:
+
+    def refresh(self, cursor, recipe_ids):
+        placeholders = ', '.join(['%s'] * len(recipe_ids))
+        cursor.execute(
+            f'DELETE FROM {FTS_TABLE} WHERE rowid IN ({placeholders})',
+            recipe_ids
+        )
+        names = INGREDIENT_NAMES.format(
+            aggregate="group_concat(ingredient.name, ' ')"
+        )
+        cursor.execute(
+            f"INSERT INTO {FTS_TABLE} (rowid, name, text, ingredients) "
+            f"SELECT recipe.id, recipe.name, recipe.text, "
+            f"coalesce(({names}), '') FROM {RECIPE_TABLE} recipe "
+            f"WHERE recipe.id IN ({placeholders})",
+            recipe_ids
+        )
+
+    def search(self, queryset, terms):
+        match = ' '.join(f'"{term}"*' for term in terms)
+        # Joined rather than queried per row: FTS5 runs the MATCH once.
+        # bm25() is lower for better matches; name outweighs text, which
+        # outweighs ingredient names.
+        return queryset.filter(search_document__isnull=False).filter(RawSQL(
+            f'"{FTS_TABLE}" MATCH %s', [match], output_field=BooleanField()
+        )).annotate(search_rank=RawSQL(
+            f'-bm25("{FTS_TABLE}", 10.0, 5.0, 1.0)', [],
+            output_field=FloatField()
+        ))
+
+
+class SubstringSearch:
+    """Unranked fallback for databases without a full-text index."""
+
+    def refresh(self, cursor, recipe_ids):
+        pass
+
+    def search(self, queryset, terms):
+        for term in terms:
+            queryset = queryset.filter(
+                Q(name__icontains=term) | Q(text__icontains=term)
+                | Exists(IngredientsOfRecipe.objects.filter(
+                    recipe=OuterRef('pk'), ingredient__name__icontains=term
+                ))
+            )
+        return queryset.annotate(search_rank=Value(
+            0.0, output_field=FloatField()
+        ))
+
+
+BACKENDS = {
+    'postgresql': PostgresSearch(),
+    'sqlite': SQLiteSearch(),
+}
+
+
+def get_backend(using):
+    return BACKENDS.get(connections[using].vendor, SubstringSearch())
+
+
+def search_recipes(queryset, text):
+    """Filter ``queryset`` to recipes matching every word of ``text`` and
+    annotate ``search_rank``, higher for better matches."""
+    terms = search_terms(text)
+    if not terms:
+        return queryset
+    return get_backend(queryset.db).search(queryset, terms)
+
+
+def refresh_search_index(recipe_ids, using='default'):
+    """Rebuild the documents of ``recipe_ids``; ids of deleted recipes
+    drop their documents."""
+    recipe_ids = sorted(set(recipe_ids))
+    backend = get_backend(using)
+    with connections[using].cursor() as cursor:
+        for start in range(0, len(recipe_ids), BATCH_SIZE):
+            backend.refresh(cursor, recipe_ids[start:start + BATCH_SIZE])
+
+
+_pending = threading.local()
+
+
+def flush_search_refresh():
+    recipe_ids = getattr(_pending, 'recipe_ids', None)
+    _pending.recipe_ids = set()
+    if recipe_ids:
+        refresh_search_index(recipe_ids)
+
+
+def schedule_search_refresh(recipe_ids):
+    """Refresh ``recipe_ids`` once the current transaction commits. Ids
+    collected during one transaction are refreshed together by the first
+    callback that runs; ids of a rolled back transaction ride along with
+    the next one."""
+    if not hasattr(_pending, 'recipe_ids'):
+        _pending.recipe_ids = set()
+    _pending.recipe_ids.update(recipe_ids)
+    transaction.on_commit(flush_search_refresh)
@@ -0,0 +1,164 @@
+import io
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import connection, transaction
+from django.utils import timezone
+
+from . import response_cache
+from .models import Recipe
+
+logger = logging.getLogger(__name__)
+
+# name: (size, crop). Cropped variants are filled to exactly ``size``,
+# the others only shrink to fit inside it.
+VARIANTS = {
+    'thumbnail': ((320, 320), True),
+    'medium': ((960, 960), False),
+}
+FORMATS = {
+    'webp': ('WEBP', {'quality': 80, 'method': 4}),
+    'jpeg': ('JPEG', {'quality': 82, 'optimize': True, 'progressive': True}),
+}
+VARIANTS_DIR = 'foodgram/variants'
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor():
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=settings.IMAGE_PROCESSING_WORKERS,
+                    thread_name_prefix='image'
+                )
+    return _executor
+
+
+def flatten(image):
+    from PIL import Image, ImageOps
+
+    image = ImageOps.exif_transpose(image)
+    if image.mode in ('RGBA', 'LA', 'P'):
+        image = image.convert('RGBA')
+        background = Image.new('RGB', image.size, 'white')
+        background.paste(image, mask=image.getchannel('A'))
+        return background
+    return image.convert('RGB')
+
+
+def resize(image, size, crop):
+    from PIL import Image, ImageOps
+
+    if crop:
+        return ImageOps.fit(image, size, Image.LANCZOS)
+    image = image.copy()
+    image.thumbnail(size, Image.LANCZOS)
+    return image
+
+
+def render_variants(name):
+    """Write every variant of the stored image ``name`` and return
+    ``{variant: {extension: storage name}}``."""
+    # Pillow is only needed here, so web workers that never render an
+    # image do not pay for importing it.
+    from PIL import Image
+
+    with default_storage.open(name) as source:
+        image = Image.open(source)
+        image.load()
+    image = flatten(image)
+    stem = os.path.splitext(os.path.basename(name))[0]
+    variants = {}
+    for variant, (size, crop) in VARIANTS.items():
+        resized = resize(image, size, crop)
+        variants[variant] = {}
+        for extension, (image_format, options) in FORMATS.items():
+            buffer = io.BytesIO()
+            resized.save(buffer, image_format, **options)
+            variants[variant][extension] = default_storage.save(
+                f'{VARIANTS_DIR}/{stem}_{variant}.{extension}',
+                ContentFile(buffer.getvalue())
+            )
+    return variants
+
+
+def delete_variants(variants):
+    """Delete the files of ``variants``, a ``Recipe.image_variants``
+    value, once the current transaction commits."""
+    names = [name for files in variants.values() for name in files.values()]
+    if names:
+        transaction.on_commit(
+            lambda: [default_storage.delete(name) for name in names]
+        )
+
+
+def process_recipe_image(recipe_id, name):
+    variants = render_variants(name)
+    with transaction.atomic():
+        recipe = Recipe.objects.select_for_update().filter(
+            pk=recipe_id, image=name
+        ).only('image_variants').first()
+        if recipe is None:
+            # The image was replaced or the recipe deleted while this one
+            # was being processed; the newer upload has its own task.
+            delete_variants(variants)
+            return variants
+        Recipe.objects.filter(pk=recipe_id).update(
+            image_variants=variants, updated_at=timezone.now()
+        )
+        delete_variants(recipe.image_variants)
+    response_cache.bump_version()
+    return variants
+
+
+def run_task(recipe_id, name, close_connection):
+    try:
+        process_recipe_image(recipe_id, name)
+    except Exception:
+        logger.exception('Could not process image %s of recipe %s.',
+                         name, recipe_id)
+    finally:
+        if close_connection:
+            connection.close()
+
+
+def schedule_image_processing(recipe_id, name):
+    """Render the variants of a newly saved image once the current
+    transaction commits, on the worker pool or inline when
+    ``IMAGE_PROCESSING_WORKERS`` is 0. With ``IMAGE_PROCESSING_ENABLED``
+    off nothing is queued and ``process_images`` can catch up later."""
+    if not settings.IMAGE_PROCESSING_ENABLED:
+        return
+
+    def submit():
+        if settings.IMAGE_PROCESSING_WORKERS:
+            get_executor().submit(run_task, recipe_id, name, True)
+        else:
+            run_task(recipe_id, name, False)
+
+    transaction.on_commit(submit)
+
+
+def variant_urls(recipe, request=None):
+    """Return the URLs of the variants of ``recipe.image``, or None until
+    they have been rendered."""
+    if not recipe.image_variants:
+        return None
+    urls = {}
+    for variant, files in recipe.image_variants.items():
+        urls[variant] = {}
+        for extension, name in files.items():
+            url = default_storage.url(name)
+            if request is not None:
+                url = request.build_absolute_uri(url)
+            urls[variant][extension] = url
+    return urls
@@ -0,0 +1,194 @@
+from django.db import transaction
+from drf_extra_fields.fields import Base64ImageField
+from rest_framework import serializers
+
+from users.models import Profile
+
+from . import response_cache
+from .fulltext import schedule_search_refresh
+from .images import schedule_image_processing
+from .models import IngredientsOfRecipe, Recipe, TagsOfRecipe
+from .reference import reference_registry
+
+# The largest value a PositiveSmallIntegerField holds on every backend.
+MAX_SMALL_INTEGER = 32767
+
+
+class ImportIngredientSerializer(serializers.Serializer):
+    id = serializers.IntegerField(required=False)
+    name = serializers.CharField(required=False)
+    amount = serializers.IntegerField(min_value=1,
+                                      max_value=MAX_SMALL_INTEGER)
+
+    def validate(self, data):
+        if 'id' not in data and 'name' not in data:
+            raise serializers.ValidationError(
+                'Either id or name is required.'
+            )
+        return data
+
+
+class ImportRecipeSerializer(serializers.Serializer):
+    name = serializers.CharField(max_length=200)
+    text = serializers.CharField(max_length=500)
+    cooking_time = serializers.IntegerField(min_value=1,
+                                            max_value=MAX_SMALL_INTEGER)
+    image = Base64ImageField(max_length=None)
+    tags = serializers.ListField(child=serializers.CharField(),
+                                 allow_empty=False)
+    ingredients = ImportIngredientSerializer(many=True, allow_empty=False)
+
+
+class RecipeImporter:
+    """Validate and insert recipes in chunks.
+
+    Tags are resolved by id or slug and ingredients by id or name against
+    the reference registry. Every chunk is written with one
+    bulk insert per table. Invalid rows are reported and skipped.
+    """
+
+    def __init__(self, author, chunk_size=500):
+        self.author = author
+        self.chunk_size = chunk_size
+        reference = reference_registry.get()
+        self.tags = dict(reference.tags_by_slug)
+        self.tags.update((str(pk), tag) for pk, tag in reference.tags.items())
+        self.ingredients_by_id = reference.ingredients
+        self.ingredients_by_name = reference.ingredients_by_name
+
+    def resolve(self, data):
+        errors = {}
+        tags = []
+        for value in data['tags']:
+            tag = self.tags.get(str(value))
+            if tag is None:
+                errors.setdefault('tags', []).append(
+                    f'Unknown tag "{value}".'
+                )
+            elif tag not in tags:
+                tags.append(tag)
+        amounts = {}
+        for item in data['ingredients']:
+            if 'id' in item:
+                ingredient = self.ingredients_by_id.get(item['id'])
+            else:
+                ingredient = self.ingredients_by_name.get(
+                    item['name'].casefold()
+                )
+            if ingredient is None:
+                errors.setdefault('ingredients', []).append(
+                    f'Unknown ingredient "{item.get("id", item.get("name"))}".'
+                )
+                continue
+            amount = amounts.get(ingredient.id, (ingredient, 0))[1]
+            amounts[ingredient.id] = (ingredient, amount + item['amount'])
+        for ingredient, amount in amounts.values():
+            if amount > MAX_SMALL_INTEGER:
+                errors.setdefault('ingredients', []).append(
+                    f'Total amount of "{ingredient.name}" is above '
+                    f'{MAX_SMALL_INTEGER}.'
+                )
+        if errors:
+            raise serializers.ValidationError(errors)
+        data['tags'] = tags
+        data['ingredients'] = list(amounts.values())
+        return data
+
+    def validate_chunk(self, chunk, seen_names):
+        valid, errors = [], []
+        for index, row in chunk:
+            serializer = ImportRecipeSerializer(data=row)
+            try:
+                serializer.is_valid(raise_exception=True)
+                data = self.resolve(dict(serializer.validated_data))
+            except serializers.ValidationError as error:
+                errors.append({'row': index, 'errors': error.detail})
+                continue
+            if data['name'] in seen_names:
+                errors.append({'row': index, 'errors': {
+                    'name': ['Duplicate recipe name in this batch.']
+                }})
+                continue
+            seen_names.add(data['name'])
+            valid.append((index, data))
+        existing = set(Recipe.objects.filter(
+            name__in=[data['name'] for _, data in valid]
+        ).values_list('name', flat=True))
+        if existing:
+            errors.extend(
+                {'row': index, 'errors': {
+                    'name': ['Recipe with such name already exists.']
+                }}
+                for index, data in valid if data['name'] in existing
+            )
+            valid = [(index, data) for index, data in valid
+                     if data['name'] not in existing]
+        return valid, errors
+
+    @transaction.atomic
+    def write_chunk(self, valid):
+        recipes = Recipe.objects.bulk_create(
+            Recipe(author=self.author, name=data['name'], text=data['text'],
+                   cooking_time=data['cooking_time'], image=data['image'])
+            for _, data in valid
+        )
+        if any(recipe.pk is None for recipe in recipes):
+            ids = dict(Recipe.objects.filter(
+                name__in=[recipe.name for recipe in recipes]
+            ).values_list('name', 'id'))
+            for recipe in recipes:
+                recipe.pk = ids[recipe.name]
+        TagsOfRecipe.objects.bulk_create(
+            TagsOfRecipe(recipe=recipe, tag=tag)
+            for recipe, (_, data) in zip(recipes, valid)
+            for tag in data['tags']
+        )
+        IngredientsOfRecipe.objects.bulk_create(
+            IngredientsOfRecipe(recipe=recipe, ingredient=ingredient,
+                                amount=amount)
+            for recipe, (_, data) in zip(recipes, valid)
+            for ingredient, amount in data['ingredients']
+        )
+        Profile.objects.filter(pk=self.author.pk).adjust_counters(
+            recipes_count=len(recipes)
+        )
+        response_cache.invalidate()
+        schedule_search_refresh(recipe.pk for recipe in recipes)
+        for recipe in recipes:
+            schedule_image_processing(recipe.pk, recipe.image.name)
+        return recipes
+
+    def chunks(self, rows):
+        chunk = []
+        for index, row in enumerate(rows):
+            chunk.append((index, row))
+            if len(chunk) == self.chunk_size:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
+
+    def run(self, rows):
+        """Import ``rows`` (dicts in the recipe create format) and return
+        ``{'created': [...], 'errors': [...]}``; each error names the
+        zero-based row index it belongs to."""
+        created, errors, seen_names = [], [], set()
+        for chunk in self.chunks(rows):
+            chunk_errors = [
+                {'row': index, 'errors': {
+                    'non_field_errors': ['Expected a JSON object.']
+                }}
+                for index, row in chunk if not isinstance(row, dict)
+            ]
+            chunk = [(index, row) for index, row in chunk
+                     if isinstance(row, dict)]
+            valid, validation_errors = self.validate_chunk(chunk, seen_names)
+            chunk_errors.extend(validation_errors)
+            if valid:
+                created.extend(
+                    {'row': index, 'id': recipe.pk}
+                    for (index, _), recipe in zip(valid,
+                                                  self.write_chunk(valid))
+                )
+            errors.extend(sorted(chunk_errors, key=lambda e: e['row']))
+        return {'created': created, 'errors': errors}
@@ -0,0 +1,154 @@
+import io
+import json
+import logging
+import statistics
+import tempfile
+from contextlib import contextmanager
+
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import (override_settings, setup_test_environment,
+                               teardown_test_environment)
+
+from foodgram_api import response_cache
+from foodgram_api.benchmarks import (BENCHMARK_SETTINGS, PAGE_SIZES,
+                                     PROLIFIC_RECIPES, QUERY_BUDGETS,
+                                     ApiBenchmark)
+from foodgram_api.urls import router_api
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))
+    return ordered[index]
+
+
+class Command(BaseCommand):
+    help = ('Seed a throwaway database, call every API route and check '
+            'SQL query counts against per-endpoint budgets.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=500)
+        parser.add_argument('--recipes', type=int, default=3000)
+        parser.add_argument('--repeat', type=int, default=20,
+                            help='Timed requests per endpoint.')
+        parser.add_argument('--page-sizes', type=int, nargs=2,
+                            default=PAGE_SIZES,
+                            help='Two page sizes that must cost the same.')
+        parser.add_argument('--prolific-recipes', type=int,
+                            default=PROLIFIC_RECIPES,
+                            help='Recipes of each author followed by the '
+                                 'prolific-subscriptions user.')
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--output', default='benchmark_report.json')
+
+    @contextmanager
+    def environment(self):
+        """Throwaway test database and settings for a benchmark run."""
+        logging.getLogger('django.request').setLevel(logging.CRITICAL)
+        setup_test_environment()
+        old_name = connection.creation.create_test_db(
+            verbosity=0, autoclobber=True, serialize=False
+        )
+        try:
+            with tempfile.TemporaryDirectory() as media_root, \
+                    override_settings(MEDIA_ROOT=media_root,
+                                      **BENCHMARK_SETTINGS):
+                yield
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+
+    def handle(self, *args, **options):
+        with self.environment():
+            benchmark = ApiBenchmark()
+            benchmark.seed(options)
+            report = self.run_scenarios(benchmark, options)
+            report['query_plans'] = self.check_query_plans(benchmark.user)
+
+        with open(options['output'], 'w') as report_file:
+            json.dump(report, report_file, indent=2, sort_keys=True)
+        self.stdout.write(f'Report written to {options["output"]}')
+        failures = [label for label, result in report['endpoints'].items()
+                    if not result['ok']]
+        if not report['query_plans']['ok']:
+            failures.append('query plans')
+        if failures:
+            raise CommandError(
+                f'Endpoints over budget or failing: {", ".join(failures)}'
+            )
+
+    def check_query_plans(self, user):
+        try:
+            call_command('check_query_plans', user=user.pk,
+                         stdout=io.StringIO())
+        except CommandError as error:
+            self.stdout.write(f'FAIL {error}')
+            return {'ok': False, 'error': str(error)}
+        self.stdout.write('ok   recipe filter query plans')
+        return {'ok': True}
+
+    def run_scenarios(self, benchmark, options):
+        small, large = options['page_sizes']
+        scenarios = benchmark.scenarios()
+
+        covered = {scenario.route for scenario in scenarios}
+        registered = {url.name for url in router_api.urls
+                      if url.name and url.name != 'api-root'}
+        for route in sorted(registered - covered):
+            self.stderr.write(f'Route {route} has no benchmark scenario.')
+
+        endpoints = {}
+        for scenario in scenarios:
+            client = benchmark.client(scenario)
+            budget = QUERY_BUDGETS[scenario.label]
+            queries, statuses, response = benchmark.count_queries(
+                client, scenario
+            )
+            size = large if scenario.paginated else None
+            timings = []
+            for _ in range(options['repeat']):
+                response, _, elapsed = benchmark.measure(
+                    client, scenario, size
+                )
+                statuses.add(response.status_code)
+                timings.append(elapsed)
+            counts = list(queries.values())
+            if statuses != {scenario.status}:
+                self.stderr.write(
+                    f'{scenario.label}: {response.content[:300]!r}'
+                )
+            ok = benchmark.within_budget(scenario, queries, statuses)
+            endpoints[scenario.label] = {
+                'route': scenario.route,
+                'method': scenario.method.upper(),
+                'status': sorted(statuses),
+                'queries': queries,
+                'budget': budget,
+                'ok': ok,
+                'timings_ms': {
+                    'p50': percentile(timings, 0.5),
+                    'p90': percentile(timings, 0.9),
+                    'p99': percentile(timings, 0.99),
+                    'mean': statistics.mean(timings),
+                    'max': max(timings),
+                },
+            }
+            self.stdout.write(
+                f'{"ok" if ok else "FAIL":4} {scenario.label:32} '
+                f'queries={counts} budget={budget} '
+                f'status={sorted(statuses)} '
+                f'p50={endpoints[scenario.label]["timings_ms"]["p50"]:.2f}ms'
+            )
+        return {
+            'dataset': {
+                'users': options['users'],
+                'recipes': options['recipes'],
+                'seed': options['seed'],
+                'page_sizes': [small, large],
+            },
+            'repeat': options['repeat'],
+            'endpoints': endpoints,
+            'response_cache': response_cache.cache_stats(),
+        }
@@ -0,0 +1,231 @@
+import asyncio
+import io
+import json
+import os
+import statistics
+import tempfile
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.handlers.asgi import ASGIHandler
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.management.base import CommandError
+from django.db import connection
+from rest_framework.authtoken.models import Token
+
+from foodgram_api.models import Recipe
+
+from .benchmark_api import PAGE_SIZES
+from .benchmark_api import Command as BenchmarkCommand
+from .benchmark_api import percentile
+
+HOST = 'testserver'
+
+
+class AsyncURLConfHandler(ASGIHandler):
+    """ASGI handler resolving against ``foodgram.asgi_urls`` whatever
+    ``ROOT_URLCONF`` says, so both stacks run in one process."""
+
+    async def get_response_async(self, request):
+        request.urlconf = 'foodgram.asgi_urls'
+        return await super().get_response_async(request)
+
+
+class Command(BenchmarkCommand):
+    help = ('Compare the concurrent throughput of the endpoints that have '
+            'async views over WSGI (DRF views on a thread per request) and '
+            'ASGI (async views on an event loop), in-process.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=500)
+        parser.add_argument('--recipes', type=int, default=3000)
+        parser.add_argument('--requests', type=int, default=300,
+                            help='Requests per endpoint and run.')
+        parser.add_argument('--concurrency', type=int, nargs='+',
+                            default=(1, 8, 32),
+                            help='In-flight requests to measure at.')
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--output', default='asgi_benchmark.json')
+
+    def handle(self, *args, **options):
+        with tempfile.TemporaryDirectory() as directory:
+            if connection.vendor == 'sqlite':
+                # Shared-cache in-memory SQLite locks whole tables, which
+                # would make concurrent writers fail rather than wait.
+                connection.settings_dict['TEST']['NAME'] = os.path.join(
+                    directory, 'benchmark.sqlite3'
+                )
+            with self.environment():
+                self.seed({**options, 'page_sizes': PAGE_SIZES})
+                report = self.compare(options)
+
+        with open(options['output'], 'w') as report_file:
+            json.dump(report, report_file, indent=2, sort_keys=True)
+        self.stdout.write(f'Report written to {options["output"]}')
+        failures = sorted({
+            label for label, runs in report['endpoints'].items()
+            for run in runs.values()
+            for server in ('wsgi', 'asgi') if run[server]['errors']
+        })
+        if failures:
+            raise CommandError(
+                f'Endpoints answering unexpected statuses: '
+                f'{", ".join(failures)}'
+            )
+
+    def endpoints(self, requests):
+        """``(label, method, paths, status, writes)``. Toggles add and then
+        remove the same recipes, so every run starts from the same data."""
+        pool = list(Recipe.objects.exclude(
+            favorites__user=self.user
+        ).exclude(
+            carted__user=self.user
+        ).order_by('id').values_list('id', flat=True)[:requests])
+        endpoints = [
+            ('users-me', 'GET', ['/api/users/me/'] * requests, 200, False),
+            ('tags-list', 'GET', ['/api/tags/'] * requests, 200, False),
+            ('ingredients-search', 'GET',
+             ['/api/ingredients/?name=ingredient%201'] * requests, 200,
+             False),
+        ]
+        for name in ('favorite', 'shopping_cart'):
+            paths = [f'/api/recipes/{pk}/{name}/' for pk in pool]
+            endpoints.append((f'{name}-add', 'GET', paths, 201, True))
+            endpoints.append((f'{name}-remove', 'DELETE', paths, 204, True))
+        return endpoints
+
+    def compare(self, options):
+        authorization = f'Token {Token.objects.create(user=self.user).key}'
+        wsgi, asgi = WSGIHandler(), AsyncURLConfHandler()
+        endpoints = self.endpoints(options['requests'])
+        results = {label: {} for label, *_ in endpoints}
+        serial_writes = connection.vendor == 'sqlite'
+        if serial_writes:
+            self.stderr.write(
+                'SQLite fails concurrent write transactions instead of '
+                'queueing them; toggles are measured at concurrency 1 only.'
+            )
+        for concurrency in options['concurrency']:
+            for server, run in (('wsgi', self.run_wsgi),
+                                ('asgi', self.run_asgi)):
+                handler = wsgi if server == 'wsgi' else asgi
+                for label, method, paths, expected, writes in endpoints:
+                    if writes and serial_writes and concurrency > 1:
+                        continue
+                    started = time.perf_counter()
+                    calls = run(handler, concurrency, method, paths,
+                                authorization)
+                    elapsed = time.perf_counter() - started
+                    latencies = [latency for _, latency in calls]
+                    results[label].setdefault(str(concurrency), {})[
+                        server
+                    ] = {
+                        'requests': len(calls),
+                        'errors': sum(code != expected for code, _ in calls),
+                        'statuses': dict(Counter(code for code, _ in calls)),
+                        'throughput_rps': len(calls) / elapsed,
+                        'latency_ms': {
+                            'p50': percentile(latencies, 0.5),
+                            'p90': percentile(latencies, 0.9),
+                            'p99': percentile(latencies, 0.99),
+                            'mean': statistics.mean(latencies),
+                        },
+                    }
+        for label, runs in results.items():
+            for concurrency, run in runs.items():
+                run['speedup'] = (run['asgi']['throughput_rps']
+                                  / run['wsgi']['throughput_rps'])
+                self.stdout.write(
+                    f'{label:22} c={concurrency:<4} '
+                    f'wsgi={run["wsgi"]["throughput_rps"]:8.1f} req/s '
+                    f'asgi={run["asgi"]["throughput_rps"]:8.1f} req/s '
+                    f'x{run["speedup"]:.2f} '
+                    f'errors={run["wsgi"]["errors"]}/{run["asgi"]["errors"]}'
+                )
+        return {
+            'dataset': {
+                'users': options['users'],
+                'recipes': options['recipes'],
+                'seed': options['seed'],
+            },
+            'database': connection.vendor,
+            'requests': options['requests'],
+            'endpoints': results,
+        }
+
+    def run_wsgi(self, handler, concurrency, method, paths, authorization):
+        def call(url):
+            path, _, query = url.partition('?')
+            environ = {
+                'REQUEST_METHOD': method,
+                'PATH_INFO': path,
+                'QUERY_STRING': query,
+                'SCRIPT_NAME': '',
+                'SERVER_NAME': HOST,
+                'SERVER_PORT': '80',
+                'SERVER_PROTOCOL': 'HTTP/1.1',
+                'HTTP_HOST': HOST,
+                'HTTP_AUTHORIZATION': authorization,
+                'wsgi.input': io.BytesIO(),
+                'wsgi.errors': io.StringIO(),
+                'wsgi.url_scheme': 'http',
+                'wsgi.multithread': True,
+                'wsgi.multiprocess': False,
+                'wsgi.run_once': False,
+            }
+            statuses = []
+            started = time.perf_counter()
+            response = handler(
+                environ,
+                lambda status, headers, exc_info=None:
+                    statuses.append(int(status.split()[0]))
+            )
+            try:
+                b''.join(response)
+            finally:
+                response.close()
+            return statuses[0], (time.perf_counter() - started) * 1000
+
+        with ThreadPoolExecutor(concurrency) as executor:
+            return list(executor.map(call, paths))
+
+    def run_asgi(self, handler, concurrency, method, paths, authorization):
+        async def call(url, semaphore):
+            path, _, query = url.partition('?')
+            scope = {
+                'type': 'http',
+                'asgi': {'version': '3.0'},
+                'http_version': '1.1',
+                'method': method,
+                'scheme': 'http',
+                'path': path,
+                'root_path': '',
+                'query_string': query.encode(),
+                'headers': [(b'host', HOST.encode()),
+                            (b'authorization', authorization.encode())],
+                'server': (HOST, 80),
+                'client': ('127.0.0.1', 0),
+            }
+            messages = []
+
+            async def receive():
+                return {'type': 'http.request', 'body': b'',
+                        'more_body': False}
+
+            async def send(message):
+                messages.append(message)
+
+            async with semaphore:
+                started = time.perf_counter()
+                await handler(scope, receive, send)
+                return (messages[0]['status'],
+                        (time.perf_counter() - started) * 1000)
+
+        async def run():
+            semaphore = asyncio.Semaphore(concurrency)
+            return await asyncio.gather(
+                *(call(path, semaphore) for path in paths)
+            )
+
+        return asyncio.run(run())
@@ -0,0 +1,57 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections, connections
+
+from foodgram_api.db.pool import pool_stats
+
+
+class Command(BaseCommand):
+    help = ('Run concurrent queries through the configured database, the '
+            'way requests do, and report its connection pool counters.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', default='default')
+        parser.add_argument('--threads', type=int, default=16)
+        parser.add_argument('--queries', type=int, default=500)
+
+    def handle(self, *args, **options):
+        alias = options['database']
+        self.run_queries(alias, options['threads'], options['queries'])
+        stats = pool_stats().get(alias)
+        if stats is None:
+            self.stdout.write(
+                f'{alias} is not pooled, set DB_POOL_SIZE above 0.'
+            )
+            return
+        self.stdout.write(
+            f'{alias}: ' + ', '.join(
+                f'{name}={value:.3f}' if isinstance(value, float)
+                else f'{name}={value}'
+                for name, value in sorted(stats.items())
+            )
+        )
+        if stats['timeouts']:
+            raise CommandError(
+                f'{stats["timeouts"]} checkouts timed out, raise '
+                f'DB_POOL_SIZE or DB_POOL_TIMEOUT.'
+            )
+
+    def run_queries(self, alias, threads, queries):
+        """Run each query as its own request would: on a thread's
+        connection, closed (given back to the pool) when it ends."""
+
+        def query(_):
+            close_old_connections()
+            with connections[alias].cursor() as cursor:
+                cursor.execute('SELECT 1')
+            close_old_connections()
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(threads) as executor:
+            list(executor.map(query, range(queries)))
+        self.stdout.write(
+            f'{queries} queries on {threads} threads through {alias} in '
+            f'{(time.perf_counter() - started) * 1000:.0f} ms'
+        )
@@ -0,0 +1,42 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from foodgram_api.models import Tag
+from foodgram_api.query_plans import (explain, recipe_filter_combinations,
+                                      recipe_list_queryset, sequential_scans)
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = ('EXPLAIN the recipe list for the main filter combinations and '
+            'fail if a large table is read with a sequential scan.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', type=int,
+                            help='Id of the user to filter as.')
+        parser.add_argument('--show-plans', action='store_true')
+
+    def handle(self, *args, **options):
+        users = User.objects.order_by('pk')
+        if options['user']:
+            users = users.filter(pk=options['user'])
+        user = users.first() or User(pk=0)
+        tags = list(Tag.objects.values_list('slug', flat=True)[:2])
+        failures = []
+        combinations = recipe_filter_combinations(tags or ['breakfast'])
+        for label, params in combinations.items():
+            queryset = recipe_list_queryset(user, params)
+            plan = explain(queryset)
+            scanned = sequential_scans(queryset, plan)
+            if options['show_plans'] or scanned:
+                self.stdout.write(f'{label}:\n{plan}\n')
+            if scanned:
+                failures.append(f'{label} ({", ".join(sorted(scanned))})')
+        if failures:
+            raise CommandError(
+                f'Sequential scans in: {"; ".join(failures)}'
+            )
+        self.stdout.write(self.style.SUCCESS(
+            f'{len(combinations)} recipe filter plans use indexes.'
+        ))
@@ -0,0 +1,54 @@
+import json
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from foodgram_api.importers import RecipeImporter
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = ('Import recipes from an NDJSON file, one recipe per line in '
+            'the POST /api/recipes/ format.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument('--author', required=True,
+                            help='Username or email of the recipe author.')
+        parser.add_argument('--chunk-size', type=int, default=500)
+
+    def read_rows(self, path, line_numbers):
+        with open(path, encoding='utf-8') as source:
+            for number, line in enumerate(source, start=1):
+                if not line.strip():
+                    continue
+                line_numbers.append(number)
+                try:
+                    yield json.loads(line)
+                except json.JSONDecodeError:
+                    yield None
+
+    def handle(self, *args, **options):
+        author = User.objects.filter(username=options['author']).first()
+        author = author or User.objects.filter(
+            email=options['author']
+        ).first()
+        if author is None:
+            raise CommandError(f'User {options["author"]} does not exist.')
+        start = time.perf_counter()
+        line_numbers = []
+        report = RecipeImporter(
+            author, chunk_size=options['chunk_size']
+        ).run(self.read_rows(options['path'], line_numbers))
+        for error in report['errors']:
+            self.stderr.write(
+                f'line {line_numbers[error["row"]]}: '
+                f'{json.dumps(error["errors"], ensure_ascii=False)}'
+            )
+        self.stdout.write(
+            f'Imported {len(report["created"])} recipes, '
+            f'{len(report["errors"])} rows rejected '
+            f'in {time.perf_counter() - start:.1f}s.'
+        )
@@ -0,0 +1,111 @@
+import csv
+import io
+import json
+import time
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from foodgram_api import response_cache
+from foodgram_api.models import Ingredient
+from foodgram_api.reference import reference_registry
+
+
+def read_csv(path):
+    with open(path, encoding='utf-8', newline='') as source:
+        for row in csv.reader(source):
+            if len(row) >= 2:
+                yield row[0], row[1]
+
+
+def read_json(path):
+    with open(path, encoding='utf-8') as source:
+        records = json.load(source)
+    for record in records:
+        fields = record.get('fields', record)
+        yield fields['name'], fields['measurement_unit']
+
+
+def clean(rows):
+    seen = set()
+    for name, measurement_unit in rows:
+        key = (name.strip(), measurement_unit.strip())
+        if all(key) and key not in seen:
+            seen.add(key)
+            yield key
+
+
+class Command(BaseCommand):
+    help = ('Load ingredients from a CSV (name,measurement_unit) or JSON '
+            'file, skipping pairs that already exist.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'path', nargs='?',
+            default=str(Path(settings.BASE_DIR) / 'ingredients.json')
+        )
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        path = Path(options['path'])
+        readers = {'.csv': read_csv, '.json': read_json}
+        if path.suffix not in readers:
+            raise CommandError('Expected a .csv or .json file.')
+        if not path.exists():
+            raise CommandError(f'{path} does not exist.')
+        start = time.perf_counter()
+        before = Ingredient.objects.count()
+        rows = clean(readers[path.suffix](path))
+        with transaction.atomic():
+            if connection.vendor == 'postgresql':
+                self.copy(rows)
+            else:
+                self.bulk_create(rows, options['batch_size'])
+            response_cache.invalidate()
+            reference_registry.invalidate()
+        created = Ingredient.objects.count() - before
+        self.stdout.write(
+            f'Loaded {created} new ingredients from {path.name} '
+            f'in {time.perf_counter() - start:.2f}s.'
+        )
+
+    def copy(self, rows):
+        table = Ingredient._meta.db_table
+        buffer = io.StringIO()
+        csv.writer(buffer).writerows(rows)
+        buffer.seek(0)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'CREATE TEMPORARY TABLE ingredient_staging '
+                '(position serial, name varchar(200), '
+                'measurement_unit varchar(50)) '
+                'ON COMMIT DROP'
+            )
+            cursor.copy_expert(
+                'COPY ingredient_staging (name, measurement_unit) '
+                'FROM STDIN WITH (FORMAT csv)', buffer
+            )
+            cursor.execute(
+                f'INSERT INTO {table} (name, measurement_unit) '
+                f'SELECT s.name, s.measurement_unit '
+                f'FROM ingredient_staging s WHERE NOT EXISTS ('
+                f'SELECT 1 FROM {table} i WHERE i.name = s.name '
+                f'AND i.measurement_unit = s.measurement_unit) '
+                f'ORDER BY s.position'
+            )
+
+    def bulk_create(self, rows, batch_size):
+        existing = set(
+            Ingredient.objects.values_list('name', 'measurement_unit')
+        )
+        batch = []
+        for key in rows:
+            if key in existing:
+                continue
+            batch.append(Ingredient(name=key[0], measurement_unit=key[1]))
+            if len(batch) == batch_size:
+                Ingredient.objects.bulk_create(batch)
+                batch = []
+        Ingredient.objects.bulk_create(batch)
@@ -0,0 +1,424 @@
+import http.client
+import json
+import os
+import random
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter, defaultdict
+from urllib.parse import urlencode, urlsplit
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from rest_framework.authtoken.models import Token
+
+from foodgram_api.models import Ingredient, Recipe, Tag
+from users.models import Follow
+
+from .benchmark_api import percentile
+
+User = get_user_model()
+
+RECIPE_SAMPLE = 2000
+
+
+class LoadClient:
+    """One simulated user: a keep-alive connection, a token and the
+    results of its requests."""
+
+    def __init__(self, address, token, rnd, pools, measure_from, deadline):
+        self.address = address
+        self.authorization = f'Token {token}'
+        self.rnd = rnd
+        self.pools = pools
+        self.measure_from = measure_from
+        self.deadline = deadline
+        self.results = []
+        self.connection = None
+
+    def call(self, label, method, path, expected=(200,), anonymous=False):
+        if self.connection is None:
+            self.connection = http.client.HTTPConnection(*self.address,
+                                                         timeout=60)
+        headers = {} if anonymous else {'Authorization': self.authorization}
+        started = time.perf_counter()
+        try:
+            self.connection.request(method, path, headers=headers)
+            response = self.connection.getresponse()
+            body = response.read()
+            status = response.status
+        except (OSError, http.client.HTTPException):
+            self.connection.close()
+            self.connection = None
+            status, body = 0, b''
+        finished = time.perf_counter()
+        if started >= self.measure_from:
+            self.results.append((label, status, status in expected,
+                                 (finished - started) * 1000, len(body)))
+        return status, body
+
+    def paginate(self, label, path, anonymous=False):
+        """Read a list from its first page on, following ``next`` links
+        for a few pages at most."""
+        # Most visitors never leave the first page.
+        for _ in range(min(int(self.rnd.paretovariate(1.5)), 10)):
+            status, body = self.call(label, 'GET', path, anonymous=anonymous)
+            link = json.loads(body).get('next') if status == 200 else None
+            if not link:
+                break
+            parts = urlsplit(link)
+            path = f'{parts.path}?{parts.query}'
+
+    def recipe(self):
+        return self.rnd.choice(self.pools['recipes'])
+
+    def tag_query(self):
+        tags = self.pools['tags']
+        count = min(self.rnd.choice((0, 0, 1, 1, 2)), len(tags))
+        return [('tags', slug) for slug in self.rnd.sample(tags, count)]
+
+
+def recipes_path(params):
+    return f'/api/recipes/?{urlencode(params)}'
+
+
+def browse(client):
+    client.paginate('recipes-browse', recipes_path(client.tag_query()),
+                    anonymous=True)
+
+
+def browse_logged_in(client):
+    client.paginate('recipes-browse-auth', recipes_path(client.tag_query()))
+
+
+def favorited(client):
+    client.paginate('recipes-favorited', recipes_path(
+        client.tag_query() + [('is_favorited', 1)]
+    ))
+
+
+def recipe_detail(client):
+    client.call('recipe-detail', 'GET', f'/api/recipes/{client.recipe()}/',
+                anonymous=client.rnd.random() < 0.5)
+
+
+def toggle(name, label):
+    """Add a recipe and take it back, leaving the data as it was; a
+    recipe that was already in the list answers 400."""
+    def scenario(client):
+        path = f'/api/recipes/{client.recipe()}/{name}/'
+        status, _ = client.call(f'{label}-add', 'GET', path, (201, 400))
+        if status == 201:
+            client.call(f'{label}-remove', 'DELETE', path, (204,))
+    return scenario
+
+
+def download(client):
+    client.call('shopping-cart-download', 'GET',
+                '/api/recipes/download_shopping_cart/')
+
+
+def subscriptions(client):
+    client.paginate('subscriptions',
+                    '/api/users/subscriptions/?recipes_limit=3')
+
+
+def autocomplete(client):
+    """Type an ingredient name one letter at a time."""
+    name = client.rnd.choice(client.pools['ingredients'])
+    for length in range(1, min(len(name), client.rnd.randint(2, 4)) + 1):
+        client.call('ingredients-autocomplete', 'GET',
+                    '/api/ingredients/?' + urlencode({'name': name[:length]}),
+                    anonymous=True)
+
+
+# name: (weight, scenario)
+SCENARIOS = {
+    'browse': (30, browse),
+    'browse-auth': (10, browse_logged_in),
+    'favorited': (10, favorited),
+    'recipe': (10, recipe_detail),
+    'favorite': (8, toggle('favorite', 'favorite')),
+    'shopping-cart': (4, toggle('shopping_cart', 'shopping-cart')),
+    'download': (3, download),
+    'subscriptions': (7, subscriptions),
+    'autocomplete': (15, autocomplete),
+}
+
+
+def summarize(results, duration):
+    latencies = [latency for _, _, _, latency, _ in results]
+    return {
+        'requests': len(results),
+        'errors': sum(not ok for _, _, ok, _, _ in results),
+        'statuses': dict(Counter(status for _, status, _, _, _ in results)),
+        'throughput_rps': len(results) / duration,
+        'latency_ms': {
+            'p50': percentile(latencies, 0.5),
+            'p90': percentile(latencies, 0.9),
+            'p99': percentile(latencies, 0.99),
+            'max': max(latencies),
+            'mean': statistics.mean(latencies),
+        },
+        'mean_bytes': statistics.mean(size for *_, size in results),
+    }
+
+
+def free_port():
+    with socket.socket() as probe:
+        probe.bind(('127.0.0.1', 0))
+        return probe.getsockname()[1]
+
+
+class Command(BaseCommand):
+    help = ('Start the app under gunicorn against the current database, '
+            'replay a weighted mix of browsing, toggles, downloads, '
+            'subscriptions and autocomplete, and report throughput and '
+            'latency percentiles per endpoint. Fill the database with '
+            'seed_foodgram first.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--duration', type=float, default=30,
+                            help='Seconds to measure.')
+        parser.add_argument('--warmup', type=float, default=5,
+                            help='Seconds to run before measuring.')
+        parser.add_argument('--concurrency', type=int, default=16,
+                            help='Simulated users, each waiting for its '
+                                 'response before the next request.')
+        parser.add_argument('--mix', nargs='+', default=(),
+                            metavar='SCENARIO=WEIGHT',
+                            help=f'Override weights of: '
+                                 f'{", ".join(SCENARIOS)}.')
+        parser.add_argument('--workers', type=int, default=2)
+        parser.add_argument('--worker-class', default='sync')
+        parser.add_argument('--threads', type=int, default=1)
+        parser.add_argument('--preload', action='store_true',
+                            help='Load and warm the app in the gunicorn '
+                                 'master before forking workers.')
+        parser.add_argument('--url', default=None,
+                            help='Load an already running server instead '
+                                 'of starting gunicorn.')
+        parser.add_argument('--startup-timeout', type=float, default=30)
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--output', default='load_replay.json')
+
+    def handle(self, *args, **options):
+        weights = self.weights(options['mix'])
+        pools = self.pools(options['seed'])
+        tokens = self.tokens(options['concurrency'], options['seed'])
+        dataset = {
+            'users': User.objects.count(),
+            'recipes': Recipe.objects.count(),
+            'ingredients': len(pools['ingredients']),
+            'tags': len(pools['tags']),
+        }
+        if connection.vendor == 'sqlite':
+            self.stderr.write(
+                'SQLite fails concurrent write transactions instead of '
+                'queueing them; expect toggle errors with several workers.'
+            )
+        # The server gets connections of its own.
+        connection.close()
+        with tempfile.TemporaryDirectory() as directory:
+            if options['url']:
+                parts = urlsplit(options['url'])
+                address = (parts.hostname, parts.port or 80)
+                server = None
+            else:
+                address = ('127.0.0.1', free_port())
+                server = self.start_server(address, options, directory)
+            try:
+                self.wait_until_ready(address, server, options)
+                results = self.replay(address, tokens, pools, weights,
+                                      options)
+            finally:
+                if server is not None:
+                    server.terminate()
+                    try:
+                        server.wait(10)
+                    except subprocess.TimeoutExpired:
+                        server.kill()
+        report = self.report(results, dataset, weights, options)
+        with open(options['output'], 'w') as report_file:
+            json.dump(report, report_file, indent=2, sort_keys=True)
+        self.stdout.write(f'Report written to {options["output"]}')
+        failures = sorted(label for label, endpoint
+                          in report['endpoints'].items()
+                          if endpoint['errors'])
+        if failures:
+            raise CommandError(
+                f'Endpoints answering unexpected statuses: '
+                f'{", ".join(failures)}'
+            )
+
+    def weights(self, mix):
+        weights = {name: weight for name, (weight, _) in SCENARIOS.items()}
+        for item in mix:
+            name, _, weight = item.partition('=')
+            if name not in SCENARIOS:
+                raise CommandError(f'Unknown scenario: {name}.')
+            try:
+                weights[name] = float(weight)
+            except ValueError:
+                raise CommandError(f'Expected SCENARIO=WEIGHT, got {item}.')
+        if not any(weight > 0 for weight in weights.values()):
+            raise CommandError('Every scenario has a weight of 0.')
+        return weights
+
+    def pools(self, seed):
+        """Tags, ingredient names and recipe ids the scenarios draw from."""
+        rnd = random.Random(seed)
+        bounds = Recipe.objects.order_by('id').values_list('id', flat=True)
+        first, last = bounds.first(), bounds.last()
+        if first is None:
+            raise CommandError(
+                'No recipes to load: run seed_foodgram first.'
+            )
+        candidates = {rnd.randint(first, last) for _ in range(RECIPE_SAMPLE)}
+        return {
+            'tags': list(Tag.objects.values_list('slug', flat=True)),
+            'ingredients': list(
+                Ingredient.objects.values_list('name', flat=True)
+            ),
+            'recipes': sorted(Recipe.objects.filter(
+                id__in=candidates
+            ).values_list('id', flat=True)),
+        }
+
+    def tokens(self, count, seed):
+        """Tokens of ``count`` users that follow someone, so their
+        subscription pages are not empty."""
+        followers = list(Follow.objects.order_by('user').values_list(
+            'user', flat=True
+        ).distinct()[:count * 20])
+        if len(followers) < count:
+            raise CommandError(
+                f'{count} simulated users need as many users with '
+                f'subscriptions; the database has {len(followers)}.'
+            )
+        user_ids = random.Random(seed).sample(followers, count)
+        return [Token.objects.get_or_create(user_id=pk)[0].key
+                for pk in user_ids]
+
+    def start_server(self, address, options, directory):
+        self.log_path = log_path = os.path.join(directory, 'gunicorn.log')
+        command = [
+            sys.executable, '-m', 'gunicorn', 'foodgram.wsgi:application',
+            '--config', os.path.join(settings.BASE_DIR, 'gunicorn.conf.py'),
+            '--pythonpath', str(settings.BASE_DIR),
+            '--bind', f'{address[0]}:{address[1]}',
+            '--workers', str(options['workers']),
+            '--worker-class', options['worker_class'],
+            '--threads', str(options['threads']),
+            *(['--preload'] if options['preload'] else []),
+        ]
+        self.stdout.write(' '.join(command[1:]))
+        environment = {**os.environ,
+                       'DJANGO_SETTINGS_MODULE': settings.SETTINGS_MODULE}
+        if settings.CACHES['default']['BACKEND'].endswith('LocMemCache'):
+            # Workers must share cache invalidations, see gunicorn.conf.py.
+            environment.update(
+                CACHE_BACKEND='django.core.cache.backends.filebased.'
+                              'FileBasedCache',
+                CACHE_LOCATION=os.path.join(directory, 'cache'),
+            )
+        with open(log_path, 'w') as log:
+            return subprocess.Popen(command, env=environment, stdout=log,
+                                    stderr=subprocess.STDOUT)
+
+    def wait_until_ready(self, address, server, options):
+        deadline = time.monotonic() + options['startup_timeout']
+        while time.monotonic() < deadline:
+            if server is not None and server.poll() is not None:
+                with open(self.log_path) as log:
+                    self.stderr.write(log.read()[-4000:])
+                raise CommandError(
+                    f'gunicorn exited with status {server.returncode}.'
+                )
+            try:
+                probe = http.client.HTTPConnection(*address, timeout=5)
+                probe.request('GET', '/api/tags/')
+                if probe.getresponse().status == 200:
+                    return
+            except (OSError, http.client.HTTPException):
+                pass
+            time.sleep(0.2)
+        raise CommandError(f'No answer from {address[0]}:{address[1]}.')
+
+    def replay(self, address, tokens, pools, weights, options):
+        names = list(weights)
+        cumulative, total = [], 0
+        for name in names:
+            total += weights[name]
+            cumulative.append(total)
+        measure_from = time.perf_counter() + options['warmup']
+        deadline = measure_from + options['duration']
+        clients = [
+            LoadClient(address, token,
+                       random.Random(options['seed'] * 1000 + index),
+                       pools, measure_from, deadline)
+            for index, token in enumerate(tokens)
+        ]
+
+        def run(client):
+            while time.perf_counter() < client.deadline:
+                name = client.rnd.choices(names, cum_weights=cumulative)[0]
+                SCENARIOS[name][1](client)
+            if client.connection is not None:
+                client.connection.close()
+
+        threads = [threading.Thread(target=run, args=(client,))
+                   for client in clients]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return [result for client in clients for result in client.results]
+
+    def report(self, results, dataset, weights, options):
+        if not results:
+            raise CommandError('No request finished while measuring.')
+        duration = options['duration']
+        by_label = defaultdict(list)
+        for result in results:
+            by_label[result[0]].append(result)
+        endpoints = {label: summarize(rows, duration)
+                     for label, rows in sorted(by_label.items())}
+        total = summarize(results, duration)
+        self.stdout.write(
+            f'{"endpoint":26} {"req":>7} {"req/s":>8} {"p50":>8} '
+            f'{"p90":>8} {"p99":>8} {"max":>8} {"errors":>6}'
+        )
+        for label, endpoint in [*endpoints.items(), ('total', total)]:
+            latency = endpoint['latency_ms']
+            self.stdout.write(
+                f'{label:26} {endpoint["requests"]:7} '
+                f'{endpoint["throughput_rps"]:8.1f} {latency["p50"]:8.1f} '
+                f'{latency["p90"]:8.1f} {latency["p99"]:8.1f} '
+                f'{latency["max"]:8.1f} {endpoint["errors"]:6}'
+            )
+        return {
+            'config': {
+                'duration': duration,
+                'warmup': options['warmup'],
+                'concurrency': options['concurrency'],
+                'mix': weights,
+                'seed': options['seed'],
+                'server': options['url'] or {
+                    'workers': options['workers'],
+                    'worker_class': options['worker_class'],
+                    'threads': options['threads'],
+                    'preload': options['preload'],
+                },
+            },
+            'database': connection.vendor,
+            'dataset': dataset,
+            'endpoints': endpoints,
+            'total': total,
+        }
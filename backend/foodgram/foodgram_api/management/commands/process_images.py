@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand
+
+from foodgram_api.images import process_recipe_image
+from foodgram_api.models import Recipe
+
+
+class Command(BaseCommand):
+    help = ('Render thumbnail and WebP/JPEG variants for recipe images '
+            'that do not have them yet.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true',
+                            help='Render variants for every recipe again.')
+
+    def handle(self, *args, **options):
+        recipes = Recipe.objects.exclude(image='')
+        if not options['all']:
+            recipes = recipes.filter(image_variants={})
+        processed = failed = 0
+        for recipe_id, name in list(
+                recipes.values_list('id', 'image').order_by('id')):
+            try:
+                process_recipe_image(recipe_id, name)
+            except Exception as error:
+                failed += 1
+                self.stderr.write(f'Recipe {recipe_id}: {error}')
+            else:
+                processed += 1
+        self.stdout.write(
+            f'Processed {processed} images, {failed} failed.'
+        )
@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from foodgram_api import response_cache
+from foodgram_api.fulltext import refresh_search_index
+from foodgram_api.models import Recipe
+
+
+class Command(BaseCommand):
+    help = ('Rebuild the full-text search documents of every recipe, e.g. '
+            'after changing SEARCH_CONFIG or editing rows directly.')
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            recipe_ids = list(Recipe.objects.values_list('id', flat=True))
+            refresh_search_index(recipe_ids)
+            response_cache.invalidate()
+        self.stdout.write(f'Search documents rebuilt: {len(recipe_ids)}.')
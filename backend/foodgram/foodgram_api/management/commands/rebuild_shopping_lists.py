@@ -0,0 +1,63 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Sum
+
+from foodgram_api.models import IngredientsOfRecipe, ShoppingListItem
+
+
+def live_totals():
+    return {
+        (user, ingredient): total
+        for user, ingredient, total in IngredientsOfRecipe.objects.filter(
+            recipe__carted__isnull=False
+        ).values('recipe__carted__user', 'ingredient').annotate(
+            total=Sum('amount')
+        ).values_list(
+            'recipe__carted__user', 'ingredient', 'total'
+        ).order_by().iterator()
+    }
+
+
+def stored_totals():
+    return {
+        (user, ingredient): amount
+        for user, ingredient, amount in ShoppingListItem.objects.values_list(
+            'user', 'ingredient', 'amount'
+        ).iterator()
+    }
+
+
+class Command(BaseCommand):
+    help = ('Rebuild the materialized shopping lists from carts and check '
+            'them against the live aggregate.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--verify-only', action='store_true',
+                            help='Only compare, do not rebuild.')
+
+    def mismatches(self):
+        live, stored = live_totals(), stored_totals()
+        return {key for key in live.keys() | stored.keys()
+                if live.get(key) != stored.get(key)}
+
+    def handle(self, *args, **options):
+        if not options['verify_only']:
+            with transaction.atomic():
+                ShoppingListItem.objects.all().delete()
+                ShoppingListItem.objects.bulk_create(
+                    (ShoppingListItem(user_id=user, ingredient_id=ingredient,
+                                      amount=total)
+                     for (user, ingredient), total in live_totals().items()),
+                    batch_size=1000
+                )
+            self.stdout.write('Shopping lists rebuilt.')
+        mismatches = self.mismatches()
+        if mismatches:
+            for user, ingredient in sorted(mismatches)[:20]:
+                self.stderr.write(
+                    f'user={user} ingredient={ingredient} is out of date'
+                )
+            raise CommandError(
+                f'{len(mismatches)} shopping list rows differ from carts.'
+            )
+        self.stdout.write(self.style.SUCCESS('Shopping lists are consistent.'))
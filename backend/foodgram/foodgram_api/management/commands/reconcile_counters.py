@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from foodgram_api import response_cache
+from foodgram_api.counters import reconcile_counters
+
+
+class Command(BaseCommand):
+    help = ('Recount favorites and carts of recipes and recipes, followers '
+            'and subscriptions of users, and repair the stored counters.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Only report how many rows drifted.')
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            report = reconcile_counters(dry_run=options['dry_run'])
+            if not options['dry_run'] and report['recipe']:
+                response_cache.invalidate()
+        verb = 'drifted' if options['dry_run'] else 'repaired'
+        self.stdout.write(
+            f'Recipes {verb}: {report["recipe"]}. '
+            f'Profiles {verb}: {report["profile"]}, '
+            f'created: {report["profiles_created"]}.'
+        )
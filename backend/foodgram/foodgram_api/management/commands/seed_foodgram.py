@@ -0,0 +1,342 @@
+import csv
+import io
+import random
+import time
+from collections import Counter
+from datetime import timedelta
+from itertools import accumulate
+from pathlib import Path
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.core.management.color import no_style
+from django.db import connection, transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from foodgram_api import response_cache
+from foodgram_api.fulltext import refresh_search_index
+from foodgram_api.models import (Cart, Favorite, Ingredient,
+                                 IngredientsOfRecipe, Recipe, ShoppingListItem,
+                                 Tag, TagsOfRecipe)
+from foodgram_api.reference import reference_registry
+from users.models import Follow, Profile
+
+User = get_user_model()
+
+INGREDIENT_FILES = (
+    Path(settings.BASE_DIR).parents[1] / 'data' / 'ingredients.json',
+    Path(settings.BASE_DIR) / 'ingredients.json',
+)
+HISTORY = timedelta(days=730)
+IMAGE = 'foodgram/seed.png'
+
+
+def zipf_sampler(rnd, items, exponent):
+    """Return ``sample(k)``, drawing ``k`` of ``items`` with probability
+    falling as ``1 / rank ** exponent``. Ranks are shuffled, so popularity
+    does not follow the order of ``items``."""
+    items = list(items)
+    rnd.shuffle(items)
+    weights = list(accumulate(
+        1 / rank ** exponent for rank in range(1, len(items) + 1)
+    ))
+
+    def sample(k=1):
+        return rnd.choices(items, cum_weights=weights, k=k)
+    return sample
+
+
+def distinct(sample, k):
+    """Up to ``k`` distinct draws of ``sample``."""
+    chosen = dict.fromkeys(sample(k))
+    for _ in range(10):
+        if len(chosen) >= k:
+            break
+        chosen.update(dict.fromkeys(sample(k - len(chosen))))
+    return list(chosen)[:k]
+
+
+def pairs(first, second, total, exclude_equal=False):
+    """Up to ``total`` distinct ``(first(), second())`` pairs."""
+    chosen = set()
+    for _ in range(3):
+        missing = total - len(chosen)
+        if missing <= 0:
+            break
+        chosen.update(
+            pair for pair in zip(first(missing), second(missing))
+            if not exclude_equal or pair[0] != pair[1]
+        )
+    return sorted(chosen)
+
+
+class TableWriter:
+    """Insert rows into the table of ``model`` in batches, bypassing model
+    instances and signals: COPY on PostgreSQL, ``executemany`` elsewhere.
+    Inserted rows are added up per table in ``counts``."""
+
+    def __init__(self, cursor, model, fields, batch_size, counts):
+        self.cursor = cursor
+        self.table = model._meta.db_table
+        self.columns = [model._meta.get_field(name).column for name in fields]
+        self.batch_size = batch_size
+        self.counts = counts
+        self.rows = []
+
+    def append(self, row):
+        self.rows.append(row)
+        if len(self.rows) >= self.batch_size:
+            self.flush()
+
+    def extend(self, rows):
+        for row in rows:
+            self.append(row)
+
+    def flush(self):
+        if not self.rows:
+            return
+        columns = ', '.join(connection.ops.quote_name(column)
+                            for column in self.columns)
+        if connection.vendor == 'postgresql':
+            buffer = io.StringIO()
+            csv.writer(buffer).writerows(self.rows)
+            buffer.seek(0)
+            self.cursor.copy_expert(
+                f'COPY {self.table} ({columns}) FROM STDIN WITH (FORMAT csv)',
+                buffer
+            )
+        else:
+            placeholders = ', '.join(['%s'] * len(self.columns))
+            self.cursor.executemany(
+                f'INSERT INTO {self.table} ({columns}) '
+                f'VALUES ({placeholders})', self.rows
+            )
+        self.counts[self.table] += len(self.rows)
+        self.rows = []
+
+
+class Command(BaseCommand):
+    help = ('Fill the database with a reproducible synthetic dataset: '
+            'users, recipes, favorites, carts and subscriptions with skewed '
+            '(Zipf) popularity, for benchmarks and capacity tests.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--recipes', type=int, default=10000)
+        parser.add_argument('--tags', type=int, default=8,
+                            help='Tags to spread recipes over; missing '
+                                 'ones are created.')
+        parser.add_argument('--ingredients', default=None,
+                            help='Ingredients file, data/ingredients.json '
+                                 'by default.')
+        parser.add_argument('--ingredients-per-recipe', type=int, nargs=2,
+                            default=(3, 12), metavar=('MIN', 'MAX'))
+        parser.add_argument('--favorites-per-user', type=float, default=10)
+        parser.add_argument('--carts-per-user', type=float, default=2)
+        parser.add_argument('--follows-per-user', type=float, default=5)
+        parser.add_argument('--zipf', type=float, default=1.1,
+                            help='Exponent of the popularity '
+                                 'distributions.')
+        parser.add_argument('--password', default=None,
+                            help='Password of every generated user; '
+                                 'unusable by default.')
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--batch-size', type=int, default=10000)
+
+    def handle(self, *args, **options):
+        if options['users'] < 1 or options['recipes'] < 1:
+            raise CommandError('Expected at least one user and recipe.')
+        low, high = options['ingredients_per_recipe']
+        if not 1 <= low <= high:
+            raise CommandError('Expected 1 <= MIN <= MAX ingredients.')
+        self.prefix = f'seed{options["seed"]}-'
+        if User.objects.filter(username__startswith=self.prefix).exists():
+            raise CommandError(
+                f'Users {self.prefix}* already exist: pick another --seed '
+                f'or use an empty database.'
+            )
+        self.rnd = random.Random(options['seed'])
+        self.options = options
+        self.timings = {}
+        self.counts = Counter()
+        started = time.perf_counter()
+        ingredient_ids = self.ingredients()
+        tag_ids = self.tags()
+        with transaction.atomic(), connection.cursor() as cursor:
+            self.cursor = cursor
+            user_ids = self.timed('users', self.users)
+            recipe_ids, authored = self.timed(
+                'recipes', self.recipes, user_ids, tag_ids, ingredient_ids
+            )
+            follows = self.timed('follows', self.follows, user_ids,
+                                 authored)
+            self.timed('profiles', self.profiles, user_ids, authored,
+                       follows)
+            self.timed('shopping lists', self.shopping_lists, user_ids)
+            if connection.vendor == 'postgresql':
+                for sql in connection.ops.sequence_reset_sql(
+                        no_style(), [User, Recipe]):
+                    cursor.execute(sql)
+            self.timed('search index', refresh_search_index, recipe_ids)
+            response_cache.invalidate()
+        reference_registry.invalidate()
+        for table, rows in self.counts.items():
+            self.stdout.write(f'{table:<40} {rows:>10} rows')
+        for phase, seconds in self.timings.items():
+            self.stdout.write(f'{phase:<40} {seconds:>10.2f}s')
+        self.stdout.write(self.style.SUCCESS(
+            f'Seeded in {time.perf_counter() - started:.2f}s.'
+        ))
+
+    def timed(self, phase, func, *args):
+        started = time.perf_counter()
+        result = func(*args)
+        self.timings[phase] = time.perf_counter() - started
+        return result
+
+    def writer(self, model, fields):
+        return TableWriter(self.cursor, model, fields,
+                           self.options['batch_size'], self.counts)
+
+    def write(self, model, fields, rows):
+        writer = self.writer(model, fields)
+        writer.extend(rows)
+        writer.flush()
+
+    def ingredients(self):
+        path = self.options['ingredients']
+        if path is None:
+            path = next((p for p in INGREDIENT_FILES if p.exists()),
+                        INGREDIENT_FILES[0])
+        call_command('load_ingredients', str(path), stdout=self.stdout)
+        return list(Ingredient.objects.order_by('id').values_list(
+            'id', 'name'
+        ))
+
+    def tags(self):
+        missing = self.options['tags'] - Tag.objects.count()
+        if missing > 0:
+            Tag.objects.bulk_create(
+                [Tag(name=f'Seed tag {i}', slug=f'seed-tag-{i}',
+                     color=f'#{i * 0x9e3779 % 0x1000000:06x}')
+                 for i in range(missing)],
+                ignore_conflicts=True
+            )
+        return list(Tag.objects.order_by('id').values_list(
+            'id', flat=True
+        )[:self.options['tags']])
+
+    def users(self):
+        options = self.options
+        first = (User.objects.aggregate(last=Max('id'))['last'] or 0) + 1
+        user_ids = range(first, first + options['users'])
+        password = make_password(options['password'])
+        joined = connection.ops.adapt_datetimefield_value(timezone.now())
+        self.write(User, (
+            'id', 'password', 'is_superuser', 'username', 'first_name',
+            'last_name', 'email', 'is_staff', 'is_active', 'date_joined'
+        ), (
+            (pk, password, False, f'{self.prefix}{number}', 'Seed',
+             f'User {number}', f'{self.prefix}{number}@example.com', False,
+             True, joined)
+            for number, pk in enumerate(user_ids)
+        ))
+        return user_ids
+
+    def recipes(self, user_ids, tag_ids, ingredient_ids):
+        options, rnd = self.options, self.rnd
+        exponent = options['zipf']
+        first = (Recipe.objects.aggregate(last=Max('id'))['last'] or 0) + 1
+        recipe_ids = range(first, first + options['recipes'])
+        authors = zipf_sampler(rnd, user_ids, exponent)
+        tags = zipf_sampler(rnd, tag_ids, exponent)
+        ingredients = zipf_sampler(rnd, ingredient_ids, exponent)
+        # Active users mark many recipes, popular recipes are marked by
+        # many users.
+        activity = zipf_sampler(rnd, user_ids, exponent)
+        popularity = zipf_sampler(rnd, recipe_ids, exponent)
+        marks = {}
+        for model, per_user in ((Favorite, options['favorites_per_user']),
+                                (Cart, options['carts_per_user'])):
+            marks[model] = pairs(activity, popularity,
+                                 int(len(user_ids) * per_user))
+        favorites = Counter(recipe for _, recipe in marks[Favorite])
+        carts = Counter(recipe for _, recipe in marks[Cart])
+
+        recipes = self.writer(Recipe, (
+            'id', 'pub_date', 'updated_at', 'author', 'name', 'image',
+            'image_variants', 'text', 'cooking_time', 'favorites_count',
+            'carts_count'
+        ))
+        tags_of_recipe = self.writer(TagsOfRecipe, ('recipe', 'tag'))
+        items = self.writer(IngredientsOfRecipe,
+                            ('recipe', 'ingredient', 'amount'))
+        adapt = connection.ops.adapt_datetimefield_value
+        start = timezone.now() - HISTORY
+        step = HISTORY / len(recipe_ids)
+        low, high = options['ingredients_per_recipe']
+        authored = Counter()
+        for number, (pk, author) in enumerate(
+                zip(recipe_ids, authors(len(recipe_ids)))):
+            authored[author] += 1
+            chosen = distinct(ingredients, rnd.randint(low, high))
+            names = [name for _, name in chosen]
+            published = adapt(start + step * number)
+            recipes.append((
+                pk, published, published, author,
+                f'{names[0].capitalize()} с {names[-1]}'[:200], IMAGE, '{}',
+                f'Рецепт {number}: {", ".join(names)}.'[:500],
+                min(max(int(rnd.lognormvariate(3.4, 0.6)), 1), 600),
+                favorites[pk], carts[pk]
+            ))
+            tags_of_recipe.extend(
+                (pk, tag) for tag in distinct(tags, rnd.randint(1, 3))
+            )
+            items.extend((pk, ingredient, rnd.randint(1, 500))
+                         for ingredient, _ in chosen)
+        for writer in (recipes, tags_of_recipe, items):
+            writer.flush()
+        for model, rows in marks.items():
+            self.write(model, ('user', 'recipe'), rows)
+        return recipe_ids, authored
+
+    def follows(self, user_ids, authored):
+        rnd = self.rnd
+        followers = zipf_sampler(rnd, user_ids, self.options['zipf'])
+        # Prolific authors gather followers.
+        authors = list(authored)
+        weights = list(accumulate(authored[author] for author in authors))
+        rows = pairs(
+            followers,
+            lambda k: rnd.choices(authors, cum_weights=weights, k=k),
+            int(len(user_ids) * self.options['follows_per_user']),
+            exclude_equal=True
+        )
+        self.write(Follow, ('user', 'author'), rows)
+        return rows
+
+    def profiles(self, user_ids, authored, follows):
+        following = Counter(user for user, _ in follows)
+        followers = Counter(author for _, author in follows)
+        self.write(Profile, (
+            'user', 'recipes_count', 'followers_count', 'following_count'
+        ), ((pk, authored[pk], followers[pk], following[pk])
+            for pk in user_ids))
+
+    def shopping_lists(self, user_ids):
+        table = ShoppingListItem._meta.db_table
+        self.cursor.execute(
+            f'INSERT INTO {table} (user_id, ingredient_id, amount) '
+            f'SELECT cart.user_id, item.ingredient_id, SUM(item.amount) '
+            f'FROM {Cart._meta.db_table} cart '
+            f'JOIN {IngredientsOfRecipe._meta.db_table} item '
+            f'ON item.recipe_id = cart.recipe_id '
+            f'WHERE cart.user_id BETWEEN %s AND %s '
+            f'GROUP BY cart.user_id, item.ingredient_id',
+            [user_ids[0], user_ids[-1]]
+        )
+        self.counts[table] += self.cursor.rowcount
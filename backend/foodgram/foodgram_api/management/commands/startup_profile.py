@@ -0,0 +1,152 @@
+import json
+import os
+import subprocess
+import sys
+from collections import Counter
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+REQUESTS = ('/api/tags/', '/api/recipes/', '/api/ingredients/?name=%D0%B0')
+# Runs in a fresh interpreter, under -X importtime, and prints the phase
+# timings in milliseconds as JSON.
+PROFILE_SCRIPT = '''
+import io, json, sys, time
+
+def timed(name, func):
+    started = time.perf_counter()
+    result = func()
+    timings[name] = (time.perf_counter() - started) * 1000
+    return result
+
+def get_application():
+    from foodgram.wsgi import application
+    return application
+
+def warm_up():
+    from foodgram_api.warmup import warm_up
+    warm_up()
+
+def request(application, url):
+    path, _, query = url.partition('?')
+    environ = {
+        'REQUEST_METHOD': 'GET', 'PATH_INFO': path, 'QUERY_STRING': query,
+        'SCRIPT_NAME': '', 'SERVER_NAME': 'localhost', 'SERVER_PORT': '80',
+        'SERVER_PROTOCOL': 'HTTP/1.1', 'HTTP_HOST': 'localhost',
+        'wsgi.input': io.BytesIO(), 'wsgi.errors': io.StringIO(),
+        'wsgi.url_scheme': 'http', 'wsgi.multithread': False,
+        'wsgi.multiprocess': True, 'wsgi.run_once': False,
+    }
+    statuses = []
+    response = application(
+        environ, lambda status, headers, exc_info=None:
+            statuses.append(status)
+    )
+    b''.join(response)
+    response.close()
+    if not statuses[0].startswith('200'):
+        raise RuntimeError(f'{url} answered {statuses[0]}')
+
+timings = {}
+import django
+timed('django.setup', django.setup)
+application = timed('wsgi application', get_application)
+if sys.argv[1] == 'warm':
+    timed('warm up', warm_up)
+for url in sys.argv[2:]:
+    timed(f'first GET {url}', lambda: request(application, url))
+timings['ready to serve'] = sum(
+    value for name, value in timings.items() if not name.startswith('first')
+) + timings[f'first GET {sys.argv[2]}']
+print(json.dumps(timings))
+'''
+
+
+def parse_importtime(output):
+    """``(self us, cumulative us, module, is_root)`` for every line of
+    ``-X importtime`` output. Roots are the imports no logged module made:
+    those of ``import`` statements run by modules Django loads through
+    ``importlib`` (settings, apps, URLconfs), which are not logged
+    themselves."""
+    rows = []
+    for line in output.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative, name = line[len('import time:'):].split('|')
+        rows.append((int(self_us), int(cumulative), name.strip(),
+                     name.startswith(' ') and not name.startswith('  ')))
+    return rows
+
+
+def package(module):
+    return module.partition('.')[0]
+
+
+class Command(BaseCommand):
+    help = ('Measure how long a fresh worker takes to serve its first '
+            'requests, with and without foodgram_api.warmup, and report '
+            'the import-time hotspots.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--top', type=int, default=15)
+        parser.add_argument('--output', default=None,
+                            help='Also write the report as JSON.')
+
+    def handle(self, *args, **options):
+        cold, imports = self.profile('cold')
+        warm, _ = self.profile('warm')
+        rows = parse_importtime(imports)
+        total = sum(row[0] for row in rows)
+        packages, roots = Counter(), Counter()
+        for self_us, cumulative, module, is_root in rows:
+            packages[package(module)] += self_us
+            if is_root:
+                roots[module] += cumulative
+        top = options['top']
+        report = {
+            'phases_ms': {'cold': cold, 'warm': warm},
+            'import_ms': total / 1000,
+            'packages_ms': {name: us / 1000
+                            for name, us in packages.most_common(top)},
+            'roots_ms': {name: us / 1000
+                         for name, us in roots.most_common(top)},
+        }
+
+        self.stdout.write(f'{"phase":44} {"cold ms":>9} {"warm ms":>9}')
+        for phase in dict.fromkeys([*warm, *cold]):
+            self.stdout.write(
+                f'{phase:44} {self.format(cold.get(phase))} '
+                f'{self.format(warm.get(phase))}'
+            )
+        self.stdout.write(f'\nImports: {total / 1000:.0f} ms in '
+                          f'{len(rows)} modules. Self time by package:')
+        for name, milliseconds in report['packages_ms'].items():
+            self.stdout.write(f'  {name:42} {milliseconds:9.1f}')
+        self.stdout.write('Slowest imports with everything they pull in:')
+        for name, milliseconds in report['roots_ms'].items():
+            self.stdout.write(f'  {name:42} {milliseconds:9.1f}')
+        if options['output']:
+            with open(options['output'], 'w') as report_file:
+                json.dump(report, report_file, indent=2)
+            self.stdout.write(f'Report written to {options["output"]}')
+
+    def format(self, value):
+        return f'{value:9.1f}' if value is not None else f'{"-":>9}'
+
+    def profile(self, mode):
+        environment = {
+            **os.environ,
+            'DJANGO_SETTINGS_MODULE': settings.SETTINGS_MODULE,
+            'PYTHONPATH': os.pathsep.join(filter(None, (
+                str(settings.BASE_DIR), os.environ.get('PYTHONPATH')
+            ))),
+        }
+        result = subprocess.run(
+            [sys.executable, '-X', 'importtime', '-c', PROFILE_SCRIPT, mode,
+             *REQUESTS],
+            env=environment, capture_output=True, text=True
+        )
+        if result.returncode:
+            self.stderr.write(result.stderr[-4000:])
+            raise CommandError(f'The {mode} profile run failed.')
+        return json.loads(result.stdout.splitlines()[-1]), result.stderr
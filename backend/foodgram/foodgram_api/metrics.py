@@ -0,0 +1,322 @@
+"""Per-request performance metrics.
+
+``metrics_middleware`` times every request and, under WSGI, every SQL
+query it runs; ``InstrumentedViewMixin`` adds the time DRF views spend in
+the view, in ``filter_queryset`` and in their serializers. The numbers go
+out as a ``Server-Timing`` header when ``SERVER_TIMING_ENABLED`` is on and
+are aggregated into Prometheus histograms per view and action, served by
+``metrics_view`` at ``/api/_metrics``, along with the database connection
+pool counters, to holders of ``METRICS_TOKEN`` (or to everyone with
+``METRICS_PUBLIC``). Histograms live in the process, so every gunicorn worker
+reports its own share of the traffic.
+"""
+import asyncio
+import threading
+import time
+from bisect import bisect_left
+from collections import Counter
+from functools import wraps
+
+from django.conf import settings
+from django.db import connection
+from django.http import Http404, HttpResponse
+from django.utils.crypto import constant_time_compare
+from django.utils.decorators import sync_and_async_middleware
+
+from . import response_cache
+from .db.pool import pool_stats
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576)
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+POOL_COUNTERS = {
+    'checkouts': 'Connections taken from the pool.',
+    'connects': 'Connections opened by the pool.',
+    'waits': 'Checkouts that waited for a connection to come back.',
+    'wait_seconds': 'Time checkouts spent waiting.',
+    'timeouts': 'Checkouts that gave up waiting.',
+    'recycled': 'Connections closed for reaching MAX_LIFETIME.',
+    'failed_checks': 'Idle connections that failed the health check.',
+}
+POOL_GAUGES = {
+    'open': 'Open connections, checked out or idle.',
+    'idle': 'Connections waiting in the pool.',
+    'max_size': 'Most connections the pool may open.',
+}
+
+
+class RequestMetrics:
+    """Timings of one request in seconds, by name. Used as the
+    ``execute_wrapper`` that counts its queries."""
+
+    def __init__(self, count_queries=True):
+        self.started = time.perf_counter()
+        self.queries = 0 if count_queries else None
+        self.db = 0.0
+        self.timings = {}
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db += time.perf_counter() - started
+            self.queries += 1
+
+    def add(self, name, seconds):
+        self.timings[name] = self.timings.get(name, 0.0) + seconds
+
+    def timed(self, name, func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                self.add(name, time.perf_counter() - started)
+        return wrapper
+
+    def server_timing(self, total):
+        entries = []
+        if self.queries is not None:
+            entries.append(f'db;dur={self.db * 1000:.1f};'
+                           f'desc="{self.queries} queries"')
+        entries.extend(f'{name};dur={seconds * 1000:.1f}'
+                       for name, seconds in self.timings.items())
+        entries.append(f'total;dur={total * 1000:.1f}')
+        return ', '.join(entries)
+
+
+def escape(value):
+    return (str(value).replace('\\', '\\\\').replace('"', '\\"')
+            .replace('\n', '\\n'))
+
+
+class Histogram:
+
+    def __init__(self, name, documentation, buckets):
+        self.name = name
+        self.documentation = documentation
+        self.buckets = buckets
+        # view: [count per bucket and +Inf, sum]
+        self.series = {}
+
+    def observe(self, view, value):
+        series = self.series.get(view)
+        if series is None:
+            series = self.series[view] = [0] * (len(self.buckets) + 1) + [0]
+        series[bisect_left(self.buckets, value)] += 1
+        series[-1] += value
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.documentation}',
+                 f'# TYPE {self.name} histogram']
+        for view, series in sorted(self.series.items()):
+            label = f'view="{escape(view)}"'
+            total = 0
+            for bound, count in zip((*self.buckets, '+Inf'), series):
+                total += count
+                lines.append(
+                    f'{self.name}_bucket{{{label},le="{bound}"}} {total}'
+                )
+            lines.append(f'{self.name}_sum{{{label}}} {series[-1]}')
+            lines.append(f'{self.name}_count{{{label}}} {total}')
+        return lines
+
+
+class MetricsRegistry:
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.histograms = {
+                'duration': Histogram(
+                    'foodgram_request_duration_seconds',
+                    'Time from the first middleware to the response.',
+                    DURATION_BUCKETS
+                ),
+                'db': Histogram(
+                    'foodgram_request_db_seconds',
+                    'Time spent running SQL queries (WSGI only).',
+                    DURATION_BUCKETS
+                ),
+                'queries': Histogram(
+                    'foodgram_request_db_queries',
+                    'SQL queries per request (WSGI only).',
+                    QUERY_BUCKETS
+                ),
+                'filter': Histogram(
+                    'foodgram_request_filter_seconds',
+                    'Time spent in DRF filter_queryset.',
+                    DURATION_BUCKETS
+                ),
+                'serialize': Histogram(
+                    'foodgram_request_serialize_seconds',
+                    'Time spent in DRF serializers.',
+                    DURATION_BUCKETS
+                ),
+                'size': Histogram(
+                    'foodgram_response_size_bytes',
+                    'Size of non-streaming response bodies.',
+                    SIZE_BUCKETS
+                ),
+            }
+            self.responses = Counter()
+
+    def record(self, view, status_code, metrics, total, size):
+        with self.lock:
+            self.responses[view, status_code] += 1
+            self.histograms['duration'].observe(view, total)
+            if metrics.queries is not None:
+                self.histograms['db'].observe(view, metrics.db)
+                self.histograms['queries'].observe(view, metrics.queries)
+            for name in ('filter', 'serialize'):
+                if name in metrics.timings:
+                    self.histograms[name].observe(view, metrics.timings[name])
+            if size is not None:
+                self.histograms['size'].observe(view, size)
+
+    def render(self):
+        lines = ['# HELP foodgram_responses_total Responses by view and '
+                 'status code.',
+                 '# TYPE foodgram_responses_total counter']
+        with self.lock:
+            lines.extend(
+                f'foodgram_responses_total{{view="{escape(view)}",'
+                f'code="{code}"}} {count}'
+                for (view, code), count in sorted(self.responses.items())
+            )
+            for histogram in self.histograms.values():
+                lines.extend(histogram.render())
+        for name, count in response_cache.cache_stats().items():
+            lines.extend((
+                f'# HELP foodgram_response_cache_{name}_total Anonymous '
+                f'response cache {name}.',
+                f'# TYPE foodgram_response_cache_{name}_total counter',
+                f'foodgram_response_cache_{name}_total {count}',
+            ))
+        lines.extend(render_pool_stats(pool_stats()))
+        return '\n'.join(lines) + '\n'
+
+
+def render_pool_stats(stats):
+    metrics = [(f'foodgram_db_pool_{name}_total', 'counter', name, text)
+               for name, text in POOL_COUNTERS.items()]
+    metrics.extend((f'foodgram_db_pool_{name}', 'gauge', name, text)
+                   for name, text in POOL_GAUGES.items())
+    lines = []
+    for metric, kind, name, documentation in metrics:
+        lines.extend((f'# HELP {metric} {documentation}',
+                      f'# TYPE {metric} {kind}'))
+        lines.extend(f'{metric}{{alias="{escape(alias)}"}} '
+                     f'{values.get(name, 0)}'
+                     for alias, values in sorted(stats.items()))
+    return lines
+
+
+registry = MetricsRegistry()
+
+
+def view_label(request):
+    """``RecipeViewSet.list`` for DRF views, the dotted path of the view
+    function otherwise."""
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        return 'unresolved'
+    method = request.method.lower()
+    view_class = getattr(match.func, 'cls', None)
+    if view_class is not None:
+        actions = getattr(match.func, 'actions', None) or {}
+        return f'{view_class.__name__}.{actions.get(method, method)}'
+    return f'{match.func.__module__}.{match.func.__name__}'
+
+
+def finish(request, response):
+    metrics = request.metrics
+    total = time.perf_counter() - metrics.started
+    size = None if response.streaming else len(response.content)
+    registry.record(view_label(request), response.status_code, metrics,
+                    total, size)
+    if settings.SERVER_TIMING_ENABLED:
+        response['Server-Timing'] = metrics.server_timing(total)
+    return response
+
+
+@sync_and_async_middleware
+def metrics_middleware(get_response):
+    """Record ``RequestMetrics`` for every request. Queries are counted on
+    the request thread, so async requests, whose queries run on the thread
+    pool, only report their total time."""
+    if asyncio.iscoroutinefunction(get_response):
+        async def middleware(request):
+            if not settings.METRICS_ENABLED:
+                return await get_response(request)
+            request.metrics = RequestMetrics(count_queries=False)
+            return finish(request, await get_response(request))
+    else:
+        def middleware(request):
+            if not settings.METRICS_ENABLED:
+                return get_response(request)
+            request.metrics = metrics = RequestMetrics()
+            with connection.execute_wrapper(metrics):
+                response = get_response(request)
+            if asyncio.iscoroutine(response):
+                # A chain of MiddlewareMixin instances may only switch to
+                # async mode when called, as MiddlewareMixin.__call__ does.
+                metrics.queries = None
+                return finish_async(request, response)
+            return finish(request, response)
+    return middleware
+
+
+async def finish_async(request, response):
+    return finish(request, await response)
+
+
+class InstrumentedViewMixin:
+    """Add the view, ``filter_queryset`` and serializer time of a DRF view
+    to the request metrics."""
+
+    def get_request_metrics(self):
+        return getattr(self.request, 'metrics', None)
+
+    def dispatch(self, request, *args, **kwargs):
+        metrics = getattr(request, 'metrics', None)
+        if metrics is None:
+            return super().dispatch(request, *args, **kwargs)
+        return metrics.timed('view', super().dispatch)(
+            request, *args, **kwargs
+        )
+
+    def filter_queryset(self, queryset):
+        metrics = self.get_request_metrics()
+        if metrics is None:
+            return super().filter_queryset(queryset)
+        return metrics.timed('filter', super().filter_queryset)(queryset)
+
+    def get_serializer(self, *args, **kwargs):
+        serializer = super().get_serializer(*args, **kwargs)
+        metrics = self.get_request_metrics()
+        if metrics is not None:
+            # ``data`` renders through the instance attribute.
+            serializer.to_representation = metrics.timed(
+                'serialize', serializer.to_representation
+            )
+        return serializer
+
+
+def metrics_view(request):
+    if not settings.METRICS_ENABLED:
+        raise Http404
+    token = settings.METRICS_TOKEN
+    if not token:
+        if not settings.METRICS_PUBLIC:
+            return HttpResponse(status=403)
+    elif not constant_time_compare(
+            request.META.get('HTTP_AUTHORIZATION', ''), f'Bearer {token}'):
+        return HttpResponse(status=401)
+    return HttpResponse(registry.render(), content_type=CONTENT_TYPE)
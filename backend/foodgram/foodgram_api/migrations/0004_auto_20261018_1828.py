@@ -0,0 +1,25 @@
+# Generated by Django 3.1 on 2026-10-18 18:28
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('foodgram_api', '0003_auto_20261018_1820'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='ingredientsofrecipe',
+            index=models.Index(fields=['recipe', 'ingredient'], name='ingredients_recipe_ingr_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(fields=['-pub_date', '-id'], name='recipe_pub_date_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='tagsofrecipe',
+            index=models.Index(fields=['tag', 'recipe'], name='tags_of_recipe_tag_recipe_idx'),
+        ),
+    ]
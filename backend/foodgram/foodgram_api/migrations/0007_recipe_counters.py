@@ -0,0 +1,49 @@
+# Generated by Django 3.1 on 2026-10-18 18:49
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def count_rows(apps, schema_editor):
+    Recipe = apps.get_model('foodgram_api', 'Recipe')
+    counters = {'favorites_count': 'Favorite', 'carts_count': 'Cart'}
+    Recipe.objects.update(**{
+        field: Coalesce(Subquery(
+            apps.get_model('foodgram_api', model).objects.filter(
+                recipe=OuterRef('pk')
+            ).order_by().values('recipe').annotate(
+                total=Count('*')
+            ).values('total')
+        ), 0)
+        for field, model in counters.items()
+    })
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('foodgram_api', '0006_recipe_image_variants'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='carts_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='favorites_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(fields=['-favorites_count', '-id'], name='recipe_favorites_count_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(fields=['-carts_count', '-id'], name='recipe_carts_count_idx'),
+        ),
+        migrations.RunPython(count_rows, migrations.RunPython.noop),
+    ]
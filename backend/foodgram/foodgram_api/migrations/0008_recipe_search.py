@@ -0,0 +1,80 @@
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+INGREDIENT_NAMES = (
+    'SELECT {aggregate} FROM foodgram_api_ingredientsofrecipe item '
+    'JOIN foodgram_api_ingredient ingredient '
+    'ON ingredient.id = item.ingredient_id '
+    'WHERE item.recipe_id = recipe.id'
+)
+
+
+def create_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        config = settings.SEARCH_CONFIG
+        schema_editor.execute(
+            'ALTER TABLE foodgram_api_recipe ADD COLUMN search_vector tsvector'
+        )
+        schema_editor.execute(
+            'CREATE INDEX recipe_search_vector_idx ON foodgram_api_recipe '
+            'USING gin (search_vector)'
+        )
+        names = INGREDIENT_NAMES.format(
+            aggregate="string_agg(ingredient.name, ' ')"
+        )
+        schema_editor.execute(
+            f"UPDATE foodgram_api_recipe recipe SET search_vector = "
+            f"setweight(to_tsvector(%s::regconfig, recipe.name), 'A') || "
+            f"setweight(to_tsvector(%s::regconfig, recipe.text), 'B') || "
+            f"setweight(to_tsvector(%s::regconfig, "
+            f"coalesce(({names}), '')), 'C')",
+            [config, config, config]
+        )
+    elif vendor == 'sqlite':
+        schema_editor.execute(
+            "CREATE VIRTUAL TABLE foodgram_api_recipe_fts USING fts5("
+            "name, text, ingredients, "
+            "tokenize='unicode61 remove_diacritics 2')"
+        )
+        names = INGREDIENT_NAMES.format(
+            aggregate="group_concat(ingredient.name, ' ')"
+        )
+        schema_editor.execute(
+            f"INSERT INTO foodgram_api_recipe_fts "
+            f"(rowid, name, text, ingredients) "
+            f"SELECT recipe.id, recipe.name, recipe.text, "
+            f"coalesce(({names}), '') FROM foodgram_api_recipe recipe"
+        )
+
+
+def drop_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        schema_editor.execute(
+            'ALTER TABLE foodgram_api_recipe DROP COLUMN search_vector'
+        )
+    elif vendor == 'sqlite':
+        schema_editor.execute('DROP TABLE foodgram_api_recipe_fts')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('foodgram_api', '0007_recipe_counters'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+        migrations.CreateModel(
+            name='RecipeSearchDocument',
+            fields=[
+                ('recipe', models.OneToOneField(db_column='rowid', on_delete=django.db.models.deletion.DO_NOTHING, primary_key=True, related_name='search_document', serialize=False, to='foodgram_api.recipe')),
+            ],
+            options={
+                'db_table': 'foodgram_api_recipe_fts',
+                'managed': False,
+            },
+        ),
+    ]
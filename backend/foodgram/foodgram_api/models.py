@@ -1,11 +1,32 @@
 from django.contrib.auth import get_user_model
-from django.db import models
-from django.db.models import Exists, OuterRef, Value
+from django.db import models, transaction
+from django.db.models import (Case, Exists, F, OuterRef, Sum, Value, When,
+                              Window)
+from django.db.models.expressions import RawSQL
+from django.db.models.functions import Greatest, RowNumber
+
+from . import response_cache
 
 User = get_user_model()
 
 
-class RecipeQuerySet(models.QuerySet):
+class CountersQuerySet(models.QuerySet):
+
+    def adjust_counters(self, **deltas):
+        """Add ``deltas`` to denormalized counter columns in a single
+        UPDATE; a counter never drops below zero. Cached responses embed
+        the counters and an UPDATE sends no signals, so they are dropped
+        here."""
+        updated = self.update(**{
+            field: Greatest(F(field) + delta, 0)
+            for field, delta in deltas.items()
+        })
+        if updated:
+            response_cache.invalidate()
+        return updated
+
+
+class RecipeQuerySet(CountersQuerySet):
 
     def additional_properties(self, user):
         if user.is_anonymous:
@@ -29,6 +50,20 @@ class RecipeQuerySet(models.QuerySet):
             )
         )
 
+    def latest_by_author(self, author_ids, limit):
+        """Keep the ``limit`` newest recipes of each of ``author_ids``,
+        ranked with ROW_NUMBER() over those authors' recipes only."""
+        ranked = Recipe.objects.filter(author_id__in=author_ids).order_by(
+        ).annotate(author_rank=Window(
+            RowNumber(), partition_by=F('author_id'),
+            order_by=(F('pub_date').desc(), F('id').desc())
+        )).values('pk', 'author_rank')
+        sql, params = ranked.query.sql_with_params()
+        return self.filter(pk__in=RawSQL(
+            f'SELECT id FROM ({sql}) ranked WHERE author_rank <= %s',
+            (*params, limit)
+        ))
+
 
 class Tag(models.Model):
     name = models.CharField(max_length=50,
@@ -71,6 +106,10 @@ class TagsOfRecipe(models.Model):
     class Meta:
         verbose_name = 'Tag of recipe'
         verbose_name_plural = 'Tags of recipe'
+        indexes = [
+            models.Index(fields=['tag', 'recipe'],
+                         name='tags_of_recipe_tag_recipe_idx'),
+        ]
 
     def __str__(self):
         return f'{self.pk}'
@@ -102,6 +141,12 @@ class IngredientsOfRecipe(models.Model):
                                on_delete=models.CASCADE)
     amount = models.PositiveSmallIntegerField()
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['recipe', 'ingredient'],
+                         name='ingredients_recipe_ingr_idx'),
+        ]
+
     def __str__(self):
         return f'{self.pk}'
 
@@ -109,6 +154,8 @@ class IngredientsOfRecipe(models.Model):
 class Recipe(models.Model):
     pub_date = models.DateTimeField(auto_now_add=True,
                                     db_index=True)
+    updated_at = models.DateTimeField(auto_now=True,
+                                      db_index=True)
     author = models.ForeignKey(User,
                                on_delete=models.CASCADE,
                                related_name='recipe',
@@ -120,6 +167,8 @@ class Recipe(models.Model):
     image = models.ImageField(upload_to='foodgram/',
                               blank=False,
                               null=False)
+    image_variants = models.JSONField(default=dict,
+                                      blank=True)
     text = models.CharField(max_length=500,
                             blank=False,
                             null=False)
@@ -134,17 +183,45 @@ class Recipe(models.Model):
     slug = models.SlugField(unique=True,
                             null=True,
                             blank=True)
+    favorites_count = models.PositiveIntegerField(default=0,
+                                                  editable=False)
+    carts_count = models.PositiveIntegerField(default=0,
+                                              editable=False)
     objects = RecipeQuerySet.as_manager()
 
     class Meta:
         ordering = ['-pub_date']
         verbose_name = 'Recipe'
         verbose_name_plural = 'Recipes'
+        indexes = [
+            models.Index(fields=['-pub_date', '-id'],
+                         name='recipe_pub_date_id_idx'),
+            models.Index(fields=['author', '-pub_date', '-id'],
+                         name='recipe_author_pub_date_idx'),
+            models.Index(fields=['-favorites_count', '-id'],
+                         name='recipe_favorites_count_idx'),
+            models.Index(fields=['-carts_count', '-id'],
+                         name='recipe_carts_count_idx'),
+        ]
 
     def __str__(self):
         return f'{self.name}'
 
 
+class RecipeSearchDocument(models.Model):
+    """Row of the SQLite FTS5 table behind recipe search, mapped only so
+    that searches can join it; see ``foodgram_api.fulltext``."""
+    recipe = models.OneToOneField(Recipe,
+                                  primary_key=True,
+                                  db_column='rowid',
+                                  related_name='search_document',
+                                  on_delete=models.DO_NOTHING)
+
+    class Meta:
+        managed = False
+        db_table = 'foodgram_api_recipe_fts'
+
+
 class Favorite(models.Model):
     user = models.ForeignKey(User,
                              related_name='favorites',
@@ -164,13 +241,27 @@ class Favorite(models.Model):
         ]
 
 
+class CartQuerySet(models.QuerySet):
+
+    def delete(self):
+        with transaction.atomic(savepoint=False):
+            remove_from_shopping_lists(self.values_list('user_id',
+                                                        'recipe_id'))
+            return super().delete()
+
+
 class Cart(models.Model):
+    """A carted recipe. Deleting one through the ORM takes its amounts
+    off the shopping list; Cart has no delete signals, so the cascade from
+    a Recipe or User delete is a single DELETE and the Recipe
+    ``pre_delete`` receiver updates the lists in bulk instead."""
     user = models.ForeignKey(User,
                              related_name='carted',
                              on_delete=models.CASCADE)
     recipe = models.ForeignKey(Recipe,
                                related_name='carted',
                                on_delete=models.CASCADE)
+    objects = CartQuerySet.as_manager()
 
     class Meta:
         verbose_name = 'Carted recipe'
@@ -181,3 +272,99 @@ class Cart(models.Model):
                 name='unique_cart_recipe'
             )
         ]
+
+    def delete(self, *args, **kwargs):
+        with transaction.atomic(savepoint=False):
+            remove_from_shopping_lists([(self.user_id, self.recipe_id)])
+            return super().delete(*args, **kwargs)
+
+
+def recipe_amounts(recipe_id):
+    return dict(
+        IngredientsOfRecipe.objects.filter(
+            recipe_id=recipe_id
+        ).values('ingredient').annotate(
+            total=Sum('amount')
+        ).values_list('ingredient', 'total')
+    )
+
+
+def net_recipe_amounts(added, removed):
+    """Ingredient amounts gained by carting the ``added`` recipes and
+    dropping the ``removed`` ones."""
+    if not added and not removed:
+        return {}
+    return dict(
+        IngredientsOfRecipe.objects.filter(
+            recipe_id__in=[*added, *removed]
+        ).values('ingredient').annotate(total=Sum(Case(
+            When(recipe_id__in=added, then=F('amount')),
+            default=F('amount') * -1,
+            output_field=models.IntegerField()
+        ))).values_list('ingredient', 'total')
+    )
+
+
+def remove_from_shopping_lists(carts):
+    """Take carted recipes, ``(user_id, recipe_id)`` pairs, off their
+    users' shopping lists: one UPDATE per recipe for all of its users."""
+    users_by_recipe = {}
+    for user_id, recipe_id in carts:
+        users_by_recipe.setdefault(recipe_id, []).append(user_id)
+    for recipe_id, user_ids in users_by_recipe.items():
+        ShoppingListItem.objects.add_amounts(user_ids, {
+            ingredient: -amount
+            for ingredient, amount in recipe_amounts(recipe_id).items()
+        })
+
+
+class ShoppingListQuerySet(models.QuerySet):
+
+    def add_amounts(self, user_ids, amounts):
+        user_ids = list(user_ids)
+        amounts = {ingredient: amount
+                   for ingredient, amount in amounts.items() if amount}
+        if not user_ids or not amounts:
+            return
+        # Part of the caller's transaction when there is one.
+        with transaction.atomic(savepoint=False):
+            if any(amount > 0 for amount in amounts.values()):
+                self.bulk_create(
+                    [ShoppingListItem(user_id=user_id,
+                                      ingredient_id=ingredient)
+                     for user_id in user_ids
+                     for ingredient, amount in amounts.items()
+                     if amount > 0],
+                    ignore_conflicts=True
+                )
+            self.filter(
+                user_id__in=user_ids, ingredient_id__in=amounts
+            ).update(amount=F('amount') + Case(
+                *[When(ingredient_id=ingredient, then=Value(amount))
+                  for ingredient, amount in amounts.items()],
+                default=Value(0),
+                output_field=models.IntegerField()
+            ))
+            if any(amount < 0 for amount in amounts.values()):
+                self.filter(user_id__in=user_ids, amount__lte=0).delete()
+
+
+class ShoppingListItem(models.Model):
+    user = models.ForeignKey(User,
+                             related_name='shopping_list',
+                             on_delete=models.CASCADE)
+    ingredient = models.ForeignKey(Ingredient,
+                                   related_name='shopping_list',
+                                   on_delete=models.CASCADE)
+    amount = models.IntegerField(default=0)
+    objects = ShoppingListQuerySet.as_manager()
+
+    class Meta:
+        verbose_name = 'Shopping list item'
+        verbose_name_plural = 'Shopping list items'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'ingredient'],
+                name='unique_shopping_list_ingredient'
+            )
+        ]
@@ -1,5 +1,172 @@
-from rest_framework.pagination import PageNumberPagination
+import base64
+import datetime
+import json
+from functools import reduce
+from operator import or_
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    """Cursor pagination over a unique ordering such as
+    ``('-pub_date', '-id')``.
+
+    Pages are selected with a WHERE clause on the last row seen instead of
+    an OFFSET, and no COUNT is run, so every page costs the same. The
+    ordering comes from the view's ``get_keyset_ordering()``.
+    """
+    cursor_query_param = 'cursor'
+    page_size = api_settings.PAGE_SIZE
+    page_size_query_param = 'limit'
+    max_page_size = 100
+    invalid_cursor_message = 'Invalid cursor.'
+
+    def get_page_size(self, request):
+        value = request.query_params.get(self.page_size_query_param, '')
+        if value.isdigit() and int(value) > 0:
+            return min(int(value), self.max_page_size)
+        return self.page_size
+
+    def encode_cursor(self, values, reverse):
+        values = [value.isoformat() if isinstance(value, datetime.datetime)
+                  else value for value in values]
+        payload = json.dumps({'v': values, 'r': reverse}).encode()
+        return base64.urlsafe_b64encode(payload).decode()
+
+    def decode_cursor(self, request):
+        cursor = request.query_params.get(self.cursor_query_param)
+        if not cursor:
+            return None, False
+        try:
+            payload = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+            values, reverse = payload['v'], bool(payload['r'])
+        except (TypeError, ValueError, KeyError):
+            raise NotFound(self.invalid_cursor_message)
+        if not isinstance(values, list) or len(values) != len(self.fields):
+            raise NotFound(self.invalid_cursor_message)
+        return values, reverse
+
+    def cursor_field(self, queryset, name):
+        """The model field, or the output field of the annotation, that
+        the ordering term ``name`` sorts on."""
+        if name in queryset.query.annotations:
+            return queryset.query.annotations[name].output_field
+        opts = queryset.model._meta
+        for part in name.split('__'):
+            field = opts.pk if part == 'pk' else opts.get_field(part)
+            if field.is_relation:
+                opts = field.related_model._meta
+        if field.is_relation:
+            field = field.target_field
+        return field
+
+    def parse_values(self, queryset, values):
+        """Convert the decoded cursor ``values`` to the types of the
+        ordering fields, so a tampered cursor is a 404 and not a database
+        error."""
+        parsed = []
+        try:
+            for name, value in zip(self.fields, values):
+                if value is None:
+                    raise ValueError(f'{name} is null.')
+                field = self.cursor_field(queryset, name)
+                value = field.to_python(value)
+                field.run_validators(value)
+                # SQLite has no integer field ranges to validate against.
+                if isinstance(value, int) and not -2**63 <= value < 2**63:
+                    raise ValueError(f'{name} is out of range.')
+                parsed.append(value)
+        except (ValidationError, TypeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+        return parsed
+
+    def keyset_filter(self, values, descending):
+        conditions = []
+        for position, (field, desc) in enumerate(zip(self.fields,
+                                                     descending)):
+            lookup = 'lt' if desc else 'gt'
+            condition = {f'{field}__{lookup}': values[position]}
+            condition.update(zip(self.fields[:position], values[:position]))
+            conditions.append(Q(**condition))
+        return reduce(or_, conditions)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        ordering = view.get_keyset_ordering()
+        self.fields = [field.lstrip('-') for field in ordering]
+        descending = [field.startswith('-') for field in ordering]
+        values, reverse = self.decode_cursor(request)
+        if reverse:
+            descending = [not desc for desc in descending]
+        queryset = queryset.order_by(*(
+            f'-{field}' if desc else field
+            for field, desc in zip(self.fields, descending)
+        ))
+        if values is not None:
+            values = self.parse_values(queryset, values)
+            queryset = queryset.filter(self.keyset_filter(values, descending))
+        self.page_size_value = self.get_page_size(request)
+        rows = list(queryset[:self.page_size_value + 1])
+        has_more = len(rows) > self.page_size_value
+        rows = rows[:self.page_size_value]
+        if reverse:
+            rows.reverse()
+        self.request = request
+        self.first, self.last = (rows[0], rows[-1]) if rows else (None, None)
+        self.has_next = has_more if not reverse else values is not None
+        self.has_previous = values is not None if not reverse else has_more
+        return rows
+
+    def row_values(self, row):
+        return [getattr(row, field) for field in self.fields]
+
+    def get_link(self, row, reverse):
+        url = self.request.build_absolute_uri()
+        url = remove_query_param(url, 'page')
+        return replace_query_param(
+            url, self.cursor_query_param,
+            self.encode_cursor(self.row_values(row), reverse)
+        )
+
+    def get_next_link(self):
+        if not self.has_next or self.last is None:
+            return None
+        return self.get_link(self.last, False)
+
+    def get_previous_link(self):
+        if not self.has_previous or self.first is None:
+            return None
+        return self.get_link(self.first, True)
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'results': data,
+        })
 
 
 class LimitPagination(PageNumberPagination):
     page_size_query_param = 'limit'
+
+    def use_keyset(self, request, view):
+        return (KeysetPagination.cursor_query_param in request.query_params
+                and view is not None
+                and getattr(view, 'get_keyset_ordering', lambda: None)())
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if self.use_keyset(request, view):
+            self.keyset = KeysetPagination()
+            return self.keyset.paginate_queryset(queryset, request, view)
+        self.keyset = None
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.keyset is not None:
+            return self.keyset.get_paginated_response(data)
+        return super().get_paginated_response(data)
@@ -6,7 +6,7 @@ class RecipePermissions(permissions.BasePermission):
         if request.method in permissions.SAFE_METHODS:
             return True
         if view.action in ('create', 'update',
-                           'partial_update', 'delete'):
+                           'partial_update', 'destroy'):
             return request.user.is_authenticated
 
     def has_object_permission(self, request, view, obj):
@@ -0,0 +1,74 @@
+import re
+
+from django.conf import settings
+from django.db import connection, transaction
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from .models import Cart, Favorite, IngredientsOfRecipe, Recipe, TagsOfRecipe
+
+LARGE_TABLES = {
+    model._meta.db_table
+    for model in (Recipe, TagsOfRecipe, IngredientsOfRecipe, Favorite, Cart)
+}
+SEQ_SCAN_PATTERNS = {
+    'postgresql': re.compile(r'Seq Scan on "?(\w+)"?'),
+    'sqlite': re.compile(r'\bSCAN (?:TABLE )?(\w+)'),
+}
+ALIAS_PATTERN = re.compile(r'"(\w+)" (U\d+|T\d+)\b')
+
+
+def recipe_filter_combinations(tags):
+    return {
+        'all': {},
+        'tags': {'tags': tags},
+        'author': {'author': 1},
+        'is_favorited': {'is_favorited': 1},
+        'is_in_shopping_cart': {'is_in_shopping_cart': 1},
+        'tags+author': {'tags': tags, 'author': 1},
+        'tags+is_favorited': {'tags': tags, 'is_favorited': 1},
+        'popular': {'ordering': '-favorites_count'},
+        'search': {'search': 'recipe'},
+    }
+
+
+def recipe_list_queryset(user, params):
+    """Return the first page of ``GET /api/recipes/`` as the view builds it
+    for ``user`` and query ``params``."""
+    from .views import RecipeViewSet
+
+    request = Request(APIRequestFactory().get('/api/recipes/', params))
+    request.user = user
+    view = RecipeViewSet(request=request, action='list', format_kwarg=None,
+                         args=(), kwargs={})
+    queryset = view.filter_queryset(view.get_queryset())
+    return queryset[:settings.REST_FRAMEWORK['PAGE_SIZE']]
+
+
+def explain(queryset):
+    """Return the plan of ``queryset``. On PostgreSQL sequential scans are
+    disabled first, so a scan that remains has no usable index behind it
+    whatever the size of the table."""
+    if connection.vendor != 'postgresql':
+        return queryset.explain()
+    with transaction.atomic():
+        with connection.cursor() as cursor:
+            cursor.execute('SET LOCAL enable_seqscan = off')
+        return queryset.explain()
+
+
+def sequential_scans(queryset, plan, tables=LARGE_TABLES):
+    """Return the names of ``tables`` that ``plan`` reads in full."""
+    pattern = SEQ_SCAN_PATTERNS.get(connection.vendor)
+    if pattern is None:
+        return set()
+    aliases = {alias: table for table, alias
+               in ALIAS_PATTERN.findall(str(queryset.query))}
+    scanned = set()
+    for line in plan.splitlines():
+        # SQLite reports walks over an index as "SCAN ... USING INDEX".
+        if connection.vendor == 'sqlite' and 'USING' in line:
+            continue
+        for name in pattern.findall(line):
+            scanned.add(aliases.get(name, name))
+    return scanned & set(tables)
@@ -0,0 +1,80 @@
+import threading
+import time
+from collections import namedtuple
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from .models import Ingredient, Tag
+
+VERSION_KEY = 'reference:version'
+
+Snapshot = namedtuple(
+    'Snapshot',
+    ('version', 'tags', 'tags_by_slug', 'ingredients', 'ingredients_by_name')
+)
+
+
+class ReferenceRegistry:
+    """Process-local copy of the Tag and Ingredient tables.
+
+    The snapshot is tagged with a version kept in the shared cache. Writes
+    bump it, and every worker compares its copy against it at most once per
+    ``REFERENCE_CACHE_CHECK_INTERVAL`` seconds, reloading both tables
+    when it moved.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._snapshot = None
+        self._checked_at = 0.0
+
+    def shared_version(self):
+        version = cache.get(VERSION_KEY)
+        if version is None:
+            cache.add(VERSION_KEY, time.time_ns(), timeout=None)
+            version = cache.get(VERSION_KEY)
+        return version
+
+    def bump_version(self):
+        try:
+            cache.incr(VERSION_KEY)
+        except ValueError:
+            cache.add(VERSION_KEY, time.time_ns(), timeout=None)
+
+    def invalidate(self):
+        """Drop the local copy now and the other workers' copies once the
+        current transaction commits."""
+        self._snapshot = None
+        transaction.on_commit(self.bump_version)
+
+    def build(self, version):
+        tags = {tag.id: tag for tag in Tag.objects.all()}
+        ingredients = {ingredient.id: ingredient
+                       for ingredient in Ingredient.objects.all()}
+        by_name = {}
+        for ingredient in ingredients.values():
+            by_name.setdefault(ingredient.name.casefold(), ingredient)
+        return Snapshot(
+            version, tags, {tag.slug: tag for tag in tags.values()},
+            ingredients, by_name
+        )
+
+    def get(self):
+        snapshot = self._snapshot
+        now = time.monotonic()
+        if (snapshot is not None and now - self._checked_at
+                < settings.REFERENCE_CACHE_CHECK_INTERVAL):
+            return snapshot
+        version = self.shared_version()
+        if snapshot is None or snapshot.version != version:
+            with self._lock:
+                snapshot = self._snapshot
+                if snapshot is None or snapshot.version != version:
+                    snapshot = self._snapshot = self.build(version)
+        self._checked_at = now
+        return snapshot
+
+
+reference_registry = ReferenceRegistry()
@@ -0,0 +1,132 @@
+import csv
+import os
+import tempfile
+
+from django.conf import settings
+from rest_framework import exceptions, negotiation, renderers
+
+
+class ShoppingCartNegotiation(negotiation.DefaultContentNegotiation):
+    """Pick the export format from ?format= and fall back to plain text
+    when the client's Accept header matches none of the formats."""
+
+    def select_renderer(self, request, renderer_list, format_suffix=None):
+        try:
+            return super().select_renderer(request, renderer_list,
+                                           format_suffix)
+        except exceptions.NotAcceptable:
+            return renderer_list[0], renderer_list[0].media_type
+
+
+class ShoppingCartRenderer(renderers.BaseRenderer):
+    """Base class for shopping cart exports.
+
+    ``stream`` turns an iterable of aggregated rows (``name``,
+    ``measurement_unit``, ``amount``) into chunks for a
+    StreamingHttpResponse. ``render`` is only used for error responses.
+    """
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        return renderers.JSONRenderer().render(data)
+
+    def stream(self, rows):
+        raise NotImplementedError
+
+    def get_filename(self):
+        return f'shopping_cart.{self.format}'
+
+
+class ShoppingCartTextRenderer(ShoppingCartRenderer):
+    media_type = 'text/plain'
+    format = 'txt'
+
+    def stream(self, rows):
+        for row in rows:
+            yield (f'{row["name"]} - {row["amount"]} '
+                   f'{row["measurement_unit"]} \r\n')
+
+
+class Echo:
+    def write(self, value):
+        return value
+
+
+class ShoppingCartCSVRenderer(ShoppingCartRenderer):
+    media_type = 'text/csv'
+    format = 'csv'
+
+    def stream(self, rows):
+        writer = csv.writer(Echo())
+        yield writer.writerow(('name', 'amount', 'measurement_unit'))
+        for row in rows:
+            yield writer.writerow(
+                (row['name'], row['amount'], row['measurement_unit'])
+            )
+
+
+class ShoppingCartPDFRenderer(ShoppingCartRenderer):
+    media_type = 'application/pdf'
+    format = 'pdf'
+    charset = None
+    font_name = 'ShoppingCartFont'
+    font_size = 12
+    line_height = 18
+    margin = 50
+    chunk_size = 64 * 1024
+
+    def get_font(self):
+        from reportlab.pdfbase import pdfmetrics
+        from reportlab.pdfbase.ttfonts import TTFont
+
+        path = settings.SHOPPING_CART_PDF_FONT
+        if self.font_name in pdfmetrics.getRegisteredFontNames():
+            return self.font_name
+        if not os.path.exists(path):
+            return 'Helvetica'
+        pdfmetrics.registerFont(TTFont(self.font_name, path))
+        return self.font_name
+
+    def stream(self, rows):
+        from reportlab.lib.pagesizes import A4
+        from reportlab.pdfgen import canvas
+
+        width, height = A4
+        font = self.get_font()
+        # reportlab writes the document in one go on save(), so pages are
+        # spooled to a temporary file that spills to disk for big carts.
+        with tempfile.SpooledTemporaryFile(max_size=self.chunk_size) as pdf:
+            document = canvas.Canvas(pdf, pagesize=A4)
+            page, y = 1, 0
+            for row in rows:
+                if y < self.margin:
+                    if y:
+                        document.showPage()
+                        page += 1
+                    document.setFont(font, self.font_size + 4)
+                    document.drawString(self.margin, height - self.margin,
+                                        'Shopping cart')
+                    document.setFont(font, self.font_size - 2)
+                    document.drawRightString(width - self.margin,
+                                             self.margin / 2, str(page))
+                    document.setFont(font, self.font_size)
+                    y = height - self.margin - 2 * self.line_height
+                document.drawString(
+                    self.margin, y,
+                    f'{row["name"]} - {row["amount"]} '
+                    f'{row["measurement_unit"]}'
+                )
+                y -= self.line_height
+            document.save()
+            pdf.seek(0)
+            chunk = pdf.read(self.chunk_size)
+            while chunk:
+                yield chunk
+                chunk = pdf.read(self.chunk_size)
+
+
+SHOPPING_CART_RENDERERS = (
+    ShoppingCartTextRenderer,
+    ShoppingCartCSVRenderer,
+    ShoppingCartPDFRenderer,
+)
@@ -0,0 +1,114 @@
+import hashlib
+import threading
+import time
+from collections import Counter
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import parse_http_date_safe
+
+VERSION_KEY = 'api:response:version'
+CACHED_HEADERS = ('Allow', 'ETag', 'Last-Modified', 'Vary')
+
+stats = Counter()
+stats_lock = threading.Lock()
+
+
+def count(name):
+    with stats_lock:
+        stats[name] += 1
+
+
+def cache_stats():
+    with stats_lock:
+        return {'hits': stats['hits'], 'misses': stats['misses']}
+
+
+def get_version():
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        # Start from the clock rather than 1, so a version key evicted
+        # from the cache never comes back as a value already used.
+        cache.add(VERSION_KEY, time.time_ns(), timeout=None)
+        version = cache.get(VERSION_KEY)
+    return version
+
+
+def bump_version():
+    try:
+        cache.incr(VERSION_KEY)
+    except ValueError:
+        cache.add(VERSION_KEY, time.time_ns(), timeout=None)
+
+
+def invalidate():
+    """Drop every cached response once the current transaction commits."""
+    transaction.on_commit(bump_version)
+
+
+def response_key(request, version):
+    query = urlencode(sorted(
+        (key, sorted(values)) for key, values in request.GET.lists()
+    ), doseq=True)
+    digest = hashlib.md5(
+        f'{request.path}?{query}|{request.META.get("HTTP_ACCEPT", "")}'
+        .encode()
+    ).hexdigest()
+    return f'api:response:{version}:{digest}'
+
+
+class AnonymousCacheMixin:
+    """Serve ``list`` and ``retrieve`` from the cache for requests without
+    credentials.
+
+    Keys carry a global version that ``invalidate()`` bumps on every write
+    to the cached models, so stale entries are never read again and simply
+    expire.
+    """
+    cache_actions = ('list', 'retrieve')
+
+    def get_response_key(self, request):
+        if request.method != 'GET' or 'HTTP_AUTHORIZATION' in request.META:
+            return None
+        if self.action_map.get('get') not in self.cache_actions:
+            return None
+        return response_key(request, get_version())
+
+    def dispatch(self, request, *args, **kwargs):
+        key = self.get_response_key(request)
+        if key is None:
+            return super().dispatch(request, *args, **kwargs)
+        cached = cache.get(key)
+        if cached is not None:
+            count('hits')
+            content, content_type, headers = cached
+            response = get_conditional_response(
+                request, etag=headers.get('ETag'),
+                last_modified=parse_http_date_safe(
+                    headers.get('Last-Modified', '')
+                )
+            ) or HttpResponse(content, content_type=content_type)
+            for name, value in headers.items():
+                response[name] = value
+            response['X-Cache'] = 'HIT'
+            return response
+        count('misses')
+        response = super().dispatch(request, *args, **kwargs)
+        if (response.status_code == 200
+                and getattr(response, 'accepted_media_type', '')
+                == 'application/json'):
+            response.add_post_render_callback(
+                lambda rendered: self.store(key, rendered)
+            )
+        response['X-Cache'] = 'MISS'
+        return response
+
+    def store(self, key, response):
+        headers = {name: response[name] for name in CACHED_HEADERS
+                   if response.has_header(name)}
+        cache.set(key, (response.content, response['Content-Type'], headers),
+                  settings.API_CACHE_TIMEOUT)
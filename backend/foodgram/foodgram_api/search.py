@@ -0,0 +1,79 @@
+import threading
+from array import array
+from bisect import bisect_left, bisect_right
+
+from .reference import reference_registry
+
+
+def trigrams(key):
+    return {key[i:i + 3] for i in range(len(key) - 2)}
+
+
+class IngredientIndex:
+    """In-process prefix and trigram index over the ingredients held by
+    the reference registry.
+
+    Entries are kept sorted by casefolded name and id, so prefix matches
+    are a bisect over the sorted keys and substring matches come from
+    intersecting trigram posting lists. The index is built lazily on the
+    first search and rebuilt whenever the registry reloads.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._snapshot = None
+
+    def build(self, reference):
+        rows = sorted(
+            ({'id': ingredient.id, 'name': ingredient.name,
+              'measurement_unit': ingredient.measurement_unit}
+             for ingredient in reference.ingredients.values()),
+            key=lambda row: (row['name'].casefold(), row['id'])
+        )
+        keys = [row['name'].casefold() for row in rows]
+        postings = {}
+        for position, key in enumerate(keys):
+            for trigram in trigrams(key):
+                postings.setdefault(trigram, array('I')).append(position)
+        snapshot = (reference, tuple(rows), keys, postings)
+        self._snapshot = snapshot
+        return snapshot
+
+    def _get_snapshot(self):
+        reference = reference_registry.get()
+        snapshot = self._snapshot
+        if snapshot is None or snapshot[0] is not reference:
+            with self._lock:
+                snapshot = self._snapshot
+                if snapshot is None or snapshot[0] is not reference:
+                    snapshot = self.build(reference)
+        return snapshot
+
+    def search(self, query):
+        _, rows, keys, postings = self._get_snapshot()
+        key = query.strip().casefold()
+        if not key:
+            return list(rows)
+        start = bisect_left(keys, key)
+        end = bisect_right(keys, key + chr(0x10ffff), lo=start)
+        if len(key) < 3:
+            candidates = range(len(keys))
+        else:
+            lists = []
+            for trigram in trigrams(key):
+                if trigram not in postings:
+                    return list(rows[start:end])
+                lists.append(postings[trigram])
+            lists.sort(key=len)
+            candidates = set(lists[0])
+            for positions in lists[1:]:
+                candidates.intersection_update(positions)
+            candidates = sorted(candidates)
+        substring = [
+            rows[position] for position in candidates
+            if not start <= position < end and key in keys[position]
+        ]
+        return list(rows[start:end]) + substring
+
+
+ingredient_index = IngredientIndex()
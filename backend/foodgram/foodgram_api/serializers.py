@@ -1,20 +1,26 @@
 from django.contrib.auth import get_user_model
+from django.db import transaction
 from drf_extra_fields.fields import Base64ImageField
 from rest_framework import serializers
 from rest_framework.validators import UniqueTogetherValidator
 
+from users.models import Profile
 from users.serializers import UserSerializer
 
+from .images import delete_variants, schedule_image_processing, variant_urls
 from .models import (Cart, Favorite, Ingredient, IngredientsOfRecipe, Recipe,
-                     Tag)
+                     ShoppingListItem, Tag, TagsOfRecipe)
+from .reference import reference_registry
 
 User = get_user_model()
 
+TOGGLE_BATCH_LIMIT = 500
+
 
 class IngredientSerializer(serializers.ModelSerializer):
     class Meta:
         model = Ingredient
-        read_only_fields = '__all__'
+        fields = '__all__'
 
 
 class TagSerializer(serializers.ModelSerializer):
@@ -35,10 +41,27 @@ class IngredientsOfRecipeSerializer(serializers.ModelSerializer):
         fields = ('id', 'name', 'measurement_unit', 'amount')
 
 
+class ReferenceTagField(serializers.PrimaryKeyRelatedField):
+    """Resolve tag ids against the reference registry instead of one
+    query per id."""
+
+    def to_internal_value(self, data):
+        if isinstance(data, bool):
+            self.fail('incorrect_type', data_type=type(data).__name__)
+        try:
+            tag = reference_registry.get().tags.get(int(data))
+        except (TypeError, ValueError):
+            self.fail('incorrect_type', data_type=type(data).__name__)
+        if tag is None:
+            # A tag added by another worker since the last registry check.
+            tag = Tag.objects.filter(pk=data).first()
+        if tag is None:
+            self.fail('does_not_exist', pk_value=data)
+        return tag
+
+
 class SetIngredientsToRecipeSerializer(serializers.ModelSerializer):
-    id = serializers.PrimaryKeyRelatedField(
-        queryset=Ingredient.objects.all()
-    )
+    id = serializers.IntegerField()
     amount = serializers.IntegerField()
 
     class Meta:
@@ -52,24 +75,39 @@ class SetIngredientsToRecipeSerializer(serializers.ModelSerializer):
 
 
 class RecipeReadSerializer(serializers.ModelSerializer):
-    tags = TagSerializer(many=True, read_only=True)
+    tags = serializers.SerializerMethodField()
     author = UserSerializer(read_only=True)
     ingredients = serializers.SerializerMethodField()
     is_favorited = serializers.SerializerMethodField()
     is_in_shopping_cart = serializers.SerializerMethodField()
+    image_variants = serializers.SerializerMethodField()
 
     class Meta:
         model = Recipe
-        exclude = ('pub_date',)
+        exclude = ('pub_date', 'updated_at')
+
+    def get_image_variants(self, recipe):
+        return variant_urls(recipe, self.context.get('request'))
+
+    def get_tags(self, recipe):
+        tags = reference_registry.get().tags
+        return TagSerializer(
+            [tags.get(row.tag_id) or row.tag
+             for row in recipe.tag_of_recipe.all()],
+            many=True
+        ).data
 
     def get_ingredients(self, recipe):
-        ingredients_of_recipe = IngredientsOfRecipe.objects.filter(
-            recipe=recipe
-        )
-        return IngredientsOfRecipeSerializer(ingredients_of_recipe,
-                                             many=True).data
+        ingredients = reference_registry.get().ingredients
+        rows = recipe.ingredients_of_recipe.all()
+        for row in rows:
+            if row.ingredient_id in ingredients:
+                row.ingredient = ingredients[row.ingredient_id]
+        return IngredientsOfRecipeSerializer(rows, many=True).data
 
     def get_is_favorited(self, recipe):
+        if hasattr(recipe, 'is_favorited'):
+            return recipe.is_favorited
         request = self.context.get('request')
         if request.user is None or request.user.is_anonymous:
             return False
@@ -77,6 +115,8 @@ class RecipeReadSerializer(serializers.ModelSerializer):
                                        recipe=recipe.id).exists()
 
     def get_is_in_shopping_cart(self, recipe):
+        if hasattr(recipe, 'is_in_shopping_cart'):
+            return recipe.is_in_shopping_cart
         request = self.context.get('request')
         if request.user is None or request.user.is_anonymous:
             return False
@@ -87,56 +127,156 @@ class RecipeReadSerializer(serializers.ModelSerializer):
 class RecipeWriteSerializer(serializers.ModelSerializer):
     author = UserSerializer(default=serializers.CurrentUserDefault())
     ingredients = SetIngredientsToRecipeSerializer(many=True)
-    tags = serializers.PrimaryKeyRelatedField(queryset=Tag.objects.all(),
-                                              many=True)
+    tags = ReferenceTagField(queryset=Tag.objects.all(), many=True)
     name = serializers.CharField()
     image = Base64ImageField(max_length=None, use_url=True)
 
     class Meta:
         model = Recipe
-        exclude = ('pub_date',)
+        exclude = ('pub_date', 'updated_at', 'image_variants')
 
-    def add_ingredients(self, ingredients, recipe):
+    def merge_ingredients(self, ingredients):
+        merged = {}
         for ingredient in ingredients:
-            IngredientsOfRecipe.objects.create(
-                recipe=recipe,
-                ingredient=ingredient['id'],
-                amount=ingredient['amount']
-            )
-
+            item = merged.setdefault(ingredient['id'].id,
+                                     [ingredient['id'], 0])
+            item[1] += ingredient['amount']
+        return merged
+
+    def cache_related(self, recipe, tags, ingredients_of_recipe):
+        # UpdateModelMixin clears the prefetch cache after save(), so the
+        # rows are attached again in to_representation.
+        self.related_objects = {
+            'tag_of_recipe': [TagsOfRecipe(recipe=recipe, tag=tag)
+                              for tag in tags],
+            'ingredients_of_recipe': ingredients_of_recipe,
+        }
+
+    @transaction.atomic
     def create(self, validated_data):
-        tag_data = validated_data.pop('tags')
-        ingredients = validated_data.pop('ingredients')
-        if validated_data.get('image') is not None:
-            image = validated_data.pop('image')
+        tags = validated_data.pop('tags')
+        ingredients = self.merge_ingredients(
+            validated_data.pop('ingredients')
+        )
         recipe = Recipe.objects.create(**validated_data)
-        recipe.save()
-        recipe.image.set(image)
-        recipe.tags.set(tag_data)
-        self.add_ingredients(ingredients, recipe)
+        Profile.objects.filter(pk=recipe.author_id).adjust_counters(
+            recipes_count=1
+        )
+        schedule_image_processing(recipe.pk, recipe.image.name)
+        TagsOfRecipe.objects.bulk_create(
+            [TagsOfRecipe(recipe=recipe, tag=tag) for tag in tags]
+        )
+        ingredients_of_recipe = IngredientsOfRecipe.objects.bulk_create(
+            [IngredientsOfRecipe(recipe=recipe, ingredient=ingredient,
+                                 amount=amount)
+             for ingredient, amount in ingredients.values()]
+        )
+        self.cache_related(recipe, tags, ingredients_of_recipe)
+        recipe.is_favorited = False
+        recipe.is_in_shopping_cart = False
         return recipe
 
+    def update_tags(self, recipe, tags):
+        current = set(TagsOfRecipe.objects.filter(
+            recipe=recipe
+        ).values_list('tag_id', flat=True))
+        wanted = {tag.id for tag in tags}
+        if current - wanted:
+            TagsOfRecipe.objects.filter(
+                recipe=recipe, tag_id__in=current - wanted
+            ).delete()
+        TagsOfRecipe.objects.bulk_create(
+            [TagsOfRecipe(recipe=recipe, tag=tag)
+             for tag in tags if tag.id not in current]
+        )
+
+    def update_ingredients(self, recipe, ingredients):
+        """Apply the difference between the stored and submitted
+        ingredients and return the rows plus the per-ingredient change
+        in amount."""
+        deltas, kept, changed, stale = {}, {}, [], []
+        for row in IngredientsOfRecipe.objects.filter(recipe=recipe):
+            deltas[row.ingredient_id] = (
+                deltas.get(row.ingredient_id, 0) - row.amount
+            )
+            if row.ingredient_id not in ingredients or (
+                    row.ingredient_id in kept):
+                stale.append(row.id)
+                continue
+            ingredient, amount = ingredients[row.ingredient_id]
+            row.ingredient = ingredient
+            if row.amount != amount:
+                row.amount = amount
+                changed.append(row)
+            kept[row.ingredient_id] = row
+        if stale:
+            IngredientsOfRecipe.objects.filter(id__in=stale).delete()
+        if changed:
+            IngredientsOfRecipe.objects.bulk_update(changed, ['amount'])
+        created = IngredientsOfRecipe.objects.bulk_create(
+            [IngredientsOfRecipe(recipe=recipe, ingredient=ingredient,
+                                 amount=amount)
+             for ingredient_id, (ingredient, amount) in ingredients.items()
+             if ingredient_id not in kept]
+        )
+        kept.update((row.ingredient_id, row) for row in created)
+        for ingredient_id, (ingredient, amount) in ingredients.items():
+            deltas[ingredient_id] = deltas.get(ingredient_id, 0) + amount
+        return [kept[ingredient_id] for ingredient_id in ingredients], deltas
+
+    @transaction.atomic
     def update(self, recipe, validated_data):
         tags = validated_data.pop('tags')
-        ingredients = validated_data.pop('ingredients')
-        IngredientsOfRecipe.objects.filter(recipe=recipe).delete()
+        ingredients = self.merge_ingredients(
+            validated_data.pop('ingredients')
+        )
+        fields = ['name', 'text', 'cooking_time', 'updated_at']
         if validated_data.get('image') is not None:
             recipe.image = validated_data.get('image')
+            delete_variants(recipe.image_variants)
+            recipe.image_variants = {}
+            fields.extend(('image', 'image_variants'))
         recipe.name = validated_data.get('name')
         recipe.text = validated_data.get('text')
         recipe.cooking_time = validated_data.get('cooking_time')
-        recipe.save()
-        recipe.tags.set(tags)
-        self.add_ingredients(ingredients, recipe)
+        recipe.save(update_fields=fields)
+        if 'image' in fields:
+            schedule_image_processing(recipe.pk, recipe.image.name)
+        self.update_tags(recipe, tags)
+        ingredients_of_recipe, deltas = self.update_ingredients(
+            recipe, ingredients
+        )
+        if any(deltas.values()):
+            ShoppingListItem.objects.add_amounts(
+                recipe.carted.values_list('user_id', flat=True), deltas
+            )
+        self.cache_related(recipe, tags, ingredients_of_recipe)
         return recipe
 
     def to_representation(self, recipe):
+        if getattr(self, 'related_objects', None):
+            recipe._prefetched_objects_cache = self.related_objects
         return RecipeReadSerializer(recipe,
                                     context={
                                         'request': self.context['request']
                                     }
                                     ).data
 
+    def validate_ingredients(self, ingredients):
+        found = reference_registry.get().ingredients
+        missing = {ingredient['id'] for ingredient in ingredients} - set(found)
+        if missing:
+            # Rows added by another worker since the last registry check.
+            found = {**found, **Ingredient.objects.in_bulk(missing)}
+        for ingredient in ingredients:
+            if ingredient['id'] not in found:
+                raise serializers.ValidationError(
+                    f'Invalid pk "{ingredient["id"]}" - '
+                    f'object does not exist.'
+                )
+            ingredient['id'] = found[ingredient['id']]
+        return ingredients
+
     def validate_cooking_time(self, cooking_time):
         if int(cooking_time) < 1:
             raise serializers.ValidationError(
@@ -147,7 +287,10 @@ class RecipeWriteSerializer(serializers.ModelSerializer):
     def validate_name(self, name):
         if self.context.get('request').method == 'GET':
             return name
-        if Recipe.objects.filter(name=name).exists():
+        recipes = Recipe.objects.filter(name=name)
+        if self.instance is not None:
+            recipes = recipes.exclude(pk=self.instance.pk)
+        if recipes.exists():
             raise serializers.ValidationError(
                 "Recipe with such name already exists."
             )
@@ -155,9 +298,14 @@ class RecipeWriteSerializer(serializers.ModelSerializer):
 
 
 class MarkedPreviewRepresentationSerializer(serializers.ModelSerializer):
+    image_variants = serializers.SerializerMethodField()
+
     class Meta:
         model = Recipe
-        fields = ('id', 'name', 'image', 'cooking_time')
+        fields = ('id', 'name', 'image', 'image_variants', 'cooking_time')
+
+    def get_image_variants(self, recipe):
+        return variant_urls(recipe, self.context.get('request'))
 
 
 class FavoriteSerializer(serializers.ModelSerializer):
@@ -194,3 +342,27 @@ class CartSerializer(serializers.ModelSerializer):
 
     def to_representation(self, instance):
         return MarkedPreviewRepresentationSerializer(instance.recipe).data
+
+
+class RecipeIdsSerializer(serializers.Serializer):
+    add = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        max_length=TOGGLE_BATCH_LIMIT, required=False, default=list
+    )
+    remove = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        max_length=TOGGLE_BATCH_LIMIT, required=False, default=list
+    )
+
+    def validate(self, data):
+        both = set(data['add']) & set(data['remove'])
+        if both:
+            raise serializers.ValidationError(
+                f'Recipes {sorted(both)} are both added and removed.'
+            )
+        return data
+
+
+class BatchToggleSerializer(serializers.Serializer):
+    favorite = RecipeIdsSerializer(required=False)
+    shopping_cart = RecipeIdsSerializer(required=False)
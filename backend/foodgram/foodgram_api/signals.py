@@ -0,0 +1,120 @@
+from django.contrib.auth import get_user_model
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import receiver
+from django.utils import timezone
+
+from users.models import Profile
+
+from . import response_cache
+from .fulltext import schedule_search_refresh
+from .images import delete_variants
+from .models import (Cart, Ingredient, IngredientsOfRecipe, Recipe,
+                     ShoppingListItem, Tag, TagsOfRecipe, recipe_amounts,
+                     remove_from_shopping_lists)
+from .reference import reference_registry
+
+User = get_user_model()
+
+
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+@receiver(post_save, sender=Ingredient)
+@receiver(post_delete, sender=Ingredient)
+def invalidate_reference_registry(sender, **kwargs):
+    reference_registry.invalidate()
+
+
+@receiver(post_save, sender=Recipe)
+@receiver(post_delete, sender=Recipe)
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+@receiver(post_save, sender=Ingredient)
+@receiver(post_delete, sender=Ingredient)
+@receiver(post_save, sender=IngredientsOfRecipe)
+@receiver(post_delete, sender=IngredientsOfRecipe)
+@receiver(post_save, sender=TagsOfRecipe)
+@receiver(post_delete, sender=TagsOfRecipe)
+def invalidate_cached_responses(sender, **kwargs):
+    response_cache.invalidate()
+
+
+@receiver(post_save, sender=Cart)
+def add_to_shopping_list(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        ShoppingListItem.objects.add_amounts(
+            [instance.user_id], recipe_amounts(instance.recipe_id)
+        )
+
+
+@receiver(pre_delete, sender=Recipe)
+def remove_recipe_from_shopping_lists(sender, instance, **kwargs):
+    # Runs before the carts are deleted by the cascade.
+    remove_from_shopping_lists(
+        Cart.objects.filter(recipe=instance).values_list('user_id',
+                                                         'recipe_id')
+    )
+
+
+@receiver(post_delete, sender=Recipe)
+def delete_image_variants(sender, instance, **kwargs):
+    delete_variants(instance.image_variants)
+
+
+@receiver(post_save, sender=Recipe)
+@receiver(post_delete, sender=Recipe)
+def refresh_recipe_search(sender, instance, raw=False, **kwargs):
+    if not raw:
+        schedule_search_refresh([instance.pk])
+
+
+@receiver(post_save, sender=IngredientsOfRecipe)
+@receiver(post_delete, sender=IngredientsOfRecipe)
+def refresh_search_of_recipe(sender, instance, raw=False, **kwargs):
+    if not raw:
+        schedule_search_refresh([instance.recipe_id])
+
+
+@receiver(post_save, sender=Ingredient)
+def refresh_search_of_recipes_with_ingredient(sender, instance, created,
+                                              raw=False, **kwargs):
+    if not created and not raw:
+        schedule_search_refresh(Recipe.objects.filter(
+            ingredients=instance
+        ).values_list('id', flat=True))
+
+
+def touch_recipes(recipes):
+    """Move ``updated_at`` of recipes whose representation embeds a changed
+    row, so their ETags change with it."""
+    recipes.update(updated_at=timezone.now())
+    response_cache.invalidate()
+
+
+@receiver(post_save, sender=Tag)
+@receiver(pre_delete, sender=Tag)
+def touch_tagged_recipes(sender, instance, raw=False, **kwargs):
+    if not raw:
+        touch_recipes(Recipe.objects.filter(tags=instance))
+
+
+@receiver(post_save, sender=Ingredient)
+@receiver(pre_delete, sender=Ingredient)
+def touch_recipes_with_ingredient(sender, instance, raw=False, **kwargs):
+    if not raw:
+        touch_recipes(Recipe.objects.filter(ingredients=instance))
+
+
+@receiver(post_save, sender=User)
+def create_profile(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        Profile.objects.create(user=instance)
+
+
+@receiver(post_save, sender=User)
+def touch_authored_recipes(sender, instance, created, raw=False,
+                           update_fields=None, **kwargs):
+    if created or raw:
+        return
+    if update_fields and set(update_fields) <= {'last_login', 'password'}:
+        return
+    touch_recipes(Recipe.objects.filter(author=instance))
@@ -0,0 +1,106 @@
+from asgiref.sync import async_to_sync
+from django.contrib.auth import get_user_model
+from django.test import TransactionTestCase, override_settings
+from rest_framework.authtoken.models import Token
+
+from .. import response_cache
+from ..models import Ingredient, Recipe, Tag
+from ..reference import reference_registry
+
+User = get_user_model()
+
+
+class AsyncViewsTests(TransactionTestCase):
+    """The ``foodgram.asgi_urls`` endpoints answer like the DRF routes
+    they shadow. Transactional, since the async views query the database
+    from the thread pool."""
+
+    def setUp(self):
+        response_cache.bump_version()
+        reference_registry.invalidate()
+        self.user = User.objects.create_user(username='user',
+                                             email='user@example.com')
+        self.token = Token.objects.create(user=self.user).key
+        self.recipe = Recipe.objects.create(
+            author=self.user, name='Recipe', text='Text',
+            image='foodgram/recipe.png', cooking_time=5
+        )
+        self.tag = Tag.objects.create(name='Lunch', color='#00ff00',
+                                      slug='lunch')
+        self.ingredient = Ingredient.objects.create(name='salt',
+                                                    measurement_unit='g')
+
+    def wsgi(self, method, path, headers):
+        return self.client.generic(method, path, **{
+            f'HTTP_{name.upper().replace("-", "_")}': value
+            for name, value in headers.items()
+        })
+
+    def asgi(self, method, path, headers):
+        with override_settings(ROOT_URLCONF='foodgram.asgi_urls'):
+            return async_to_sync(self.async_client.generic)(
+                method, path, headers=[(b'host', b'testserver')] + [
+                    (name.lower().encode(), value.encode())
+                    for name, value in headers.items()
+                ]
+            )
+
+    def assertSameAnswers(self, requests):
+        """Run ``requests``, ``(method, path, headers, status)``, through
+        both stacks in turn; each sequence leaves the data as it found
+        it."""
+        answers = {}
+        for stack in (self.wsgi, self.asgi):
+            answers[stack] = []
+            for method, path, headers, status in requests:
+                response = stack(method, path, {
+                    'Authorization': f'Token {self.token}', **headers
+                } if headers is not None else {})
+                self.assertEqual(response.status_code, status,
+                                 (stack.__name__, method, path))
+                answers[stack].append((response.status_code,
+                                       response.content,
+                                       response.get('ETag')))
+        self.assertEqual(answers[self.wsgi], answers[self.asgi])
+
+    def test_toggles(self):
+        for name in ('favorite', 'shopping_cart'):
+            path = f'/api/recipes/{self.recipe.pk}/{name}/'
+            with self.subTest(name=name):
+                self.assertSameAnswers([
+                    ('GET', path, {}, 201),
+                    ('GET', path, {}, 400),
+                    ('DELETE', path, {}, 204),
+                    ('DELETE', path, {}, 400),
+                    ('GET', f'/api/recipes/{10 ** 6}/{name}/', {}, 404),
+                    ('POST', path, {}, 405),
+                    ('GET', path, None, 401),
+                    ('GET', path, {'Authorization': 'Token wrong'}, 401),
+                ])
+
+    def test_me(self):
+        etag = self.wsgi('GET', '/api/users/me/', {
+            'Authorization': f'Token {self.token}'
+        })['ETag']
+        self.assertSameAnswers([
+            ('GET', '/api/users/me/', {}, 200),
+            ('GET', '/api/users/me/', {'If-None-Match': etag}, 304),
+            ('GET', '/api/users/me/', None, 401),
+        ])
+
+    def test_reference_data(self):
+        paths = ('/api/tags/', f'/api/tags/{self.tag.pk}/',
+                 '/api/ingredients/?name=sa',
+                 f'/api/ingredients/{self.ingredient.pk}/')
+        for path in paths:
+            etag = self.wsgi('GET', path, {})['ETag']
+            with self.subTest(path=path):
+                self.assertSameAnswers([
+                    ('GET', path, None, 200),
+                    ('GET', path, {}, 200),
+                    ('GET', path, {'If-None-Match': etag}, 304),
+                ])
+        self.assertSameAnswers([
+            ('GET', f'/api/tags/{10 ** 6}/', None, 404),
+            ('GET', f'/api/ingredients/{10 ** 6}/', None, 404),
+        ])
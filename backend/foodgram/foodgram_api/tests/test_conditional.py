@@ -0,0 +1,84 @@
+from django.contrib.auth import get_user_model
+from django.urls import reverse
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient, APITransactionTestCase
+
+from users.models import Profile
+
+from .. import response_cache
+from ..models import Recipe
+
+User = get_user_model()
+
+
+class RecipeValidatorTests(APITransactionTestCase):
+    """Transactional, so the cache invalidations registered with
+    ``on_commit`` run."""
+
+    def setUp(self):
+        # Entries cached by earlier tests must not match these recipes.
+        response_cache.bump_version()
+        self.user, self.author, self.fan = (
+            User.objects.create_user(username=name,
+                                     email=f'{name}@example.com')
+            for name in ('user', 'author', 'fan')
+        )
+        self.recipe = Recipe.objects.create(
+            author=self.author, name='Recipe', text='Text',
+            image='foodgram/recipe.png', cooking_time=5
+        )
+        token = Token.objects.create(user=self.user)
+        self.authorized = APIClient()
+        self.authorized.credentials(HTTP_AUTHORIZATION=f'Token {token.key}')
+        self.urls = (
+            reverse('recipes-detail', kwargs={'pk': self.recipe.pk}),
+            reverse('recipes-list'),
+        )
+
+    def test_author_counters_change_the_etag(self):
+        for url in self.urls:
+            with self.subTest(url=url):
+                etag = self.authorized.get(url)['ETag']
+                response = self.authorized.get(url, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code, 304)
+                Profile.objects.count_follow(self.fan.id, self.author.id)
+                response = self.authorized.get(url, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code, 200)
+                self.assertNotEqual(response['ETag'], etag)
+
+    def test_cached_anonymous_responses_follow_the_counters(self):
+        detail_url = self.urls[0]
+        etags = {url: self.client.get(url)['ETag'] for url in self.urls}
+        self.assertEqual(self.client.get(detail_url)['X-Cache'], 'HIT')
+        response = self.authorized.get(
+            reverse('recipes-favorite', kwargs={'pk': self.recipe.pk})
+        )
+        self.assertEqual(response.status_code, 201)
+        response = self.client.get(detail_url)
+        self.assertEqual(response.json()['favorites_count'], 1)
+        response = self.authorized.get(
+            reverse('users-subscribe', kwargs={'pk': self.author.pk})
+        )
+        self.assertEqual(response.status_code, 201)
+        for url, etag in etags.items():
+            with self.subTest(url=url):
+                response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code, 200)
+                body = response.json()
+                recipe = body if url == detail_url else body['results'][0]
+                self.assertEqual(recipe['favorites_count'], 1)
+                self.assertEqual(recipe['author']['followers_count'], 1)
+
+    def test_recipes_have_no_last_modified(self):
+        # Counters change the body without moving updated_at.
+        response = self.client.get(self.urls[0])
+        self.assertNotIn('Last-Modified', response)
+        self.authorized.get(
+            reverse('recipes-favorite', kwargs={'pk': self.recipe.pk})
+        )
+        response = self.client.get(
+            self.urls[0],
+            HTTP_IF_MODIFIED_SINCE='Fri, 01 Jan 2100 00:00:00 GMT'
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['favorites_count'], 1)
@@ -0,0 +1,164 @@
+import sqlite3
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.db import OperationalError, connection
+from django.test import SimpleTestCase
+
+from ..db.pool import ConnectionPool, PoolTimeout, pools
+from ..db.sqlite3.base import DatabaseWrapper
+
+
+class StandIn:
+    """Opens SQLite connections to a scratch file and counts them."""
+
+    def __init__(self, path):
+        self.path = path
+        self.opened = 0
+
+    def __call__(self):
+        self.opened += 1
+        return sqlite3.connect(self.path, check_same_thread=False)
+
+
+class ConnectionPoolTests(SimpleTestCase):
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.connect = StandIn(f'{directory.name}/pool.sqlite3')
+
+    def make_pool(self, **options):
+        return ConnectionPool(**{'max_size': 2, 'timeout': 1,
+                                 'max_lifetime': 60, 'check_after': 0,
+                                 **options})
+
+    def test_reuses_idle_connections(self):
+        pool = self.make_pool()
+        for _ in range(5):
+            pool.checkin(*pool.checkout(self.connect))
+        self.assertEqual(self.connect.opened, 1)
+        self.assertEqual(pool.snapshot()['checkouts'], 5)
+
+    def test_never_opens_more_than_max_size(self):
+        pool = self.make_pool(max_size=3)
+        peak, lock = [0], threading.Lock()
+
+        def work(_):
+            connection, lease = pool.checkout(self.connect)
+            with lock:
+                peak[0] = max(peak[0], pool.snapshot()['open'])
+            connection.execute('SELECT 1')
+            time.sleep(0.01)
+            pool.checkin(connection, lease)
+
+        with ThreadPoolExecutor(12) as executor:
+            list(executor.map(work, range(60)))
+        stats = pool.snapshot()
+        self.assertLessEqual(peak[0], 3)
+        self.assertLessEqual(self.connect.opened, 3)
+        self.assertGreater(stats['waits'], 0)
+        self.assertEqual(stats['checkouts'], 60)
+        self.assertEqual(stats['timeouts'], 0)
+
+    def test_times_out_when_exhausted(self):
+        pool = self.make_pool(max_size=1, timeout=0.05)
+        connection, lease = pool.checkout(self.connect)
+        started = time.monotonic()
+        with self.assertRaises(PoolTimeout):
+            pool.checkout(self.connect)
+        self.assertGreaterEqual(time.monotonic() - started, 0.05)
+        self.assertEqual(pool.snapshot()['timeouts'], 1)
+        pool.checkin(connection, lease)
+        pool.checkin(*pool.checkout(self.connect))
+
+    def test_replaces_a_connection_failing_the_check(self):
+        pool = self.make_pool()
+        connection, lease = pool.checkout(self.connect)
+        pool.checkin(connection, lease)
+        connection.close()
+        replacement, _ = pool.checkout(self.connect)
+        self.assertIsNot(replacement, connection)
+        replacement.execute('SELECT 1')
+        self.assertEqual(pool.snapshot()['failed_checks'], 1)
+
+    def test_checks_only_after_check_after(self):
+        pool = self.make_pool(check_after=60)
+        connection, lease = pool.checkout(self.connect)
+        pool.checkin(connection, lease)
+        connection.close()
+        reused, _ = pool.checkout(self.connect)
+        self.assertIs(reused, connection)
+
+    def test_recycles_after_max_lifetime(self):
+        pool = self.make_pool(max_lifetime=0.02)
+        pool.checkin(*pool.checkout(self.connect))
+        time.sleep(0.03)
+        pool.checkin(*pool.checkout(self.connect))
+        self.assertEqual(self.connect.opened, 2)
+        self.assertGreaterEqual(pool.snapshot()['recycled'], 1)
+
+    def test_failed_connect_frees_its_place(self):
+        pool = self.make_pool(max_size=1)
+
+        def refuse():
+            raise sqlite3.OperationalError('refused')
+
+        with self.assertRaises(sqlite3.OperationalError):
+            pool.checkout(refuse)
+        self.assertEqual(pool.snapshot()['open'], 0)
+        pool.checkin(*pool.checkout(self.connect))
+
+    def test_drops_connections_inherited_by_fork(self):
+        pool = self.make_pool(max_size=1)
+        connection, lease = pool.checkout(self.connect)
+        pool.forget()
+        pool.checkin(connection, lease)
+        self.assertEqual(pool.snapshot()['idle'], 0)
+        pool.checkin(*pool.checkout(self.connect))
+
+
+class PooledDatabaseWrapperTests(SimpleTestCase):
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.settings_dict = {
+            **connection.settings_dict,
+            'NAME': f'{directory.name}/wrapper.sqlite3',
+            'POOL': {'MAX_SIZE': 1, 'TIMEOUT': 0.05},
+        }
+        self.alias = f'pool-test-{self.id()}'
+        self.addCleanup(lambda: pools.pop(self.alias).close_idle())
+
+    def wrapper(self):
+        wrapper = DatabaseWrapper(self.settings_dict, self.alias)
+        self.addCleanup(wrapper.close)
+        return wrapper
+
+    def test_close_returns_the_connection(self):
+        first, second = self.wrapper(), self.wrapper()
+        first.ensure_connection()
+        raw = first.connection
+        first.close()
+        second.ensure_connection()
+        self.assertIs(second.connection, raw)
+
+    def test_close_in_transaction_discards_the_connection(self):
+        first, second = self.wrapper(), self.wrapper()
+        first.ensure_connection()
+        raw = first.connection
+        first.set_autocommit(False)
+        first.close()
+        second.ensure_connection()
+        self.assertIsNot(second.connection, raw)
+        self.assertEqual(pools[self.alias].snapshot()['open'], 1)
+
+    def test_exhausted_pool_raises_operational_error(self):
+        first, second = self.wrapper(), self.wrapper()
+        first.ensure_connection()
+        with self.assertRaises(OperationalError):
+            second.ensure_connection()
+        self.assertEqual(pools[self.alias].snapshot()['timeouts'], 1)
@@ -0,0 +1,32 @@
+import os
+import runpy
+from types import SimpleNamespace
+
+from django.conf import settings
+from django.test import SimpleTestCase, override_settings
+
+CONFIG = runpy.run_path(os.path.join(settings.BASE_DIR, 'gunicorn.conf.py'))
+LOCMEM = {'default': {
+    'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'
+}}
+FILEBASED = {'default': {
+    'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+    'LOCATION': '/tmp/foodgram-cache',
+}}
+
+
+def server(workers):
+    return SimpleNamespace(cfg=SimpleNamespace(workers=workers))
+
+
+class SharedCacheCheckTests(SimpleTestCase):
+
+    @override_settings(CACHES=LOCMEM)
+    def test_workers_refuse_a_process_local_cache(self):
+        CONFIG['on_starting'](server(1))
+        with self.assertRaises(RuntimeError):
+            CONFIG['on_starting'](server(4))
+
+    @override_settings(CACHES=FILEBASED)
+    def test_workers_start_on_a_shared_cache(self):
+        CONFIG['on_starting'](server(4))
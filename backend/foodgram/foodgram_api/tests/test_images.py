@@ -0,0 +1,98 @@
+import base64
+import shutil
+import tempfile
+
+from django.contrib.auth import get_user_model
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.test import TransactionTestCase, override_settings
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from ..benchmarks import png_image
+from ..images import process_recipe_image
+from ..models import Ingredient, Recipe, Tag
+
+User = get_user_model()
+
+
+def variant_files(variants):
+    return [name for files in variants.values() for name in files.values()]
+
+
+@override_settings(IMAGE_PROCESSING_ENABLED=False)
+class ImageVariantsTests(TransactionTestCase):
+    """Transactional, since variant files are deleted once the
+    transaction that dropped them commits."""
+
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        settings = override_settings(MEDIA_ROOT=media_root)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.author = User.objects.create_user(username='author',
+                                               email='author@example.com')
+        self.recipe = Recipe.objects.create(
+            author=self.author, name='Recipe', text='Text',
+            image=self.image_file('recipe.png'), cooking_time=5
+        )
+
+    def image_file(self, name):
+        data = base64.b64decode(png_image().split(',', 1)[1])
+        return default_storage.save(f'foodgram/{name}', ContentFile(data))
+
+    def variants(self):
+        self.recipe.refresh_from_db()
+        return self.recipe.image_variants
+
+    def assertStored(self, names, stored=True):
+        for name in names:
+            self.assertEqual(default_storage.exists(name), stored, name)
+
+    def test_rendering_again_replaces_the_files(self):
+        process_recipe_image(self.recipe.pk, self.recipe.image.name)
+        first = variant_files(self.variants())
+        self.assertEqual(len(first), 4)
+        self.assertStored(first)
+        process_recipe_image(self.recipe.pk, self.recipe.image.name)
+        second = variant_files(self.variants())
+        self.assertStored(second)
+        self.assertStored(first, stored=False)
+
+    def test_files_of_a_replaced_image_are_dropped(self):
+        process_recipe_image(self.recipe.pk, self.recipe.image.name)
+        kept = variant_files(self.variants())
+        # A task for an image the recipe no longer has.
+        rendered = variant_files(
+            process_recipe_image(self.recipe.pk, self.image_file('old.png'))
+        )
+        self.assertEqual(len(rendered), 4)
+        self.assertEqual(variant_files(self.variants()), kept)
+        self.assertStored(kept)
+        self.assertStored(rendered, stored=False)
+
+    def test_recipe_update_with_a_new_image_drops_the_files(self):
+        process_recipe_image(self.recipe.pk, self.recipe.image.name)
+        files = variant_files(self.variants())
+        tag = Tag.objects.create(name='Lunch', color='#00ff00', slug='lunch')
+        ingredient = Ingredient.objects.create(name='salt',
+                                               measurement_unit='g')
+        client = APIClient()
+        client.force_authenticate(self.author)
+        response = client.put(
+            reverse('recipes-detail', kwargs={'pk': self.recipe.pk}),
+            {'name': 'Recipe', 'text': 'Text', 'cooking_time': 5,
+             'image': png_image(), 'tags': [tag.pk],
+             'ingredients': [{'id': ingredient.pk, 'amount': 1}]},
+            format='json'
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.variants(), {})
+        self.assertStored(files, stored=False)
+
+    def test_recipe_delete_drops_the_files(self):
+        process_recipe_image(self.recipe.pk, self.recipe.image.name)
+        files = variant_files(self.variants())
+        self.recipe.delete()
+        self.assertStored(files, stored=False)
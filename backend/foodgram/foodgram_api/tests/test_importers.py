@@ -0,0 +1,65 @@
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+from django.urls import reverse
+from rest_framework.test import APITestCase
+
+from ..benchmarks import png_image
+from ..importers import RecipeImporter
+from ..models import Ingredient, Tag
+from ..reference import reference_registry
+from ..views import IMPORT_BATCH_LIMIT
+
+User = get_user_model()
+
+
+class RecipeImporterTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username='author',
+                                              email='author@example.com')
+        cls.tag = Tag.objects.create(name='Lunch', color='#00ff00',
+                                     slug='lunch')
+        cls.ingredient = Ingredient.objects.create(name='salt',
+                                                   measurement_unit='g')
+
+    def setUp(self):
+        reference_registry.invalidate()
+        self.image = png_image()
+
+    def row(self, name, amounts, cooking_time=10):
+        return {'name': name, 'text': 'Text', 'cooking_time': cooking_time,
+                'image': self.image, 'tags': ['lunch'],
+                'ingredients': [{'id': self.ingredient.id, 'amount': amount}
+                                for amount in amounts]}
+
+    def test_amounts_must_fit_the_columns(self):
+        valid, errors = RecipeImporter(self.author).validate_chunk(
+            enumerate([
+                self.row('Fits', [20000, 12767], cooking_time=32767),
+                self.row('Large amount', [32768]),
+                self.row('Large total', [20000, 12768]),
+                self.row('Long cooking', [1], cooking_time=32768),
+            ]),
+            set()
+        )
+        self.assertEqual([index for index, _ in valid], [0])
+        self.assertEqual(valid[0][1]['ingredients'],
+                         [(self.ingredient, 32767)])
+        self.assertEqual(
+            {error['row']: sorted(error['errors']) for error in errors},
+            {1: ['ingredients'], 2: ['ingredients'], 3: ['cooking_time']}
+        )
+
+
+class ImportEndpointTests(APITestCase):
+
+    def test_batches_are_limited(self):
+        author = User.objects.create_user(username='author',
+                                          email='author@example.com')
+        self.client.force_authenticate(author)
+        response = self.client.post(reverse('recipes-import-recipes'),
+                                    [{}] * (IMPORT_BATCH_LIMIT + 1),
+                                    format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn(str(IMPORT_BATCH_LIMIT), response.data['errors'])
@@ -0,0 +1,30 @@
+from django.test import SimpleTestCase, override_settings
+from django.urls import reverse
+
+
+class MetricsAccessTests(SimpleTestCase):
+
+    def get(self, **headers):
+        return self.client.get(reverse('metrics'), **headers)
+
+    @override_settings(METRICS_TOKEN='', METRICS_PUBLIC=False)
+    def test_closed_without_a_token(self):
+        self.assertEqual(self.get().status_code, 403)
+
+    @override_settings(METRICS_TOKEN='', METRICS_PUBLIC=True)
+    def test_public_when_opened(self):
+        self.assertEqual(self.get().status_code, 200)
+
+    @override_settings(METRICS_TOKEN='secret', METRICS_PUBLIC=True)
+    def test_token_is_required_once_set(self):
+        self.assertEqual(self.get().status_code, 401)
+        self.assertEqual(
+            self.get(HTTP_AUTHORIZATION='Bearer wrong').status_code, 401
+        )
+        self.assertEqual(
+            self.get(HTTP_AUTHORIZATION='Bearer secret').status_code, 200
+        )
+
+    @override_settings(METRICS_ENABLED=False, METRICS_PUBLIC=True)
+    def test_disabled(self):
+        self.assertEqual(self.get().status_code, 404)
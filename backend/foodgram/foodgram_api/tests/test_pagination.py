@@ -0,0 +1,68 @@
+import base64
+import json
+
+from django.contrib.auth import get_user_model
+from django.urls import reverse
+from rest_framework.test import APITestCase
+
+from users.models import Follow
+
+from ..models import Recipe
+
+User = get_user_model()
+
+
+def cursor(values, reverse=False):
+    payload = json.dumps({'v': values, 'r': reverse}).encode()
+    return base64.urlsafe_b64encode(payload).decode()
+
+
+class KeysetPaginationTests(APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='user',
+                                            email='user@example.com')
+        for i in range(3):
+            author = User.objects.create_user(username=f'author{i}',
+                                              email=f'author{i}@example.com')
+            Follow.objects.create(user=cls.user, author=author)
+            Recipe.objects.create(
+                author=author, name=f'Recipe {i}', text='Text',
+                image='foodgram/recipe.png', cooking_time=5
+            )
+
+    def get(self, route, **params):
+        return self.client.get(reverse(route), params)
+
+    def test_cursor_pages_through_recipes(self):
+        response = self.get('recipes-list', cursor='', limit=2)
+        self.assertEqual(len(response.data['results']), 2)
+        response = self.client.get(response.data['next'])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([recipe['name'] for recipe in
+                          response.data['results']], ['Recipe 0'])
+
+    def test_tampered_cursors_are_not_found(self):
+        tampered = (
+            ['not a date', 1],
+            [None, 1],
+            ['2020-01-01T00:00:00', None],
+            [[1], 1],
+            [{'a': 1}, 1],
+            ['2020-01-01T00:00:00', 'one'],
+            ['2020-01-01T00:00:00', 10 ** 30],
+        )
+        for values in tampered:
+            with self.subTest(values=values):
+                response = self.get('recipes-list', cursor=cursor(values))
+                self.assertEqual(response.status_code, 404)
+        response = self.get('recipes-list', ordering='-favorites_count',
+                            cursor=cursor(['many', 1]))
+        self.assertEqual(response.status_code, 404)
+        self.client.force_authenticate(self.user)
+        for values in (['first'], [None], [[]], [-10 ** 30]):
+            with self.subTest(values=values):
+                response = self.get('users-subscriptions',
+                                    cursor=cursor(values))
+                self.assertEqual(response.status_code, 404)
@@ -0,0 +1,48 @@
+import logging
+import tempfile
+
+from django.test import TransactionTestCase, override_settings
+
+from ..benchmarks import (BENCHMARK_SETTINGS, PAGE_SIZES, QUERY_BUDGETS,
+                          ApiBenchmark)
+from ..urls import router_api
+
+
+@override_settings(**BENCHMARK_SETTINGS)
+class QueryBudgetTests(TransactionTestCase):
+    """Every ``benchmark_api`` scenario answers with its status within its
+    query budget, the same at both page sizes. Runs outside a wrapping
+    transaction so savepoints are counted as in production."""
+
+    def setUp(self):
+        media_root = tempfile.TemporaryDirectory()
+        self.addCleanup(media_root.cleanup)
+        media_settings = override_settings(MEDIA_ROOT=media_root.name)
+        media_settings.enable()
+        self.addCleanup(media_settings.disable)
+        request_logger = logging.getLogger('django.request')
+        self.addCleanup(request_logger.setLevel, request_logger.level)
+        request_logger.setLevel(logging.CRITICAL)
+        self.benchmark = ApiBenchmark()
+        self.benchmark.seed({'users': 80, 'recipes': 300, 'seed': 42,
+                             'prolific_recipes': 50,
+                             'page_sizes': PAGE_SIZES})
+
+    def test_endpoints_within_query_budgets(self):
+        scenarios = self.benchmark.scenarios()
+        registered = {url.name for url in router_api.urls
+                      if url.name and url.name != 'api-root'}
+        self.assertEqual(
+            registered - {scenario.route for scenario in scenarios}, set()
+        )
+        for scenario in scenarios:
+            with self.subTest(scenario.label):
+                queries, statuses, response = self.benchmark.count_queries(
+                    self.benchmark.client(scenario), scenario
+                )
+                if not self.benchmark.within_budget(scenario, queries,
+                                                    statuses):
+                    self.fail(f'queries {queries}, budget '
+                              f'{QUERY_BUDGETS[scenario.label]}, statuses '
+                              f'{sorted(statuses)}: '
+                              f'{response.content[:300]!r}')
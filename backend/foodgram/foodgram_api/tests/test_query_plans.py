@@ -0,0 +1,32 @@
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+
+from ..models import Tag
+from ..query_plans import (explain, recipe_filter_combinations,
+                           recipe_list_queryset, sequential_scans)
+
+User = get_user_model()
+
+
+class RecipeFilterPlanTests(TestCase):
+    """The recipe list reads no large table in full for any of the main
+    filter combinations."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='planner',
+                                            email='planner@example.com')
+        Tag.objects.bulk_create(
+            Tag(name=f'Tag {i}', color=f'#00000{i}', slug=f'tag-{i}')
+            for i in range(2)
+        )
+
+    def test_filters_use_indexes(self):
+        combinations = recipe_filter_combinations(['tag-0', 'tag-1'])
+        for label, params in combinations.items():
+            with self.subTest(label):
+                queryset = recipe_list_queryset(self.user, params)
+                plan = explain(queryset)
+                self.assertEqual(
+                    sequential_scans(queryset, plan), set(), plan
+                )
@@ -0,0 +1,91 @@
+from django.contrib import admin
+from django.contrib.auth import get_user_model
+from django.urls import reverse
+from rest_framework.test import APITransactionTestCase
+
+from .. import response_cache
+from ..models import Ingredient, IngredientsOfRecipe, Recipe
+
+User = get_user_model()
+
+
+class RecipeSearchTests(APITransactionTestCase):
+    """Runs on the SQLite FTS5 index. Transactional, since documents are
+    refreshed when a transaction commits."""
+
+    def setUp(self):
+        response_cache.bump_version()
+        self.author = User.objects.create_user(username='author',
+                                               email='author@example.com')
+        self.basil = Ingredient.objects.create(name='basil',
+                                               measurement_unit='g')
+        self.soup = self.recipe('Tomato soup', 'Simmer slowly.')
+        self.pesto = self.recipe('Basil pesto', 'Blend everything.')
+        self.salad = self.recipe('Green salad', 'Toss with oil.',
+                                 ingredients=[self.basil])
+
+    def recipe(self, name, text, ingredients=()):
+        recipe = Recipe.objects.create(
+            author=self.author, name=name, text=text,
+            image='foodgram/recipe.png', cooking_time=5
+        )
+        for ingredient in ingredients:
+            IngredientsOfRecipe.objects.create(
+                recipe=recipe, ingredient=ingredient, amount=10
+            )
+        return recipe
+
+    def search(self, text, **params):
+        response = self.client.get(reverse('recipes-list'),
+                                   {'search': text, **params})
+        self.assertEqual(response.status_code, 200)
+        return [recipe['name'] for recipe in response.data['results']]
+
+    def test_prefixes_of_name_text_and_ingredients_match(self):
+        self.assertEqual(self.search('tom'), ['Tomato soup'])
+        self.assertEqual(self.search('simm'), ['Tomato soup'])
+        self.assertEqual(self.search('TOMATO slow'), ['Tomato soup'])
+        self.assertEqual(self.search('tomato blend'), [])
+        self.assertEqual(self.search('gree'), ['Green salad'])
+
+    def test_name_matches_rank_above_ingredient_matches(self):
+        self.assertEqual(self.search('basil'),
+                         ['Basil pesto', 'Green salad'])
+
+    def test_documents_follow_committed_edits(self):
+        self.basil.name = 'thyme'
+        self.basil.save()
+        self.assertEqual(self.search('thym'), ['Green salad'])
+        self.soup.text = 'Roast the peppers.'
+        self.soup.save()
+        self.assertEqual(self.search('pepper'), ['Tomato soup'])
+        self.assertEqual(self.search('simmer'), [])
+        IngredientsOfRecipe.objects.create(recipe=self.pesto,
+                                           ingredient=self.basil, amount=5)
+        self.assertCountEqual(self.search('thyme'),
+                              ['Green salad', 'Basil pesto'])
+        self.salad.delete()
+        self.assertEqual(self.search('thyme'), ['Basil pesto'])
+
+    def test_search_pages_with_a_cursor(self):
+        for i in range(3):
+            self.recipe(f'Basil bread {i}', 'Bake.')
+        response = self.client.get(reverse('recipes-list'), {
+            'search': 'basil', 'cursor': '', 'limit': 3
+        })
+        names = [recipe['name'] for recipe in response.data['results']]
+        response = self.client.get(response.data['next'])
+        self.assertEqual(response.status_code, 200)
+        names += [recipe['name'] for recipe in response.data['results']]
+        self.assertIsNone(response.data['next'])
+        self.assertEqual(names, self.search('basil', limit=10))
+        self.assertEqual(len(names), 5)
+        self.assertEqual(names[-1], 'Green salad')
+
+    def test_admin_searches_the_index(self):
+        model_admin = admin.site._registry[Recipe]
+        queryset, may_have_duplicates = model_admin.get_search_results(
+            None, Recipe.objects.all(), 'basil'
+        )
+        self.assertFalse(may_have_duplicates)
+        self.assertEqual(set(queryset), {self.pesto, self.salad})
@@ -0,0 +1,81 @@
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+
+from ..models import (Cart, Ingredient, IngredientsOfRecipe, Recipe,
+                      ShoppingListItem)
+
+User = get_user_model()
+
+
+class ShoppingListTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username='author',
+                                              email='author@example.com')
+        cls.users = [
+            User.objects.create_user(username=f'user{i}',
+                                     email=f'user{i}@example.com')
+            for i in range(6)
+        ]
+        cls.ingredients = [
+            Ingredient.objects.create(name=f'ingredient {i}',
+                                      measurement_unit='g')
+            for i in range(3)
+        ]
+
+    def recipe(self, carted_by, author=None):
+        recipe = Recipe.objects.create(
+            author=author or self.author, name='Recipe', text='Text',
+            image='foodgram/recipe.png', cooking_time=5
+        )
+        IngredientsOfRecipe.objects.bulk_create(
+            IngredientsOfRecipe(recipe=recipe, ingredient=ingredient,
+                                amount=10 * (i + 1))
+            for i, ingredient in enumerate(self.ingredients)
+        )
+        for user in carted_by:
+            Cart.objects.create(user=user, recipe=recipe)
+        return recipe
+
+    def shopping_list(self, user):
+        return dict(ShoppingListItem.objects.filter(user=user).values_list(
+            'ingredient__name', 'amount'
+        ))
+
+    def test_recipe_delete_updates_every_list_in_constant_queries(self):
+        kept = self.recipe(self.users[:1])
+        counts = []
+        for carted_by in (self.users[:2], self.users):
+            recipe = self.recipe(carted_by)
+            with CaptureQueriesContext(connection) as queries:
+                recipe.delete()
+            counts.append(len(queries))
+        self.assertEqual(counts[0], counts[1])
+        self.assertEqual(self.shopping_list(self.users[0]), {
+            'ingredient 0': 10, 'ingredient 1': 20, 'ingredient 2': 30
+        })
+        for user in self.users[1:]:
+            self.assertEqual(self.shopping_list(user), {})
+        kept.delete()
+        self.assertFalse(ShoppingListItem.objects.exists())
+
+    def test_cart_deletes_update_the_list(self):
+        first, second = self.recipe(self.users[:2]), self.recipe(
+            self.users[:1]
+        )
+        Cart.objects.get(user=self.users[0], recipe=first).delete()
+        self.assertEqual(self.shopping_list(self.users[0]), {
+            'ingredient 0': 10, 'ingredient 1': 20, 'ingredient 2': 30
+        })
+        Cart.objects.filter(recipe__in=[first, second]).delete()
+        self.assertFalse(ShoppingListItem.objects.exists())
+
+    def test_user_delete_updates_lists_of_their_recipes(self):
+        author = self.users[5]
+        self.recipe(self.users[:2], author=author)
+        self.recipe([author])
+        author.delete()
+        self.assertFalse(ShoppingListItem.objects.exists())
@@ -0,0 +1,74 @@
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APITestCase
+
+from users.models import Follow, Profile
+
+from ..models import Recipe
+
+User = get_user_model()
+
+
+class SubscriptionTests(APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user, cls.author, cls.other = (
+            User.objects.create_user(username=name,
+                                     email=f'{name}@example.com')
+            for name in ('user', 'author', 'other')
+        )
+        now = timezone.now()
+        for author, count in ((cls.author, 5), (cls.other, 2)):
+            for i in range(count):
+                recipe = Recipe.objects.create(
+                    author=author, name=f'{author.username} {i}',
+                    text='Text', image='foodgram/recipe.png', cooking_time=5
+                )
+                Recipe.objects.filter(pk=recipe.pk).update(
+                    pub_date=now - timedelta(days=count - i)
+                )
+
+    def setUp(self):
+        self.client.force_authenticate(self.user)
+
+    def subscribe(self, author, **params):
+        return self.client.get(
+            reverse('users-subscribe', kwargs={'pk': author.pk}), params
+        )
+
+    def test_repeated_subscribe_is_rejected(self):
+        self.assertEqual(self.subscribe(self.author).status_code, 201)
+        response = self.subscribe(self.author)
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(Follow.objects.filter(user=self.user).count(), 1)
+        self.assertEqual(
+            Profile.objects.get(user=self.author).followers_count, 1
+        )
+        self.assertEqual(
+            Profile.objects.get(user=self.user).following_count, 1
+        )
+
+    def test_subscribe_to_self_is_rejected(self):
+        self.assertEqual(self.subscribe(self.user).status_code, 400)
+        self.assertFalse(Follow.objects.exists())
+
+    def test_recipes_limit_keeps_newest_recipes_of_each_author(self):
+        response = self.subscribe(self.author, recipes_limit=2)
+        self.assertEqual(
+            [recipe['name'] for recipe in response.data['recipes']],
+            ['author 4', 'author 3']
+        )
+        self.subscribe(self.other)
+        response = self.client.get(reverse('users-subscriptions'),
+                                   {'recipes_limit': 3})
+        self.assertEqual(
+            {author['username']: [recipe['name']
+                                  for recipe in author['recipes']]
+             for author in response.data['results']},
+            {'author': ['author 4', 'author 3', 'author 2'],
+             'other': ['other 1', 'other 0']}
+        )
@@ -0,0 +1,64 @@
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+
+from ..models import (Cart, Ingredient, IngredientsOfRecipe, Recipe,
+                      ShoppingListItem)
+from ..toggles import toggle_recipes
+
+User = get_user_model()
+
+
+class BatchToggleTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='user',
+                                            email='user@example.com')
+        cls.ingredient = Ingredient.objects.create(name='salt',
+                                                   measurement_unit='g')
+        cls.recipes = [
+            Recipe.objects.create(
+                author=cls.user, name=f'Recipe {i}', text='Text',
+                image='foodgram/recipe.png', cooking_time=5
+            )
+            for i in range(4)
+        ]
+        IngredientsOfRecipe.objects.bulk_create(
+            IngredientsOfRecipe(recipe=recipe, ingredient=cls.ingredient,
+                                amount=10)
+            for recipe in cls.recipes
+        )
+
+    def carts_counts(self):
+        return [Recipe.objects.get(pk=recipe.pk).carts_count
+                for recipe in self.recipes]
+
+    def salt(self):
+        return ShoppingListItem.objects.filter(
+            user=self.user
+        ).values_list('amount', flat=True).first()
+
+    def test_only_changed_rows_are_counted(self):
+        first, second, third, fourth = (recipe.pk for recipe in self.recipes)
+        toggle_recipes(self.user, {'shopping_cart': {
+            'add': [first, third], 'remove': []
+        }})
+        self.assertEqual(self.carts_counts(), [1, 0, 1, 0])
+        self.assertEqual(self.salt(), 20)
+        # first is already carted and fourth is not: a repeated request.
+        result = toggle_recipes(self.user, {'shopping_cart': {
+            'add': [first, second, 10 ** 6], 'remove': [third, fourth]
+        }})
+        self.assertEqual(result['shopping_cart'], {
+            'add': [{'id': first, 'status': 'unchanged'},
+                    {'id': second, 'status': 'added'},
+                    {'id': 10 ** 6, 'status': 'not_found'}],
+            'remove': [{'id': third, 'status': 'removed'},
+                       {'id': fourth, 'status': 'unchanged'}],
+        })
+        self.assertEqual(self.carts_counts(), [1, 1, 0, 0])
+        self.assertEqual(self.salt(), 20)
+        self.assertEqual(
+            set(Cart.objects.values_list('recipe_id', flat=True)),
+            {first, second}
+        )
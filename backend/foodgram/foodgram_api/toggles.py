@@ -0,0 +1,234 @@
+from django.db import IntegrityError, connection, transaction
+from django.db.models import Case, Value, When
+from rest_framework import status
+from rest_framework.validators import UniqueTogetherValidator
+
+from . import response_cache
+from .models import (Cart, Favorite, Recipe, ShoppingListItem,
+                     net_recipe_amounts)
+from .serializers import (CartSerializer, FavoriteSerializer,
+                          MarkedPreviewRepresentationSerializer)
+
+NOT_FOUND = {'detail': 'Not found.'}
+# The body UniqueTogetherValidator gave before the constraint took over.
+ALREADY_ADDED = {'non_field_errors': [
+    UniqueTogetherValidator.message.format(field_names='recipe, user')
+]}
+PREVIEW_FIELDS = MarkedPreviewRepresentationSerializer.Meta.fields
+
+# name: (model, serializer, Recipe counter, error when removing a recipe
+# that is absent)
+TOGGLES = {
+    'favorite': (Favorite, FavoriteSerializer, 'favorites_count',
+                 'This recipe is not in your favorites.'),
+    'shopping_cart': (Cart, CartSerializer, 'carts_count',
+                      'This recipe is not in your shopping cart.'),
+}
+
+
+def supports_upsert():
+    """``INSERT ... ON CONFLICT DO NOTHING`` and ``UPDATE ... RETURNING``
+    are available on PostgreSQL and on SQLite 3.35+."""
+    if connection.vendor == 'postgresql':
+        return True
+    return (connection.vendor == 'sqlite'
+            and connection.Database.sqlite_version_info >= (3, 35))
+
+
+def insert_recipe(model, counter, user_id, recipe_id):
+    """Insert the row if the recipe exists and the row does not, relying on
+    the unique constraint instead of a SELECT beforehand, then bump the
+    counter returning the preview columns. Returns the recipe, or None
+    when nothing was inserted."""
+    quote = connection.ops.quote_name
+    recipe_table = quote(Recipe._meta.db_table)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'INSERT INTO {quote(model._meta.db_table)} '
+            f'({quote("user_id")}, {quote("recipe_id")}) '
+            f'SELECT %s, {quote("id")} FROM {recipe_table} '
+            f'WHERE {quote("id")} = %s '
+            f'ON CONFLICT ({quote("user_id")}, {quote("recipe_id")}) '
+            f'DO NOTHING',
+            [user_id, recipe_id]
+        )
+        if not cursor.rowcount:
+            return None
+    response_cache.invalidate()
+    columns = ', '.join(quote(Recipe._meta.get_field(field).column)
+                        for field in PREVIEW_FIELDS)
+    return list(Recipe.objects.raw(
+        f'UPDATE {recipe_table} SET {quote(counter)} = {quote(counter)} + 1 '
+        f'WHERE {quote("id")} = %s RETURNING {columns}',
+        [recipe_id]
+    ))[0]
+
+
+def insert_recipes(model, user_id, recipe_ids):
+    """Insert the user's rows for those of ``recipe_ids`` that exist and
+    are not there yet. Returns the ids of the recipes actually inserted,
+    which concurrent requests cannot make wrong."""
+    if not recipe_ids:
+        return []
+    quote = connection.ops.quote_name
+    placeholders = ', '.join(['%s'] * len(recipe_ids))
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'INSERT INTO {quote(model._meta.db_table)} '
+            f'({quote("user_id")}, {quote("recipe_id")}) '
+            f'SELECT %s, {quote("id")} FROM {quote(Recipe._meta.db_table)} '
+            f'WHERE {quote("id")} IN ({placeholders}) '
+            f'ON CONFLICT ({quote("user_id")}, {quote("recipe_id")}) '
+            f'DO NOTHING RETURNING {quote("recipe_id")}',
+            [user_id, *recipe_ids]
+        )
+        return [row[0] for row in cursor.fetchall()]
+
+
+def delete_recipes(model, user_id, recipe_ids):
+    """Delete the user's rows of ``recipe_ids`` in one statement,
+    bypassing CartQuerySet.delete. Returns the ids of the recipes actually
+    deleted."""
+    if not recipe_ids:
+        return []
+    quote = connection.ops.quote_name
+    placeholders = ', '.join(['%s'] * len(recipe_ids))
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'DELETE FROM {quote(model._meta.db_table)} '
+            f'WHERE {quote("user_id")} = %s AND {quote("recipe_id")} '
+            f'IN ({placeholders}) '
+            f'RETURNING {quote("recipe_id")}',
+            [user_id, *recipe_ids]
+        )
+        return [row[0] for row in cursor.fetchall()]
+
+
+def update_shopping_list(user, added, removed):
+    ShoppingListItem.objects.add_amounts(
+        [user.id], net_recipe_amounts(added, removed)
+    )
+
+
+def add_with_serializer(name, user, recipe_id, context):
+    model, serializer_class, counter, _ = TOGGLES[name]
+    recipes = Recipe.objects.filter(id=recipe_id)
+    if not recipes.exists():
+        return NOT_FOUND, status.HTTP_404_NOT_FOUND
+    serializer = serializer_class(
+        data={'user': user.id, 'recipe': recipe_id}, context=context or {}
+    )
+    if not serializer.is_valid():
+        return serializer.errors, status.HTTP_400_BAD_REQUEST
+    try:
+        with transaction.atomic():
+            serializer.save()
+            recipes.adjust_counters(**{counter: 1})
+    except IntegrityError:
+        return ALREADY_ADDED, status.HTTP_400_BAD_REQUEST
+    return serializer.data, status.HTTP_201_CREATED
+
+
+def toggle_recipe(name, method, user, recipe_id, context=None):
+    """Add the recipe to the user's favorites or shopping cart on GET and
+    remove it on DELETE. Returns ``(data, status)`` so the DRF and the
+    async views answer with the same bodies.
+
+    The row is written first and the recipe is only looked up when nothing
+    changed, to tell a missing recipe from a repeated request; the unique
+    constraint keeps concurrent double taps apart."""
+    model, _, counter, absent = TOGGLES[name]
+    try:
+        recipe_id = int(recipe_id)
+    except (TypeError, ValueError):
+        return NOT_FOUND, status.HTTP_404_NOT_FOUND
+    if method == 'GET':
+        if not supports_upsert():
+            return add_with_serializer(name, user, recipe_id, context)
+        with transaction.atomic():
+            recipe = insert_recipe(model, counter, user.id, recipe_id)
+            if recipe is not None and model is Cart:
+                update_shopping_list(user, [recipe_id], [])
+        if recipe is not None:
+            return (MarkedPreviewRepresentationSerializer(recipe).data,
+                    status.HTTP_201_CREATED)
+        if not Recipe.objects.filter(id=recipe_id).exists():
+            return NOT_FOUND, status.HTTP_404_NOT_FOUND
+        return ALREADY_ADDED, status.HTTP_400_BAD_REQUEST
+    with transaction.atomic():
+        rows = model.objects.filter(user=user.id, recipe=recipe_id)
+        # A single DELETE, bypassing CartQuerySet.delete; the shopping
+        # list is updated below.
+        removed = rows._raw_delete(rows.db)
+        if removed:
+            Recipe.objects.filter(id=recipe_id).adjust_counters(
+                **{counter: -1}
+            )
+            if model is Cart:
+                update_shopping_list(user, [], [recipe_id])
+    if removed:
+        return None, status.HTTP_204_NO_CONTENT
+    if not Recipe.objects.filter(id=recipe_id).exists():
+        return NOT_FOUND, status.HTTP_404_NOT_FOUND
+    return {'errors': absent}, status.HTTP_400_BAD_REQUEST
+
+
+def apply_batch(name, user, add, remove, found):
+    """Add and remove many recipes at once: one INSERT, one DELETE and one
+    counter UPDATE. Counters, the shopping list and the statuses follow
+    the rows the INSERT and DELETE report as changed, so a concurrent
+    request for the same recipes is not counted twice. Bulk writes bypass
+    the Cart bookkeeping, so the shopping list is adjusted here. Returns
+    the status of every requested id."""
+    model, _, counter, _ = TOGGLES[name]
+    if supports_upsert():
+        added = insert_recipes(model, user.id,
+                               [pk for pk in add if pk in found])
+        removed = delete_recipes(model, user.id, remove)
+    else:
+        present = set(model.objects.filter(
+            user=user, recipe_id__in=[*add, *remove]
+        ).values_list('recipe_id', flat=True))
+        added = [pk for pk in add if pk in found and pk not in present]
+        removed = [pk for pk in remove if pk in present]
+        model.objects.bulk_create(
+            [model(user=user, recipe_id=pk) for pk in added],
+            ignore_conflicts=True
+        )
+        if removed:
+            rows = model.objects.filter(user=user, recipe_id__in=removed)
+            rows._raw_delete(rows.db)
+    if added or removed:
+        Recipe.objects.filter(id__in=[*added, *removed]).adjust_counters(**{
+            counter: Case(When(id__in=added, then=Value(1)),
+                          default=Value(-1))
+        })
+    if model is Cart:
+        update_shopping_list(user, added, removed)
+    changed = {**dict.fromkeys(added, 'added'),
+               **dict.fromkeys(removed, 'removed')}
+    return {
+        action: [
+            {'id': pk,
+             'status': ('not_found' if pk not in found
+                        else changed.get(pk, 'unchanged'))}
+            for pk in ids
+        ]
+        for action, ids in (('add', add), ('remove', remove))
+    }
+
+
+@transaction.atomic
+def toggle_recipes(user, changes):
+    """Apply ``{name: {'add': [...], 'remove': [...]}}`` for the
+    favorite and shopping_cart toggles in one transaction."""
+    ids = {pk for lists in changes.values()
+           for action in ('add', 'remove') for pk in lists[action]}
+    found = set(Recipe.objects.filter(
+        id__in=ids
+    ).values_list('id', flat=True)) if ids else set()
+    return {
+        name: apply_batch(name, user, list(dict.fromkeys(lists['add'])),
+                          list(dict.fromkeys(lists['remove'])), found)
+        for name, lists in changes.items()
+    }
@@ -1,6 +1,7 @@
 from django.urls import include, path
 from rest_framework import routers
 
+from .metrics import metrics_view
 from .views import IngredientViewSet, RecipeViewSet, TagViewSet, UserViewSet
 
 router_api = routers.DefaultRouter()
@@ -25,5 +26,6 @@ router_api.register(
     basename='users'
 )
 urlpatterns = [
+    path('_metrics', metrics_view, name='metrics'),
     path('', include(router_api.urls))
 ]
@@ -1,50 +1,97 @@
 from django.contrib.auth import get_user_model
 from django.core.exceptions import ObjectDoesNotExist
-from django.db.models import Sum
-from django.http import HttpResponse
+from django.db import IntegrityError, transaction
+from django.db.models import (BooleanField, Exists, F, OuterRef, Prefetch, Sum,
+                              Value, prefetch_related_objects)
+from django.http import StreamingHttpResponse
 from django.shortcuts import get_object_or_404
 from django_filters.rest_framework import DjangoFilterBackend
-from rest_framework import filters, mixins, permissions, status, viewsets
+from rest_framework import mixins, permissions, status, viewsets
 from rest_framework.decorators import action
 from rest_framework.response import Response
 
-from users.models import Follow
+from users.models import Follow, Profile
 from users.serializers import (RegistrySerializer, SubscriptionListSerializer,
-                               SubscriptionSerializer, UserSerializer)
+                               UserSerializer)
 
 from . import serializers
-from .filters import RecipeFilter
-from .models import (Cart, Favorite, Ingredient, IngredientsOfRecipe, Recipe,
-                     Tag)
+from .conditional import ConditionalGetMixin
+from .filters import RecipeFilter, StableOrderingFilter
+from .fulltext import search_terms
+from .importers import RecipeImporter
+from .metrics import InstrumentedViewMixin
+from .models import Ingredient, Recipe, ShoppingListItem, Tag
 from .pagination import LimitPagination
 from .permissions import RecipePermissions
-from .serializers import CartSerializer, FavoriteSerializer
+from .renderers import SHOPPING_CART_RENDERERS, ShoppingCartNegotiation
+from .response_cache import AnonymousCacheMixin
+from .search import ingredient_index
+from .toggles import toggle_recipe, toggle_recipes
 
 User = get_user_model()
 
+# With base64 images about 100 recipes fit in DATA_UPLOAD_MAX_MEMORY_SIZE;
+# larger imports go through the import_recipes command.
+IMPORT_BATCH_LIMIT = 100
+SUBSCRIBE_TO_SELF = "You can't subscribe to yourself!"
+ALREADY_SUBSCRIBED = 'You are already subscribed to this author.'
 
-class ListRetrieveViewSet(mixins.ListModelMixin, mixins.RetrieveModelMixin,
+
+class ListRetrieveViewSet(InstrumentedViewMixin, AnonymousCacheMixin,
+                          ConditionalGetMixin, mixins.ListModelMixin,
+                          mixins.RetrieveModelMixin,
                           viewsets.GenericViewSet):
     pass
 
 
-class UserViewSet(viewsets.ModelViewSet):
+class UserViewSet(InstrumentedViewMixin, ConditionalGetMixin,
+                  viewsets.ModelViewSet):
     serializer_class = UserSerializer
     queryset = User.objects.all()
     permission_classes = [permissions.AllowAny]
     pagination_class = LimitPagination
+    filter_backends = (StableOrderingFilter,)
+    ordering_fields = ('id', 'recipes_count', 'followers_count',
+                       'following_count')
+    ordering_lookups = {field: f'profile__{field}'
+                        for field in ordering_fields[1:]}
+    ordering = ('id',)
+    conditional_actions = ('me',)
+
+    def get_queryset(self):
+        user = self.request.user
+        if self.action not in ('list', 'retrieve'):
+            return User.objects.all()
+        users = User.objects.select_related('profile')
+        if user.is_anonymous:
+            return users
+        return users.annotate(is_subscribed=Exists(
+            Follow.objects.filter(user=user, author=OuterRef('pk'))
+        ))
 
     def get_serializer_class(self):
-        if self.action in ('list', 'retrieve'):
+        if self.action in ('list', 'retrieve', 'me'):
             return UserSerializer
         return RegistrySerializer
 
+    def get_validator_objects(self):
+        return [self.request.user]
+
+    def object_version(self, user):
+        profile = UserSerializer().get_profile(user)
+        return (user.id, user.email, user.username, user.first_name,
+                user.last_name, profile.recipes_count,
+                profile.followers_count, profile.following_count)
+
     @action(detail=False,
             methods=['GET'],
             url_path='me',
             permission_classes=(permissions.IsAuthenticated,))
     def me(self, request):
-        serializer = UserSerializer(request.user, context={'request': request})
+        return self.conditional(self.retrieve_me, request)
+
+    def retrieve_me(self, request):
+        serializer = self.get_serializer(request.user)
         return Response(serializer.data, status=status.HTTP_200_OK)
 
     @action(detail=False,
@@ -62,29 +109,50 @@ class UserViewSet(viewsets.ModelViewSet):
         return Response({'password': 'Password successfully updated'},
                         status=status.HTTP_204_NO_CONTENT)
 
+    def get_subscriptions_queryset(self):
+        return User.objects.filter(
+            following__user=self.request.user
+        ).select_related('profile').annotate(
+            is_subscribed=Value(True, output_field=BooleanField()),
+            follow_id=F('following__id')
+        ).order_by('follow_id')
+
+    def with_latest_recipes(self, authors):
+        """Prefetch the recipes listed under each of ``authors``, newest
+        first; with ``recipes_limit`` only that many per author, ranked in
+        one query over the recipes of these authors."""
+        recipes = Recipe.objects.only(
+            'id', 'name', 'image', 'image_variants', 'cooking_time',
+            'author', 'pub_date'
+        ).order_by('-pub_date', '-id')
+        recipes_limit = self.request.query_params.get('recipes_limit', '')
+        if recipes_limit.isdigit():
+            recipes = recipes.latest_by_author(
+                [author.pk for author in authors], int(recipes_limit)
+            )
+        prefetch_related_objects(
+            authors,
+            Prefetch('recipe', queryset=recipes, to_attr='latest_recipes')
+        )
+        return authors
+
+    def get_keyset_ordering(self):
+        if self.action == 'subscriptions':
+            return ('follow_id',)
+        return None
+
     @action(
         methods=['GET'],
         detail=False,
         permission_classes=(permissions.IsAuthenticated,))
     def subscriptions(self, request):
-        users = request.user.follower.all()
-        recipes_limit = request.GET.get('recipes_limit', '')
-        serializer = SubscriptionSerializer(
-            users,
+        page = self.paginate_queryset(self.get_subscriptions_queryset())
+        serializer = SubscriptionListSerializer(
+            self.with_latest_recipes(page),
             context={'request': request},
             many=True
         )
-        page = self.paginate_queryset(users)
-        if page is not None:
-            if not recipes_limit.isdigit():
-                return self.get_paginated_response(serializer.data)
-            else:
-                for item in serializer.data:
-                    recipes = item['recipes'][:int(recipes_limit)]
-                    item['recipes'] = recipes
-                return self.get_paginated_response(serializer.data)
-        else:
-            return Response(serializer.data)
+        return self.get_paginated_response(serializer.data)
 
     @action(
         methods=['GET', 'DELETE'],
@@ -92,35 +160,101 @@ class UserViewSet(viewsets.ModelViewSet):
         permission_classes=[permissions.IsAuthenticated, ])
     def subscribe(self, request, pk):
         author = get_object_or_404(User, id=pk)
-        recipes_limit = request.query_params.get('recipes_limit', '')
         if request.method == 'GET':
-            Follow.objects.create(user=request.user, author=author)
+            if author.pk == request.user.pk:
+                return Response({'errors': SUBSCRIBE_TO_SELF},
+                                status=status.HTTP_400_BAD_REQUEST)
+            try:
+                with transaction.atomic():
+                    Follow.objects.create(user=request.user, author=author)
+                    Profile.objects.count_follow(request.user.id, author.id)
+            except IntegrityError:
+                # unique_follow: already subscribed.
+                return Response({'errors': ALREADY_SUBSCRIBED},
+                                status=status.HTTP_400_BAD_REQUEST)
             serializer = SubscriptionListSerializer(
-                author,
+                self.with_latest_recipes(
+                    [self.get_subscriptions_queryset().get(pk=author.pk)]
+                )[0],
                 context={'request': request}
             )
-            filtered_data = serializer.data
-            if not recipes_limit.isdigit():
-                return Response(
-                    filtered_data, status=status.HTTP_201_CREATED)
-            recipes = serializer.data['recipes'][:int(recipes_limit)]
-            filtered_data['recipes'] = recipes
-            return Response(filtered_data, status=status.HTTP_201_CREATED)
+            return Response(serializer.data, status=status.HTTP_201_CREATED)
         elif request.method == 'DELETE':
             try:
-                Follow.objects.get(user=request.user,
-                                   author=author).delete()
+                with transaction.atomic():
+                    Follow.objects.get(user=request.user,
+                                       author=author).delete()
+                    Profile.objects.count_follow(request.user.id,
+                                                 author.id, -1)
             except ObjectDoesNotExist:
                 return Response(status=status.HTTP_400_BAD_REQUEST)
             return Response(status=status.HTTP_204_NO_CONTENT)
 
 
-class RecipeViewSet(viewsets.ModelViewSet):
+class RecipeViewSet(InstrumentedViewMixin, AnonymousCacheMixin,
+                    ConditionalGetMixin, viewsets.ModelViewSet):
     queryset = Recipe.objects.all()
     permission_classes = [RecipePermissions]
     pagination_class = LimitPagination
-    filter_backends = (DjangoFilterBackend,)
+    filter_backends = (DjangoFilterBackend, StableOrderingFilter)
     filterset_class = RecipeFilter
+    ordering_fields = ('pub_date', 'favorites_count', 'carts_count')
+    ordering = ('-pub_date', '-id')
+
+    def get_default_ordering(self):
+        if search_terms(self.request.query_params.get('search', '')):
+            return ('-search_rank', '-id')
+        return self.ordering
+
+    def get_keyset_ordering(self):
+        return StableOrderingFilter().get_ordering(
+            self.request, self.queryset, self
+        )
+
+    def get_queryset(self):
+        if self.action not in ('list', 'retrieve'):
+            return Recipe.objects.all()
+        user = self.request.user
+        authors = User.objects.select_related('profile')
+        if not user.is_anonymous:
+            authors = authors.annotate(is_subscribed=Exists(
+                Follow.objects.filter(user=user, author=OuterRef('pk'))
+            ))
+        return self.with_author_subscription(
+            Recipe.objects.additional_properties(user)
+        ).prefetch_related(
+            Prefetch('author', queryset=authors),
+            'ingredients_of_recipe',
+            'tag_of_recipe'
+        )
+
+    def with_author_subscription(self, queryset):
+        user = self.request.user
+        if user.is_anonymous:
+            return queryset.annotate(is_author_subscribed=Value(
+                False, output_field=BooleanField()
+            ))
+        return queryset.annotate(is_author_subscribed=Exists(
+            Follow.objects.filter(user=user, author=OuterRef('author'))
+        ))
+
+    def get_validator_queryset(self):
+        return self.with_author_subscription(
+            Recipe.objects.additional_properties(self.request.user)
+        ).select_related('author__profile').only(
+            'id', 'pub_date', 'updated_at', 'favorites_count', 'carts_count',
+            'author__profile__recipes_count',
+            'author__profile__followers_count',
+            'author__profile__following_count'
+        )
+
+    def object_version(self, recipe):
+        profile = UserSerializer().get_profile(recipe.author)
+        return (recipe.id, recipe.updated_at, recipe.favorites_count,
+                recipe.carts_count, recipe.is_favorited,
+                recipe.is_in_shopping_cart, recipe.is_author_subscribed,
+                profile.recipes_count, profile.followers_count,
+                profile.following_count)
 
     def get_serializer_class(self):
         if self.action in ('list', 'retrieve'):
@@ -130,92 +264,102 @@ class RecipeViewSet(viewsets.ModelViewSet):
     def perform_create(self, serializer):
         serializer.save(author=self.request.user)
 
+    @transaction.atomic
+    def perform_destroy(self, recipe):
+        recipe.delete()
+        Profile.objects.filter(pk=recipe.author_id).adjust_counters(
+            recipes_count=-1
+        )
+
+    @action(detail=False,
+            methods=['POST'],
+            url_path='import',
+            permission_classes=[permissions.IsAuthenticated])
+    def import_recipes(self, request):
+        if not isinstance(request.data, list):
+            return Response(
+                {'errors': 'Expected a list of recipes.'},
+                status=status.HTTP_400_BAD_REQUEST)
+        if len(request.data) > IMPORT_BATCH_LIMIT:
+            return Response(
+                {'errors': f'At most {IMPORT_BATCH_LIMIT} recipes '
+                           f'per request.'},
+                status=status.HTTP_400_BAD_REQUEST)
+        report = RecipeImporter(request.user).run(request.data)
+        return Response(report, status=status.HTTP_200_OK)
+
     @action(detail=True,
             methods=['GET', 'DELETE'],
             permission_classes=[permissions.IsAuthenticated])
     def favorite(self, request, pk=None):
-        recipe = get_object_or_404(Recipe, id=pk).id
-        user = request.user.id
-        if request.method == 'GET':
-            data = {'user': user, 'recipe': recipe}
-            context = {'request': request}
-            serializer = FavoriteSerializer(data=data,
-                                            context=context)
-            serializer.is_valid(raise_exception=True)
-            serializer.save()
-            return Response(serializer.data,
-                            status=status.HTTP_201_CREATED)
-        elif request.method == 'DELETE':
-            try:
-                Favorite.objects.get(user=user, recipe=recipe).delete()
-                return Response(status=status.HTTP_204_NO_CONTENT)
-            except ObjectDoesNotExist:
-                return Response(
-                    {'errors': 'This recipe is not in your favorites.'},
-                    status=status.HTTP_400_BAD_REQUEST)
+        data, code = toggle_recipe('favorite', request.method,
+                                   request.user, pk, {'request': request})
+        return Response(data, status=code)
 
     @action(detail=True,
             methods=['GET', 'DELETE'],
             permission_classes=[permissions.IsAuthenticated])
     def shopping_cart(self, request, pk=None):
-        recipe = get_object_or_404(Recipe, id=pk).id
-        user = request.user.id
-        if request.method == 'GET':
-            data = {'user': user, 'recipe': recipe}
-            context = {'request': request}
-            serializer = CartSerializer(data=data,
-                                        context=context)
-            serializer.is_valid(raise_exception=True)
-            serializer.save()
-            return Response(serializer.data,
-                            status=status.HTTP_201_CREATED)
-        elif request.method == 'DELETE':
-            try:
-                Cart.objects.get(user=user, recipe=recipe).delete()
-                return Response(status=status.HTTP_204_NO_CONTENT)
-            except ObjectDoesNotExist:
-                return Response(
-                    {'errors': 'This recipe is not in your shopping cart.'},
-                    status=status.HTTP_400_BAD_REQUEST)
+        data, code = toggle_recipe('shopping_cart', request.method,
+                                   request.user, pk, {'request': request})
+        return Response(data, status=code)
+
+    @action(detail=False,
+            methods=['POST'],
+            url_path='batch',
+            permission_classes=[permissions.IsAuthenticated])
+    def batch(self, request):
+        serializer = serializers.BatchToggleSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        return Response(
+            toggle_recipes(request.user, serializer.validated_data),
+            status=status.HTTP_200_OK
+        )
 
     @action(detail=False,
             methods=['GET'],
-            permission_classes=(permissions.IsAuthenticated, ))
+            permission_classes=(permissions.IsAuthenticated, ),
+            renderer_classes=SHOPPING_CART_RENDERERS,
+            content_negotiation_class=ShoppingCartNegotiation)
     def download_shopping_cart(self, request):
-        structured_cart = {}
-        ingredients = IngredientsOfRecipe.objects.filter(
-            recipe__carted__user=request.user
+        ingredients = ShoppingListItem.objects.filter(
+            user=request.user
         ).values(
-            'ingredient__name',
-            'ingredient__measurement_unit'
-        ).annotate(Sum('amount'))
-        for ingredient in ingredients:
-            amount = ingredient['amount__sum']
-            name = ingredient['ingredient__name']
-            measurement_unit = ingredient['ingredient__measurement_unit']
-            structured_cart[name] = {
-                'amount': amount,
-                'measurement_unit': measurement_unit
-            }
-
-        file_data = []
-        for item in structured_cart:
-            file_data.append(
-                f'{item} - {structured_cart[item]["amount"]} '
-                f'{structured_cart[item]["measurement_unit"]} \r\n'
-            )
-
-        response = HttpResponse(file_data,
-                                'Content-Type: text/plain')
-        response['Content-Disposition'] = 'attachment; filename="shopping_cart.txt"'
+            name=F('ingredient__name'),
+            measurement_unit=F('ingredient__measurement_unit')
+        ).annotate(
+            amount=Sum('amount')
+        ).order_by('name', 'measurement_unit')
+        renderer = request.accepted_renderer
+        content_type = renderer.media_type
+        if renderer.charset:
+            content_type = f'{content_type}; charset={renderer.charset}'
+        response = StreamingHttpResponse(
+            renderer.stream(ingredients.iterator(chunk_size=2000)),
+            content_type=content_type
+        )
+        response['Content-Disposition'] = (
+            f'attachment; filename="{renderer.get_filename()}"'
+        )
         return response
 
 
 class IngredientViewSet(ListRetrieveViewSet):
     serializer_class = serializers.IngredientSerializer
     queryset = Ingredient.objects.all()
-    filter_backends = (filters.SearchFilter,)
-    search_fields = ('name',)
+    pagination_class = None
+
+    def filter_queryset(self, queryset):
+        if self.action == 'list':
+            return ingredient_index.search(
+                self.request.query_params.get('name', '')
+            )
+        return super().filter_queryset(queryset)
+
+    def object_version(self, ingredient):
+        if isinstance(ingredient, dict):
+            return tuple(ingredient.values())
+        return super().object_version(ingredient)
 
 
 class TagViewSet(ListRetrieveViewSet):
@@ -0,0 +1,79 @@
+"""Work a new process would otherwise do on its first requests.
+
+``warm_up`` is called by the gunicorn hooks in ``gunicorn.conf.py``: once
+in the master before it forks when the app is preloaded, so every worker
+starts with it done, or in each worker before it accepts connections.
+"""
+import gc
+import inspect
+import time
+
+from django.db import connections
+from django.urls import get_resolver
+from rest_framework.serializers import BaseSerializer
+
+from users import serializers as user_serializers
+
+from . import serializers
+from .db.pool import close_pools
+from .filters import RecipeFilter
+from .models import Recipe
+from .search import ingredient_index
+
+
+def warm_urls():
+    get_resolver().reverse_dict
+    get_resolver().resolve('/api/recipes/')
+
+
+def warm_serializers():
+    """Build the fields of every serializer once, filling the model
+    ``_meta`` caches DRF reads them from."""
+    for module in (serializers, user_serializers):
+        for serializer_class in vars(module).values():
+            if (inspect.isclass(serializer_class)
+                    and issubclass(serializer_class, BaseSerializer)
+                    and serializer_class.__module__ == module.__name__):
+                serializer_class(context={}).fields
+
+
+def warm_filters():
+    RecipeFilter(queryset=Recipe.objects.none()).form
+
+
+def warm_reference_data():
+    ingredient_index.search('')
+
+
+def freeze_heap():
+    """Move everything loaded so far out of the garbage collector's reach.
+    The first full collection would otherwise walk the whole heap of
+    modules during a request, and under ``--preload`` touching those
+    objects copies the pages forked workers share with the master."""
+    gc.collect()
+    gc.freeze()
+
+
+STEPS = {
+    'urls': warm_urls,
+    'serializers': warm_serializers,
+    'filters': warm_filters,
+    'reference data': warm_reference_data,
+    'gc freeze': freeze_heap,
+}
+
+
+def warm_up():
+    """Run every step and return how long each took, in seconds. Database
+    connections are closed afterwards, pooled ones included, so none is
+    shared with the processes forked from this one."""
+    timings = {}
+    try:
+        for name, step in STEPS.items():
+            started = time.perf_counter()
+            step()
+            timings[name] = time.perf_counter() - started
+    finally:
+        connections.close_all()
+        close_pools()
+    return timings
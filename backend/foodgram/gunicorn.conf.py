@@ -0,0 +1,55 @@
+"""gunicorn settings, read from the working directory.
+
+With ``--preload`` the master imports and warms the app once and workers
+are forked from it ready to serve; without it every worker warms itself up
+before taking connections. See ``foodgram_api.warmup``.
+
+Several workers refuse to start on a process-local cache: the response
+cache and reference data versions live there, and a write in one worker
+would not invalidate the copies of the others.
+"""
+import os
+
+PROCESS_LOCAL_CACHES = ('django.core.cache.backends.locmem.LocMemCache',)
+
+
+def on_starting(server):
+    if server.cfg.workers < 2:
+        return
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'foodgram.settings')
+    from django.conf import settings
+
+    backend = settings.CACHES['default']['BACKEND']
+    if backend in PROCESS_LOCAL_CACHES:
+        raise RuntimeError(
+            f'{server.cfg.workers} workers would not see each other\'s '
+            f'cache invalidations in {backend}; set CACHE_BACKEND and '
+            f'CACHE_LOCATION to a shared cache (e.g. '
+            f'django.core.cache.backends.filebased.FileBasedCache and a '
+            f'directory, or memcached) or run one worker.'
+        )
+
+
+def warm(log):
+    from foodgram_api.warmup import warm_up
+
+    try:
+        timings = warm_up()
+    except Exception:
+        # A database that is not up yet must not keep the server down;
+        # whatever was not warmed is loaded by the first requests.
+        log.exception('Warm-up failed.')
+        return
+    log.info('Warmed up in %.0f ms (%s).', sum(timings.values()) * 1000,
+             ', '.join(f'{name} {seconds * 1000:.0f} ms'
+                       for name, seconds in timings.items()))
+
+
+def when_ready(server):
+    if server.cfg.preload_app:
+        warm(server.log)
+
+
+def post_worker_init(worker):
+    if not worker.cfg.preload_app:
+        warm(worker.log)
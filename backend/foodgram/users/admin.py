@@ -1,5 +1,13 @@
 from django.contrib import admin
 
-from .models import Follow
+from .models import Follow, Profile
+
+
+class ProfileAdmin(admin.ModelAdmin):
+    list_display = ('user', 'recipes_count', 'followers_count',
+                    'following_count')
+    readonly_fields = ('recipes_count', 'followers_count', 'following_count')
+
 
 admin.site.register(Follow)
+admin.site.register(Profile, ProfileAdmin)
@@ -0,0 +1,51 @@
+# Generated by Django 3.1 on 2026-10-18 20:04
+
+from django.db import migrations, models
+from django.db.models import Count, F, Min, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+import django.db.models.expressions
+
+
+def counted(model, field):
+    return Coalesce(Subquery(
+        model.objects.filter(
+            **{field: OuterRef('pk')}
+        ).order_by().values(field).annotate(total=Count('*')).values('total')
+    ), 0)
+
+
+def remove_duplicate_follows(apps, schema_editor):
+    """Keep the first of repeated subscriptions, drop subscriptions to
+    oneself and recount the profiles if anything was removed."""
+    Follow = apps.get_model('users', 'Follow')
+    Profile = apps.get_model('users', 'Profile')
+    first_ids = Follow.objects.values('user', 'author').annotate(
+        first_id=Min('pk')
+    ).values('first_id')
+    removed, _ = Follow.objects.exclude(pk__in=first_ids).delete()
+    removed += Follow.objects.filter(user=F('author')).delete()[0]
+    if removed:
+        Profile.objects.update(
+            followers_count=counted(Follow, 'author'),
+            following_count=counted(Follow, 'user'),
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0003_profile'),
+    ]
+
+    operations = [
+        migrations.RunPython(remove_duplicate_follows,
+                             migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='follow',
+            constraint=models.UniqueConstraint(fields=('user', 'author'), name='unique_follow'),
+        ),
+        migrations.AddConstraint(
+            model_name='follow',
+            constraint=models.CheckConstraint(check=models.Q(_negated=True, user=django.db.models.expressions.F('author')), name='follow_not_self'),
+        ),
+    ]
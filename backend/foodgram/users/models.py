@@ -1,9 +1,37 @@
 from django.contrib.auth import get_user_model
 from django.db import models
+from django.db.models import Case, F, Q, When
+from django.db.models.functions import Greatest
+
+from foodgram_api import response_cache
+from foodgram_api.models import CountersQuerySet
 
 User = get_user_model()
 
 
+class ProfileQuerySet(CountersQuerySet):
+
+    def count_follow(self, user_id, author_id, delta=1):
+        """Count a new (or, with a negative ``delta``, removed)
+        subscription on both profiles in one UPDATE, dropping the cached
+        responses that embed the counters."""
+        updated = self.filter(pk__in=(user_id, author_id)).update(
+            following_count=Case(
+                When(pk=user_id,
+                     then=Greatest(F('following_count') + delta, 0)),
+                default=F('following_count')
+            ),
+            followers_count=Case(
+                When(pk=author_id,
+                     then=Greatest(F('followers_count') + delta, 0)),
+                default=F('followers_count')
+            )
+        )
+        if updated:
+            response_cache.invalidate()
+        return updated
+
+
 class Follow(models.Model):
     user = models.ForeignKey(User,
                              on_delete=models.CASCADE,
@@ -11,3 +39,38 @@ class Follow(models.Model):
     author = models.ForeignKey(User,
                                on_delete=models.CASCADE,
                                related_name='following')
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'author'],
+                                    name='unique_follow'),
+            models.CheckConstraint(check=~Q(user=F('author')),
+                                   name='follow_not_self'),
+        ]
+
+
+class Profile(models.Model):
+    """Denormalized per-user counters, kept current by the code paths that
+    create and delete recipes and subscriptions; ``reconcile_counters``
+    repairs any drift."""
+    user = models.OneToOneField(User,
+                                on_delete=models.CASCADE,
+                                primary_key=True,
+                                related_name='profile')
+    recipes_count = models.PositiveIntegerField(default=0)
+    followers_count = models.PositiveIntegerField(default=0)
+    following_count = models.PositiveIntegerField(default=0)
+    objects = ProfileQuerySet.as_manager()
+
+    class Meta:
+        verbose_name = 'Profile'
+        verbose_name_plural = 'Profiles'
+        indexes = [
+            models.Index(fields=['-recipes_count', '-user'],
+                         name='profile_recipes_count_idx'),
+            models.Index(fields=['-followers_count', '-user'],
+                         name='profile_followers_count_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.user}'
@@ -1,10 +1,12 @@
 from django.contrib.auth import get_user_model
+from django.core.exceptions import ObjectDoesNotExist
 from rest_framework import serializers
-from rest_framework.validators import UniqueTogetherValidator, UniqueValidator
+from rest_framework.validators import UniqueValidator
 
+from foodgram_api.images import variant_urls
 from foodgram_api.models import Recipe
 
-from .models import Follow
+from .models import Follow, Profile
 
 User = get_user_model()
 
@@ -26,93 +28,81 @@ class RegistrySerializer(serializers.ModelSerializer):
                   'first_name', 'last_name', 'password')
 
     def create(self, validated_data):
-        password = validated_data.pop('password')
-        user = User.objects.create_user(
+        return User.objects.create_user(
             email=validated_data['email'],
             username=validated_data['username'],
             first_name=validated_data['first_name'],
             last_name=validated_data['last_name'],
+            password=validated_data['password'],
         )
-        user.set_password(password)
-        user.save()
-        return user
 
 
 class UserSerializer(serializers.ModelSerializer):
     is_subscribed = serializers.SerializerMethodField()
     username = serializers.CharField(required=False)
+    recipes_count = serializers.SerializerMethodField()
+    followers_count = serializers.SerializerMethodField()
+    following_count = serializers.SerializerMethodField()
 
     class Meta:
         model = User
-        fields = ('email', 'id', 'username',
-                  'first_name', 'last_name', 'is_subscribed')
+        fields = ('email', 'id', 'username', 'first_name', 'last_name',
+                  'is_subscribed', 'recipes_count', 'followers_count',
+                  'following_count')
 
     def get_is_subscribed(self, author):
         request = self.context.get('request')
         if request is None or request.user.is_anonymous:
             return False
+        if hasattr(author, 'is_subscribed'):
+            return author.is_subscribed
+        if author.id == request.user.id:
+            return False
         return Follow.objects.filter(user__id=request.user.id,
                                      author__id=author.id).exists()
 
+    def get_profile(self, user):
+        try:
+            return user.profile
+        except ObjectDoesNotExist:
+            # Users bulk-created before reconcile_counters ran.
+            return Profile(user=user)
 
-class MarkedPreviewRepresentationSerializer(serializers.ModelSerializer):
-    class Meta:
-        model = Recipe
-        fields = ('id', 'name', 'image', 'cooking_time')
+    def get_recipes_count(self, user):
+        return self.get_profile(user).recipes_count
 
+    def get_followers_count(self, user):
+        return self.get_profile(user).followers_count
 
-class SubscriptionListSerializer(serializers.ModelSerializer):
-    email = serializers.CharField(source='author.email')
-    id = serializers.PrimaryKeyRelatedField(source='author.id',
-                                            queryset=User.objects.all())
-    username = serializers.CharField(source='author.username')
-    first_name = serializers.CharField(source='author.first_name')
-    last_name = serializers.CharField(source='author.last_name')
-    is_subscribed = serializers.SerializerMethodField()
-    recipes = MarkedPreviewRepresentationSerializer(many=True,
-                                                    source='author.recipe')
-    recipes_count = serializers.SerializerMethodField()
+    def get_following_count(self, user):
+        return self.get_profile(user).following_count
 
-    class Meta:
-        model = User
-        fields = ('email', 'id', 'username', 'first_name', 'last_name',
-                  'is_subscribed', 'recipes', 'recipes_count')
-        read_only_fields = ('email', 'id', 'username',
-                            'first_name', 'last_name')
 
-    def get_is_subscribed(self, obj):
-        try:
-            user = self.context['request'].user
-            if not user.is_anonymous:
-                return user.follower.filter(author=obj.author.id).exists()
-            else:
-                return False
-        except KeyError:
-            return False
+class MarkedPreviewRepresentationSerializer(serializers.ModelSerializer):
+    image_variants = serializers.SerializerMethodField()
 
-    def get_recipes_count(self, obj):
-        return obj.author.recipe.count()
+    class Meta:
+        model = Recipe
+        fields = ('id', 'name', 'image', 'image_variants', 'cooking_time')
+
+    def get_image_variants(self, recipe):
+        return variant_urls(recipe, self.context.get('request'))
 
 
-class SubscriptionSerializer(serializers.ModelSerializer):
-    user = serializers.PrimaryKeyRelatedField(queryset=User.objects.all())
-    author = serializers.PrimaryKeyRelatedField(queryset=User.objects.all())
+class SubscriptionListSerializer(UserSerializer):
+    recipes = serializers.SerializerMethodField()
 
     class Meta:
-        model = Follow
-        fields = '__all__'
-        validators = [
-            UniqueTogetherValidator(
-                queryset=Follow.objects.all(),
-                fields=('user', 'author')
-            )
-        ]
-
-    def validate_author(self, author):
-        if author == self.context['request'].user:
-            raise serializers.ValidationError(
-                "You can't subscribe to yourself!")
-        return author
-
-    def to_representation(self, instance):
-        return SubscriptionListSerializer(instance).data
+        model = User
+        fields = ('email', 'id', 'username', 'first_name', 'last_name',
+                  'is_subscribed', 'recipes', 'recipes_count',
+                  'followers_count', 'following_count')
+
+    def get_recipes(self, author):
+        if hasattr(author, 'latest_recipes'):
+            recipes = author.latest_recipes
+        else:
+            recipes = author.recipe.all()
+        return MarkedPreviewRepresentationSerializer(
+            recipes, many=True, context=self.context
+        ).data